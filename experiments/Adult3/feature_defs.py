@@ -1,13 +1,20 @@
-# feature_defs.py for the 3-feature Adult (Census Income) dataset
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-	"""Checks that there are 3 features."""
-	return len(inputs) == 3
+import itertools
 
-# --- Numerical Feature Definitions ---
+import numpy as np
+
+# --- Lookup Tables ---
+_AGE_BOUNDARIES = np.array([25, 40, 55], dtype=float)
+_HOURS_PER_WEEK_BOUNDARIES = np.array([35, 40, 50], dtype=float)
+# workclass codes of categories.json: 0 Federal-gov, 1 Local-gov, 2 Private, 3 Self-emp-inc, 4 Self-emp-not-inc, 5 State-gov, 6 Without-pay
+_WORKCLASS_CODE_BINS = {0: 5, 1: 2, 2: 0, 3: 4, 4: 1, 5: 3, 6: 6}
+_WORKCLASS_BIN_TABLE = np.array([5, 2, 0, 4, 1, 3, 6])
+_INCOME_CODES = {'<=50K': 0, '>50K': 1}
+
+# --- Scalar Definitions ---
 def age(inputs):
 	"""Discretizes age into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[0][1]
 	if value < 25:
 		return 0
@@ -17,9 +24,8 @@ def age(inputs):
 		return 2
 	return 3
 
-def hours_per_week(inputs): # Renamed function
-	"""Discretizes hours-per-week into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+def hours_per_week(inputs):
+	"""Discretizes hours_per_week into 4 bins."""
 	value = inputs[1][1]
 	if value < 35:
 		return 0
@@ -29,27 +35,55 @@ def hours_per_week(inputs): # Renamed function
 		return 2
 	return 3
 
-# --- Categorical Feature Definition ---
 def workclass(inputs):
-	"""Maps the workclass category to an integer."""
-	assert(check_num_of_inputs(inputs))
+	"""Maps the workclass code (see categories.json) to an integer."""
 	value = inputs[2][1]
-	mapping = {'Private': 0, 'Self-emp-not-inc': 1, 'Local-gov': 2, 'State-gov': 3, 
-               'Self-emp-inc': 4, 'Federal-gov': 5, 'Without-pay': 6, 'Never-worked': 7, '?': 8}
-	return mapping.get(value, -1)
+	return _WORKCLASS_CODE_BINS.get(value, -1)
 
-# --- Label Definition ---
 def income(outputs):
 	"""Maps the income label to an integer."""
 	value = outputs[0][1]
-	mapping = {'<=50K': 0, '>50K': 1}
-	return mapping.get(value, -1)
+	return _INCOME_CODES.get(value, -1)
 
 def retrieve_feature_defs():
 	"""Returns a dictionary mapping all names to their definition functions."""
 	feature_defs = {}
 	feature_defs["age"] = age
-	feature_defs["hours_per_week"] = hours_per_week # Renamed key
+	feature_defs["hours_per_week"] = hours_per_week
 	feature_defs["workclass"] = workclass
 	feature_defs["income"] = income
 	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["age"] = [25, 40, 55]
+	bin_boundaries["hours_per_week"] = [35, 40, 50]
+	bin_boundaries["workclass"] = None
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _age_batch(values):
+	return np.searchsorted(_AGE_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _hours_per_week_batch(values):
+	return np.searchsorted(_HOURS_PER_WEEK_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _workclass_batch(values):
+	codes = np.asarray(values, dtype=np.int64)
+	known = (codes >= 0) & (codes < len(_WORKCLASS_BIN_TABLE))
+	return np.where(known, _WORKCLASS_BIN_TABLE[np.where(known, codes, 0)], -1)
+
+def _income_batch(values):
+	values = np.asarray(values).tolist()
+	codes = map(_INCOME_CODES.get, values, itertools.repeat(-1))
+	return np.fromiter(codes, dtype=np.int64, count=len(values))
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["age"] = _age_batch
+	batch_defs["hours_per_week"] = _hours_per_week_batch
+	batch_defs["workclass"] = _workclass_batch
+	batch_defs["income"] = _income_batch
+	return batch_defs
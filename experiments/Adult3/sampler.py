@@ -1,48 +1,75 @@
 # sampler.py for the 3-feature Adult dataset (On-Disk Caching Version - Corrected)
 
 import os
-import pickle
-import random
-import pandas as pd
+import shutil
 import numpy as np
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.preprocessing import OrdinalEncoder
+from experiments.sampling.batch import generate_unique_columns, samples_from_columns
+from experiments.sampling.bootstrap import BootstrapProgress, write_real_samples
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.categories import CategoricalDictionary, load_or_build
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.density import KernelDensity
+from experiments.sampling.streaming import stream_store
+from experiments.sampling.parallel import generate_parallel, worker_rng
+
+from experiments.Adult3 import feature_defs
 
 # --- Module-level Configuration ---
 _DATA_FILE_PATH = "experiments/Adult3/adult.data"
-_CACHE_FILENAME = "experiments/Adult3/sampler_cache_adult_3_features.pkl"
+_LEGACY_CACHE_FILENAME = "experiments/Adult3/sampler_cache_adult_3_features.pkl"
+_LEGACY_CACHE_DIR = "experiments/Adult3/sampler_cache_adult_3_features"
 _cached_data = {
-    "samples": {},
-    "model": None,
-    "encoder": None
+    "model": None
 }
 _is_cache_loaded = False
+# Called as hook(stage, rows, seconds) for each stage of the initial cache build.
+on_bootstrap_progress = None
 # **FIX 1**: Renamed 'hours-per-week' to 'hours_per_week'
 _feature_names = ['age', 'hours_per_week', 'workclass']
+# Keyed by the oracle/data contents and the generation domain, so runs with the
+# same inputs share one cache and any change starts a fresh one.
+# With _DISTRIBUTION_MATCHED set, new samples are drawn from a kernel density fitted
+# to the real rows instead of uniformly over their ranges (see sampling/density.py).
+_DISTRIBUTION_MATCHED = False
+_CACHE_DIR = cache_dir(_LEGACY_CACHE_DIR, [_DATA_FILE_PATH], {'features': _feature_names, 'label': 'income', 'distribution_matched': _DISTRIBUTION_MATCHED, 'categorical_codes': True})
 _numeric_features = ['age', 'hours_per_week']
 _categorical_features = ['workclass']
+# Categorical features are cached, and fed to the model, as the integer codes of
+# this dictionary, built once from the real data; feature_defs.py is compiled
+# against the same file (see sampling/categories.py).
+_CATEGORIES_PATH = "experiments/Adult3/categories.json"
+_categories = None
 _raw_data = None
+# Decimal places each float feature is rounded to when deduping new samples;
+# the cache keeps the drawn values in full.
+_KEY_DIGITS = {'age': 4, 'hours_per_week': 4}
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'income', key_digits=_KEY_DIGITS)
+_key_index = None
+_rng = np.random.default_rng()
+_label_text = np.array(['<=50K', '>50K'])
 
 def _load_or_initialize_cache():
     """
-    Loads data from the cache file if it exists. Otherwise, it generates
+    Opens the cache if it exists; the model and real data are only loaded
+    by _load_oracle() once new samples are needed. Otherwise, it generates
     the initial data, trains a model, and creates the cache file.
     """
     global _cached_data, _is_cache_loaded, _raw_data
 
-    if os.path.exists(_CACHE_FILENAME):
-        print(f"--- Found cache file '{_CACHE_FILENAME}'. Loading data. ---")
-        with open(_CACHE_FILENAME, 'rb') as f:
-            _cached_data = pickle.load(f)
-        col_names = ['age', 'workclass', 'fnlwgt', 'education', 'education-num', 'marital-status', 
-                     'occupation', 'relationship', 'race', 'sex', 'capital-gain', 'capital-loss', 
-                     'hours-per-week', 'native-country', 'income']
-        _raw_data = pd.read_csv(_DATA_FILE_PATH, header=None, names=col_names, sep=',\s*', engine='python', na_values='?')
-        _raw_data.rename(columns={'hours-per-week': 'hours_per_week'}, inplace=True) # Rename column
-        _raw_data.dropna(inplace=True)
+    legacy_path = _store.adopt_legacy([_LEGACY_CACHE_DIR, _LEGACY_CACHE_FILENAME])
+    if legacy_path:
+        _recode_legacy_cache()
+        print(f"--- Imported legacy cache '{legacy_path}' into '{_CACHE_DIR}'. ---")
+
+    if _store.exists():
+        print(f"--- Found cache '{_CACHE_DIR}' ({len(_store)} samples in {_store.num_segments()} segments). ---")
 
     else:
         print(f"--- No cache file found. Initializing model and real samples. ---")
+        import pandas as pd
+        from sklearn.tree import DecisionTreeClassifier
+        progress = BootstrapProgress(on_bootstrap_progress)
         try:
             col_names = ['age', 'workclass', 'fnlwgt', 'education', 'education-num', 'marital-status', 
                          'occupation', 'relationship', 'race', 'sex', 'capital-gain', 'capital-loss', 
@@ -56,83 +83,205 @@ def _load_or_initialize_cache():
         df.rename(columns={'hours-per-week': 'hours_per_week'}, inplace=True)
         
         df.dropna(inplace=True)
+        progress.stage("read", len(df))
         df_subset = df[_feature_names + ['income']]
         _raw_data = df_subset
         
         X = df_subset[_feature_names]
         y = df_subset['income'].map({'<=50K': 0, '>50K': 1})
         
-        # **FIX 2**: Use .values to prevent sklearn warnings
-        encoder = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
-        X_encoded_cat = encoder.fit_transform(X[_categorical_features].values)
-        _cached_data["encoder"] = encoder
-        
-        X_processed = np.concatenate([X[_numeric_features].values, X_encoded_cat], axis=1)
+        # The model is trained on the codes the cache will hold.
+        columns = [X[name].values for name in _numeric_features] + \
+                  [_dictionary().encode(name, X[name].values) for name in _categorical_features]
+        X_processed = np.column_stack(columns)
 
         model = DecisionTreeClassifier()
         model.fit(X_processed, y)
         _cached_data["model"] = model
 
-        for index, row in X.iterrows():
-            feature_values = row.values
-            label_value = df_subset.loc[index, 'income']
-            sample_key = tuple((name, val) for name, val in zip(_feature_names, feature_values))
-            sample_value = [('income', label_value)]
-            _cached_data["samples"][sample_key] = sample_value
-        
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_data, f)
-        print(f"--- Saved initial {len(_cached_data['samples'])} samples to '{_CACHE_FILENAME}'. ---")
+        progress.stage("train", len(X))
+
+        num_written = write_real_samples(_store, columns, df_subset['income'].values, progress)
+        _store.save_meta(_cached_data)
+        progress.done(num_written)
+        print(f"--- Saved initial {num_written} samples to '{_CACHE_DIR}'. ---")
         
     _is_cache_loaded = True
 
-def uniform(num_of_samples):
+def _load_oracle():
     """
-    Provides samples from the on-disk cache. If more samples are requested
-    than exist, it generates new synthetic ones and updates the cache file.
+    Unpickles the trained model from the cache metadata and reads the real
+    data, on first use. Only generating new samples needs them, so runs
+    served from the cache skip the sklearn/pandas startup.
     """
-    global _cached_data
+    global _cached_data, _raw_data
+    if _cached_data.get("model") is not None:
+        return
+    import pandas as pd
+    _cached_data = _store.load_meta()
+    col_names = ['age', 'workclass', 'fnlwgt', 'education', 'education-num', 'marital-status', 
+                 'occupation', 'relationship', 'race', 'sex', 'capital-gain', 'capital-loss', 
+                 'hours-per-week', 'native-country', 'income']
+    _raw_data = pd.read_csv(_DATA_FILE_PATH, header=None, names=col_names, sep=',\s*', engine='python', na_values='?')
+    _raw_data.rename(columns={'hours-per-week': 'hours_per_week'}, inplace=True) # Rename column
+    _raw_data.dropna(inplace=True)
+
+def _dictionary():
+    """The categorical dictionary, loaded on first use (and built from the real data if missing)."""
+    global _categories
+    if _categories is None:
+        def build():
+            if _raw_data is None:
+                _load_oracle()
+            return CategoricalDictionary.build({name: _raw_data[name].values for name in _categorical_features})
+        _categories = load_or_build(_CATEGORIES_PATH, build)
+    return _categories
 
+def _recode_legacy_cache():
+    """Legacy caches hold categories as strings; rewrites the imported rows with their codes."""
+    features, labels = _store.columns()
+    meta = _store.load_meta()
+    meta.pop("encoder", None)
+    for i, name in enumerate(_feature_names):
+        if name in _categorical_features:
+            features[i] = _dictionary().encode(name, features[i])
+    shutil.rmtree(_CACHE_DIR)
+    _store.refresh()
+    _store.append_columns(features, labels)
+    _store.save_meta(meta)
+
+def _density():
+    """
+    The kernel density of the real rows, fitted once and kept in the cache
+    metadata so later runs and worker processes reuse it.
+    """
+    if _cached_data.get("density") is None:
+        _cached_data["density"] = KernelDensity([_raw_data[name].values for name in _numeric_features],
+                                                [_dictionary().encode(name, _raw_data[name].values) for name in _categorical_features])
+        meta = _store.load_meta()
+        meta["density"] = _cached_data["density"]
+        _store.save_meta(meta)
+    return _cached_data["density"]
+
+def _draw_synthetic_batch(n, rng=None):
+    """
+    Draws n candidate rows uniformly over the real data's ranges and categories,
+    or from the real data's kernel density with _DISTRIBUTION_MATCHED.
+    """
+    rng = _rng if rng is None else rng
+    if _DISTRIBUTION_MATCHED:
+        return _density().sample(n, rng)
+    min_vals_num = _raw_data[_numeric_features].min().values
+    max_vals_num = _raw_data[_numeric_features].max().values
+    numeric = [rng.uniform(lo, hi, size=n) for lo, hi in zip(min_vals_num, max_vals_num)]
+    categorical = [rng.choice(_dictionary().codes(name), size=n) for name in _categorical_features]
+    return numeric + categorical
+
+def _stratified_cells():
+    """The feature_defs.py bins of each feature, over the real data's ranges and categories."""
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    min_vals_num = _raw_data[_numeric_features].min().values
+    max_vals_num = _raw_data[_numeric_features].max().values
+    numeric = [continuous_cells(lo, hi, boundaries[name])
+               for name, lo, hi in zip(_numeric_features, min_vals_num, max_vals_num)]
+    categorical = [discrete_cells(_dictionary().codes(name), boundaries[name]) for name in _categorical_features]
+    return numeric + categorical
+
+def _predict_batch(columns):
+    """Labels a batch of candidate columns, categories given as their codes, with one model call."""
+    return _label_text[_cached_data["model"].predict(np.column_stack(columns)).astype(int)]
+
+def _generate_shard(count, seed, stream):
+    """Draws and labels one shard of a parallel run in a worker process."""
     if not _is_cache_loaded:
         _load_or_initialize_cache()
-    
-    if num_of_samples > len(_cached_data["samples"]):
-        num_synthetic_needed = num_of_samples - len(_cached_data["samples"])
-        print(f"\n--- Cache has {len(_cached_data['samples'])} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+    _load_oracle()
+    columns = _draw_synthetic_batch(count, worker_rng(seed, stream))
+    return columns, _predict_batch(columns)
 
-        min_vals_num = _raw_data[_numeric_features].min().values
-        max_vals_num = _raw_data[_numeric_features].max().values
-        
-        categories = _cached_data["encoder"].categories_
-        label_map_rev = {0: '<=50K', 1: '>50K'}
-
-        for _ in range(num_synthetic_needed):
-            synth_num = [random.uniform(min_vals_num[i], max_vals_num[i]) for i in range(len(_numeric_features))]
-            synth_cat_text = [random.choice(cat) for cat in categories]
-            
-            synth_cat_encoded = _cached_data["encoder"].transform([synth_cat_text])
-            synth_processed = np.concatenate([np.array([synth_num]), synth_cat_encoded], axis=1)
-            
-            synth_label_encoded = _cached_data["model"].predict(synth_processed)[0]
-            synth_label_text = label_map_rev[synth_label_encoded]
-            
-            synth_features_original_style = synth_num + synth_cat_text
-            sample_key = tuple((name, val) for name, val in zip(_feature_names, synth_features_original_style))
-            sample_value = [('income', synth_label_text)]
-            
-            while sample_key in _cached_data["samples"]:
-                synth_num = [random.uniform(min_vals_num[i], max_vals_num[i]) for i in range(len(_numeric_features))]
-                synth_cat_text = [random.choice(cat) for cat in categories]
-                synth_features_original_style = synth_num + synth_cat_text
-                sample_key = tuple((name, val) for name, val in zip(_feature_names, synth_features_original_style))
-
-            _cached_data["samples"][sample_key] = sample_value
-
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_data, f)
-        print(f"--- Cache updated. Saved {len(_cached_data['samples'])} total samples to '{_CACHE_FILENAME}'. ---")
-
-    all_samples_list = list(_cached_data["samples"].items())
-    random.shuffle(all_samples_list)
+def _extend_cache(num_of_samples, seed=None, workers=None):
+    """
+    Makes sure the cache holds at least num_of_samples samples, generating
+    and appending the missing ones. `seed` and `workers` are as in uniform.
+    """
+    global _key_index
+
+    # Concurrent runs share this cache: extend it under its lock, after picking
+    # up rows other processes appended, so only what is still missing is made.
+    with _store.lock():
+        _store.refresh()
+        num_cached = len(_store)
+        if num_of_samples > num_cached:
+            num_synthetic_needed = num_of_samples - num_cached
+            print(f"\n--- Cache has {num_cached} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+            _load_oracle()
+
+            if _key_index is None or len(_key_index) != num_cached:
+                _key_index = _store.key_index()
+            if _DISTRIBUTION_MATCHED:
+                _density()   # fitted here, so worker processes load it from the metadata
+            if workers:
+                if seed is None:
+                    seed = int(_rng.integers(2**63))
+                new_columns, new_labels = generate_parallel(
+                    _generate_shard, num_synthetic_needed, seed, workers, _key_index
+                )
+                _key_index.update_rows(new_columns)
+                _store.append_columns(new_columns, new_labels)
+                num_appended = len(new_labels)
+            else:
+                new_columns, new_labels = generate_unique_columns(
+                    num_synthetic_needed, _draw_synthetic_batch, _predict_batch, _key_index
+                )
+                _key_index.update_rows(new_columns)
+                _store.append_columns(new_columns, new_labels)
+                num_appended = len(new_labels)
+            print(f"--- Cache updated. Appended {num_appended} samples ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+
+def uniform(num_of_samples, seed=None, workers=None):
+    """
+    Provides samples from the on-disk cache. If more samples are requested
+    than exist, it generates new synthetic ones and updates the cache file.
+    Pass `seed` to make the choice of returned samples reproducible. With
+    `workers`, new samples are generated by that many processes, each on its
+    own RNG stream derived from `seed`, so the appended samples are identical
+    for a given seed and worker count.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
     
-    return dict(all_samples_list[:num_of_samples])
+    _extend_cache(num_of_samples, seed, workers)
+
+    # Only the selected rows are read from the memory-mapped columns.
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return _store.sample(num_of_samples, rng)
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the samples uniform() would return as dicts of up to `chunk_size`
+    samples. Missing samples are generated one chunk at a time, and with
+    `prefetch` the next chunk is made on a background thread while the caller
+    handles the current one. `memory_budget` (in bytes) shrinks the chunks
+    so the ones in flight fit in it.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(_store, num_of_samples, rng, _extend_cache, chunk_size, prefetch, memory_budget)
+
+def stratified(samples_per_cell, seed=None):
+    """
+    Returns `samples_per_cell` new samples inside every cell of the bins in
+    feature_defs.py, so every cell is covered with few model calls. The
+    samples are labelled in one batch and are not added to the cache, which
+    holds uniform draws only.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+    _load_oracle()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    columns = draw_per_cell(_stratified_cells(), samples_per_cell, rng)
+    return samples_from_columns(columns, _predict_batch(columns), _feature_names, 'income')
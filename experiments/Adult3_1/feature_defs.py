@@ -1,13 +1,20 @@
-# feature_defs.py for the 3-feature Adult (Census Income) dataset
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-	"""Checks that there are 3 features."""
-	return len(inputs) == 3
+import itertools
 
-# --- Numerical Feature Definitions ---
+import numpy as np
+
+# --- Lookup Tables ---
+_AGE_BOUNDARIES = np.array([25, 40, 55], dtype=float)
+_HOURS_PER_WEEK_BOUNDARIES = np.array([35, 40, 50], dtype=float)
+# workclass codes of categories.json: 0 Government, 1 Private, 2 Self-emp-inc, 3 Self-emp-not-inc, 4 Unemployed
+_WORKCLASS_CODE_BINS = {0: 3, 1: 0, 2: 2, 3: 1, 4: 4}
+_WORKCLASS_BIN_TABLE = np.array([3, 0, 2, 1, 4])
+_INCOME_CODES = {'<=50K': 0, '>50K': 1}
+
+# --- Scalar Definitions ---
 def age(inputs):
 	"""Discretizes age into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[0][1]
 	if value < 25:
 		return 0
@@ -18,8 +25,7 @@ def age(inputs):
 	return 3
 
 def hours_per_week(inputs):
-	"""Discretizes hours-per-week into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes hours_per_week into 4 bins."""
 	value = inputs[1][1]
 	if value < 35:
 		return 0
@@ -29,33 +35,15 @@ def hours_per_week(inputs):
 		return 2
 	return 3
 
-# --- Categorical Feature Definition ---
 def workclass(inputs):
-	"""Maps the workclass category to an integer, grouping some classes."""
-	assert(check_num_of_inputs(inputs))
+	"""Maps the workclass code (see categories.json) to an integer."""
 	value = inputs[2][1]
+	return _WORKCLASS_CODE_BINS.get(value, -1)
 
-	if value == 'Private':
-		return 0
-	elif value == 'Self-emp-not-inc':
-		return 1
-	elif value == 'Self-emp-inc':
-		return 2
-	elif value in ['State-gov', 'Local-gov', 'Federal-gov']:
-		return 3  # Grouped 'Government'
-	elif value in ['Without-pay', 'Never-worked']:
-		return 4  # Grouped 'Unemployed'
-	elif value == '?':
-		return 5  # 'Unknown'
-	else:
-		return -1
-
-# --- Label Definition ---
 def income(outputs):
 	"""Maps the income label to an integer."""
 	value = outputs[0][1]
-	mapping = {'<=50K': 0, '>50K': 1}
-	return mapping.get(value, -1)
+	return _INCOME_CODES.get(value, -1)
 
 def retrieve_feature_defs():
 	"""Returns a dictionary mapping all names to their definition functions."""
@@ -64,4 +52,38 @@ def retrieve_feature_defs():
 	feature_defs["hours_per_week"] = hours_per_week
 	feature_defs["workclass"] = workclass
 	feature_defs["income"] = income
-	return feature_defs
\ No newline at end of file
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["age"] = [25, 40, 55]
+	bin_boundaries["hours_per_week"] = [35, 40, 50]
+	bin_boundaries["workclass"] = None
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _age_batch(values):
+	return np.searchsorted(_AGE_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _hours_per_week_batch(values):
+	return np.searchsorted(_HOURS_PER_WEEK_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _workclass_batch(values):
+	codes = np.asarray(values, dtype=np.int64)
+	known = (codes >= 0) & (codes < len(_WORKCLASS_BIN_TABLE))
+	return np.where(known, _WORKCLASS_BIN_TABLE[np.where(known, codes, 0)], -1)
+
+def _income_batch(values):
+	values = np.asarray(values).tolist()
+	codes = map(_INCOME_CODES.get, values, itertools.repeat(-1))
+	return np.fromiter(codes, dtype=np.int64, count=len(values))
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["age"] = _age_batch
+	batch_defs["hours_per_week"] = _hours_per_week_batch
+	batch_defs["workclass"] = _workclass_batch
+	batch_defs["income"] = _income_batch
+	return batch_defs
@@ -1,40 +1,69 @@
 # sampler.py for the 3-feature Banknote dataset (On-Disk Caching Version)
 
 import os
-import pickle
-import random
-import pandas as pd
-from sklearn.tree import DecisionTreeClassifier
+import numpy as np
+from experiments.sampling.batch import generate_unique_columns, samples_from_columns
+from experiments.sampling.bootstrap import BootstrapProgress, write_real_samples
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.density import KernelDensity
+from experiments.sampling.streaming import stream_store
+from experiments.sampling.parallel import generate_parallel, worker_rng
+from experiments.sampling.quasi_random import resume_draw, save_position
+
+from experiments.Banknote3 import feature_defs
 
 # --- Module-level Configuration ---
 _DATA_FILE_PATH = "experiments/Banknote3/data_banknote_authentication.txt"
-_CACHE_FILENAME = "experiments/Banknote3/sampler_cache_banknote.pkl"
+_LEGACY_CACHE_FILENAME = "experiments/Banknote3/sampler_cache_banknote.pkl"
+_LEGACY_CACHE_DIR = "experiments/Banknote3/sampler_cache_banknote"
 _cached_data = {
-    "samples": {},
     "model": None
 }
 _is_cache_loaded = False
+# Called as hook(stage, rows, seconds) for each stage of the initial cache build.
+on_bootstrap_progress = None
 _feature_names = ['variance', 'skewness', 'curtosis']
+# Keyed by the oracle/data contents and the generation domain, so runs with the
+# same inputs share one cache and any change starts a fresh one.
+# With _QUASI_RANDOM set, new samples come from one scrambled Sobol sequence over the
+# same ranges instead of independent uniform draws (see sampling/quasi_random.py).
+_QUASI_RANDOM = False
+_QUASI_RANDOM_SEED = 0
+# With _DISTRIBUTION_MATCHED set, new samples are drawn from a kernel density fitted
+# to the real rows instead of uniformly over their ranges (see sampling/density.py).
+# _QUASI_RANDOM takes precedence if both are set.
+_DISTRIBUTION_MATCHED = False
+_CACHE_DIR = cache_dir(_LEGACY_CACHE_DIR, [_DATA_FILE_PATH], {'features': _feature_names, 'label': 'class', 'quasi_random': _QUASI_RANDOM, 'distribution_matched': _DISTRIBUTION_MATCHED})
 _banknote_data_3_features = None # Will hold the raw feature data
+# Decimal places each float feature is rounded to when deduping new samples;
+# the cache keeps the drawn values in full.
+_KEY_DIGITS = {name: 5 for name in _feature_names}
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'class', key_digits=_KEY_DIGITS)
+_key_index = None
+_rng = np.random.default_rng()
 
 def _load_or_initialize_cache():
     """
-    Loads data from the cache file if it exists. Otherwise, it generates
+    Opens the cache if it exists; the model and real data are only loaded
+    by _load_oracle() once new samples are needed. Otherwise, it generates
     the initial data, trains a model, and creates the cache file.
     """
     global _cached_data, _is_cache_loaded, _banknote_data_3_features
 
-    if os.path.exists(_CACHE_FILENAME):
-        print(f"--- Found cache file '{_CACHE_FILENAME}'. Loading data. ---")
-        with open(_CACHE_FILENAME, 'rb') as f:
-            _cached_data = pickle.load(f)
-        # We still need to load the raw data for min/max calculations
-        df = pd.read_csv(_DATA_FILE_PATH, header=None)
-        df.columns = ['variance', 'skewness', 'curtosis', 'entropy', 'class']
-        _banknote_data_3_features = df[_feature_names]
-            
+    legacy_path = _store.adopt_legacy([_LEGACY_CACHE_DIR, _LEGACY_CACHE_FILENAME])
+    if legacy_path:
+        print(f"--- Imported legacy cache '{legacy_path}' into '{_CACHE_DIR}'. ---")
+
+    if _store.exists():
+        print(f"--- Found cache '{_CACHE_DIR}' ({len(_store)} samples in {_store.num_segments()} segments). ---")
+
     else:
         print(f"--- No cache file found. Initializing model and real samples. ---")
+        import pandas as pd
+        from sklearn.tree import DecisionTreeClassifier
+        progress = BootstrapProgress(on_bootstrap_progress)
         try:
             df = pd.read_csv(_DATA_FILE_PATH, header=None)
         except FileNotFoundError:
@@ -42,6 +71,7 @@ def _load_or_initialize_cache():
             exit()
 
         df.columns = ['variance', 'skewness', 'curtosis', 'entropy', 'class']
+        progress.stage("read", len(df))
         
         _banknote_data_3_features = df[_feature_names]
         labels = df['class']
@@ -51,55 +81,169 @@ def _load_or_initialize_cache():
         model.fit(_banknote_data_3_features.values, labels)
         _cached_data["model"] = model
 
-        label_name = 'class'
-        for index, row in _banknote_data_3_features.iterrows():
-            feature_values = row.values
-            label_value = labels[index]
-            sample_key = tuple((name, val) for name, val in zip(_feature_names, feature_values))
-            sample_value = [(label_name, int(label_value))]
-            _cached_data["samples"][sample_key] = sample_value
-        
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_data, f)
-        print(f"--- Saved initial {len(_cached_data['samples'])} samples to '{_CACHE_FILENAME}'. ---")
+        progress.stage("train", len(labels))
+
+        num_written = write_real_samples(_store, [_banknote_data_3_features[name].values for name in _feature_names], labels.values.astype(int), progress)
+        _store.save_meta(_cached_data)
+        progress.done(num_written)
+        print(f"--- Saved initial {num_written} samples to '{_CACHE_DIR}'. ---")
         
     _is_cache_loaded = True
 
-def uniform(num_of_samples):
+def _load_oracle():
     """
-    Provides samples from the on-disk cache. If more samples are requested
-    than exist, it generates new synthetic ones and updates the cache file.
+    Unpickles the trained model (and encoder) from the cache metadata and
+    reads the real data, on first use. Only generating new samples needs
+    them, so runs served from the cache skip the sklearn/pandas startup.
+    """
+    global _cached_data, _banknote_data_3_features
+    if _cached_data.get("model") is not None:
+        return
+    import pandas as pd
+    _cached_data = _store.load_meta()
+    df = pd.read_csv(_DATA_FILE_PATH, header=None)
+    df.columns = ['variance', 'skewness', 'curtosis', 'entropy', 'class']
+    _banknote_data_3_features = df[_feature_names]
+
+def _density():
+    """
+    The kernel density of the real rows, fitted once and kept in the cache
+    metadata so later runs and worker processes reuse it.
+    """
+    if _cached_data.get("density") is None:
+        _cached_data["density"] = KernelDensity([_banknote_data_3_features[name].values for name in _feature_names])
+        meta = _store.load_meta()
+        meta["density"] = _cached_data["density"]
+        _store.save_meta(meta)
+    return _cached_data["density"]
+
+def _draw_synthetic_batch(n, rng=None):
+    """
+    Draws n candidate rows uniformly over the real data's feature ranges,
+    or from the real data's kernel density with _DISTRIBUTION_MATCHED.
     """
-    global _cached_data
+    rng = _rng if rng is None else rng
+    if _DISTRIBUTION_MATCHED:
+        return _density().sample(n, rng)
+    min_vals = _banknote_data_3_features.min().values
+    max_vals = _banknote_data_3_features.max().values
+    return [rng.uniform(lo, hi, size=n) for lo, hi in zip(min_vals, max_vals)]
 
+def _stratified_cells():
+    """The feature_defs.py bins of each feature, over the real data's ranges."""
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    min_vals = _banknote_data_3_features.min().values
+    max_vals = _banknote_data_3_features.max().values
+    return [continuous_cells(lo, hi, boundaries[name]) for name, lo, hi in zip(_feature_names, min_vals, max_vals)]
+
+def _sampling_box():
+    """Returns (lows, highs, integer flags) of the box synthetic samples are drawn from."""
+    return _banknote_data_3_features.min().values, _banknote_data_3_features.max().values, None
+
+def _quasi_random_draw():
+    """A Sobol draw over the same ranges as _draw_synthetic_batch, resuming the cached sequence."""
+    lows, highs, integer = _sampling_box()
+    return resume_draw(_store, lows, highs, integer, seed=_QUASI_RANDOM_SEED)
+
+def _predict_batch(columns):
+    """Labels a batch of candidate columns with a single model call."""
+    return _cached_data["model"].predict(np.column_stack(columns)).astype(int)
+
+def _generate_shard(count, seed, stream):
+    """Draws and labels one shard of a parallel run in a worker process."""
     if not _is_cache_loaded:
         _load_or_initialize_cache()
-    
-    if num_of_samples > len(_cached_data["samples"]):
-        num_synthetic_needed = num_of_samples - len(_cached_data["samples"])
-        print(f"\n--- Cache has {len(_cached_data['samples'])} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+    _load_oracle()
+    columns = _draw_synthetic_batch(count, worker_rng(seed, stream))
+    return columns, _predict_batch(columns)
 
-        min_vals = _banknote_data_3_features.min().values
-        max_vals = _banknote_data_3_features.max().values
-        
-        for _ in range(num_synthetic_needed):
-            synth_features = [random.uniform(min_vals[i], max_vals[i]) for i in range(len(_feature_names))]
-            synth_label = _cached_data["model"].predict([synth_features])[0]
-            
-            sample_key = tuple((name, val) for name, val in zip(_feature_names, synth_features))
-            sample_value = [('class', int(synth_label))]
-            
-            while sample_key in _cached_data["samples"]:
-                synth_features = [random.uniform(min_vals[i], max_vals[i]) for i in range(len(_feature_names))]
-                sample_key = tuple((name, val) for name, val in zip(_feature_names, synth_features))
-            
-            _cached_data["samples"][sample_key] = sample_value
-
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_data, f)
-        print(f"--- Cache updated. Saved {len(_cached_data['samples'])} total samples to '{_CACHE_FILENAME}'. ---")
-
-    all_samples_list = list(_cached_data["samples"].items())
-    random.shuffle(all_samples_list)
+def _extend_cache(num_of_samples, seed=None, workers=None):
+    """
+    Makes sure the cache holds at least num_of_samples samples, generating
+    and appending the missing ones. `seed` and `workers` are as in uniform.
+    """
+    global _key_index
+
+    # Concurrent runs share this cache: extend it under its lock, after picking
+    # up rows other processes appended, so only what is still missing is made.
+    with _store.lock():
+        _store.refresh()
+        num_cached = len(_store)
+        if num_of_samples > num_cached:
+            num_synthetic_needed = num_of_samples - num_cached
+            print(f"\n--- Cache has {num_cached} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+            _load_oracle()
+
+            if _key_index is None or len(_key_index) != num_cached:
+                _key_index = _store.key_index()
+            if _DISTRIBUTION_MATCHED:
+                _density()   # fitted here, so worker processes load it from the metadata
+            if workers and not _QUASI_RANDOM:
+                if seed is None:
+                    seed = int(_rng.integers(2**63))
+                new_columns, new_labels = generate_parallel(
+                    _generate_shard, num_synthetic_needed, seed, workers, _key_index
+                )
+                _key_index.update_rows(new_columns)
+                _store.append_columns(new_columns, new_labels)
+                num_appended = len(new_labels)
+            else:
+                draw_batch = _quasi_random_draw() if _QUASI_RANDOM else _draw_synthetic_batch
+                new_columns, new_labels = generate_unique_columns(
+                    num_synthetic_needed, draw_batch, _predict_batch, _key_index
+                )
+                if _QUASI_RANDOM:
+                    save_position(_store, draw_batch)
+                _key_index.update_rows(new_columns)
+                _store.append_columns(new_columns, new_labels)
+                num_appended = len(new_labels)
+            print(f"--- Cache updated. Appended {num_appended} samples ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+
+def uniform(num_of_samples, seed=None, workers=None):
+    """
+    Provides samples from the on-disk cache. If more samples are requested
+    than exist, it generates new synthetic ones and updates the cache file.
+    Pass `seed` to make the choice of returned samples reproducible. With
+    `workers`, new samples are generated by that many processes, each on its
+    own RNG stream derived from `seed`, so the appended samples are identical
+    for a given seed and worker count (not with _QUASI_RANDOM, whose single
+    sequence is drawn in this process).
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
     
-    return dict(all_samples_list[:num_of_samples])
\ No newline at end of file
+    _extend_cache(num_of_samples, seed, workers)
+
+    # Only the selected rows are read from the memory-mapped columns.
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return _store.sample(num_of_samples, rng)
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the samples uniform() would return as dicts of up to `chunk_size`
+    samples. Missing samples are generated one chunk at a time, and with
+    `prefetch` the next chunk is made on a background thread while the caller
+    handles the current one. `memory_budget` (in bytes) shrinks the chunks
+    so the ones in flight fit in it.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(_store, num_of_samples, rng, _extend_cache, chunk_size, prefetch, memory_budget)
+
+def stratified(samples_per_cell, seed=None):
+    """
+    Returns `samples_per_cell` new samples inside every cell of the bins in
+    feature_defs.py, so every cell is covered with few model calls. The
+    samples are labelled in one batch and are not added to the cache, which
+    holds uniform draws only.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+    _load_oracle()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    columns = draw_per_cell(_stratified_cells(), samples_per_cell, rng)
+    return samples_from_columns(columns, _predict_batch(columns), _feature_names, 'class')
@@ -1,12 +1,16 @@
-# feature_defs.py for the 4-feature Banknote Authentication dataset
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-	"""Checks that there are 4 features."""
-	return len(inputs) == 4
+import numpy as np
 
+# --- Lookup Tables ---
+_VARIANCE_BOUNDARIES = np.array([-2.0, 0.0, 2.0], dtype=float)
+_SKEWNESS_BOUNDARIES = np.array([-5.0, 0.0, 5.0], dtype=float)
+_CURTOSIS_BOUNDARIES = np.array([0.0, 5.0, 10.0], dtype=float)
+_ENTROPY_BOUNDARIES = np.array([-5.0, -2.0, 0.0], dtype=float)
+
+# --- Scalar Definitions ---
 def variance(inputs):
 	"""Discretizes variance into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[0][1]
 	if value < -2.0:
 		return 0
@@ -18,7 +22,6 @@ def variance(inputs):
 
 def skewness(inputs):
 	"""Discretizes skewness into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[1][1]
 	if value < -5.0:
 		return 0
@@ -30,7 +33,6 @@ def skewness(inputs):
 
 def curtosis(inputs):
 	"""Discretizes curtosis into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[2][1]
 	if value < 0.0:
 		return 0
@@ -42,7 +44,6 @@ def curtosis(inputs):
 
 def entropy(inputs):
 	"""Discretizes entropy into 4 bins."""
-	assert(check_num_of_inputs(inputs))
 	value = inputs[3][1]
 	if value < -5.0:
 		return 0
@@ -53,12 +54,12 @@ def entropy(inputs):
 	return 3
 
 def CLASS(outputs):
-	"""Returns the predicted class (0 for genuine, 1 for forged)."""
+	"""Returns the class value, one bin per value."""
 	value = outputs[0][1]
 	return value
 
 def retrieve_feature_defs():
-	"""Returns a dictionary mapping feature names to their definition functions."""
+	"""Returns a dictionary mapping all names to their definition functions."""
 	feature_defs = {}
 	feature_defs["variance"] = variance
 	feature_defs["skewness"] = skewness
@@ -66,3 +67,38 @@ def retrieve_feature_defs():
 	feature_defs["entropy"] = entropy
 	feature_defs["class"] = CLASS
 	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["variance"] = [-2.0, 0.0, 2.0]
+	bin_boundaries["skewness"] = [-5.0, 0.0, 5.0]
+	bin_boundaries["curtosis"] = [0.0, 5.0, 10.0]
+	bin_boundaries["entropy"] = [-5.0, -2.0, 0.0]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _variance_batch(values):
+	return np.searchsorted(_VARIANCE_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _skewness_batch(values):
+	return np.searchsorted(_SKEWNESS_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _curtosis_batch(values):
+	return np.searchsorted(_CURTOSIS_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _entropy_batch(values):
+	return np.searchsorted(_ENTROPY_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _class_batch(values):
+	return np.asarray(values)
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["variance"] = _variance_batch
+	batch_defs["skewness"] = _skewness_batch
+	batch_defs["curtosis"] = _curtosis_batch
+	batch_defs["entropy"] = _entropy_batch
+	batch_defs["class"] = _class_batch
+	return batch_defs
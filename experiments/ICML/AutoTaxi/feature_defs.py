@@ -1,14 +1,19 @@
-#Generated file 
-def check_num_of_inputs(inputs):
-	return len(inputs)==3
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
+import numpy as np
+
+# --- Lookup Tables ---
+_DAY_TIME_BOUNDARIES = np.array([56000.0, 72000.0, 90000.0], dtype=float)
+_INIT_POS_BOUNDARIES = np.array([-2.5, 0, 2.5], dtype=float)
+
+# --- Scalar Definitions ---
 def clouds(inputs):
-	assert(check_num_of_inputs(inputs))
+	"""Returns the clouds value, one bin per value."""
 	value = inputs[0][1]
 	return value
 
 def day_time(inputs):
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes day_time into 4 bins."""
 	value = inputs[1][1]
 	if value < 56000.0:
 		return 0
@@ -19,7 +24,7 @@ def day_time(inputs):
 	return 3
 
 def init_pos(inputs):
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes init_pos into 4 bins."""
 	value = inputs[2][1]
 	if value < -2.5:
 		return 0
@@ -30,13 +35,45 @@ def init_pos(inputs):
 	return 3
 
 def alert(outputs):
+	"""Returns the alert value, one bin per value."""
 	value = outputs[0][1]
 	return value
 
-def retrieve_feature_defs(): 
-	feature_defs = {} 
+def retrieve_feature_defs():
+	"""Returns a dictionary mapping all names to their definition functions."""
+	feature_defs = {}
 	feature_defs["clouds"] = clouds
 	feature_defs["day_time"] = day_time
 	feature_defs["init_pos"] = init_pos
 	feature_defs["alert"] = alert
-	return feature_defs 
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["clouds"] = None
+	bin_boundaries["day_time"] = [56000.0, 72000.0, 90000.0]
+	bin_boundaries["init_pos"] = [-2.5, 0, 2.5]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _clouds_batch(values):
+	return np.asarray(values)
+
+def _day_time_batch(values):
+	return np.searchsorted(_DAY_TIME_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _init_pos_batch(values):
+	return np.searchsorted(_INIT_POS_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _alert_batch(values):
+	return np.asarray(values)
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["clouds"] = _clouds_batch
+	batch_defs["day_time"] = _day_time_batch
+	batch_defs["init_pos"] = _init_pos_batch
+	batch_defs["alert"] = _alert_batch
+	return batch_defs
@@ -1,42 +1,43 @@
-import pandas as pd
-import random
+import numpy as np
+from experiments.sampling.snapshot import load_csv_snapshot
+from experiments.sampling.streaming import stream_store
 
-def uniform(num_of_samples):
-    """
-    Directly reads the data.csv file, formats it, and returns a
-    random subset of the requested size on every run.
-    """
-    
-    csv_source_file = "experiments/ICML/AutoTaxi/data.csv"
+_CSV_SOURCE_FILE = "experiments/ICML/AutoTaxi/data.csv"
+_SNAPSHOT_DIR = "experiments/ICML/AutoTaxi/data.snapshot"
+_feature_names = ['clouds', 'day_time', 'init_pos']
+_label_name = 'alert'
+_rng = np.random.default_rng()
 
+def _load_store():
     try:
-        df = pd.read_csv(csv_source_file)
+        # **FIX**: Convert specific columns to integers to ensure correct formatting.
+        return load_csv_snapshot(_CSV_SOURCE_FILE, _SNAPSHOT_DIR, _feature_names, _label_name,
+                                 dtypes={'clouds': int, 'alert': int})
     except FileNotFoundError:
-        print(f"\nFATAL ERROR: Source CSV file not found at '{csv_source_file}'.\n")
-        return {}
+        print(f"\nFATAL ERROR: Source CSV file not found at '{_CSV_SOURCE_FILE}'.\n")
+        return None
 
-    # **FIX**: Convert specific columns to integers to ensure correct formatting.
-    df['clouds'] = df['clouds'].astype(int)
-    df['alert'] = df['alert'].astype(int)
+def uniform(num_of_samples, seed=None):
+    """
+    Returns a random subset of the requested size from data.csv. The CSV is
+    converted once into a typed binary snapshot, which is reused until the
+    CSV changes; each call only reads the rows it returns.
+    """
+    store = _load_store()
+    if store is None:
+        return {}
 
-    feature_names = ['clouds', 'day_time', 'init_pos']
-    label_name = 'alert'
-    
-    samples = {}
-    for index, row in df.iterrows():
-        sample_key = tuple(
-            (name, row[name]) for name in feature_names
-        )
-        
-        label_value = row[label_name]
-        sample_value = [(label_name, label_value)]
-        
-        samples[sample_key] = sample_value
-    
-    if num_of_samples >= len(samples):
-        return samples
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return store.sample(num_of_samples, rng)
 
-    all_samples_list = list(samples.items())
-    random.shuffle(all_samples_list)
-    
-    return dict(all_samples_list[:num_of_samples])
\ No newline at end of file
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the subset uniform() would return as dicts of up to `chunk_size`
+    samples, reading the next chunk on a background thread with `prefetch`.
+    `memory_budget` (in bytes) shrinks the chunks to fit.
+    """
+    store = _load_store()
+    if store is None:
+        return iter(())
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(store, num_of_samples, rng, None, chunk_size, prefetch, memory_budget)
@@ -1,17 +1,73 @@
 from experiments.ICML.AutoTaxi import model as bb
+from experiments.ICML.AutoTaxi import feature_defs
+from experiments.sampling.batch import samples_from_columns
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.exhaustive import grid_axis, label_grid
+from experiments.sampling.parallel import generate_parallel, worker_rng
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.streaming import iter_chunks, resolve_chunk_size, stream_store
 
 import random
 from random import choice
 import math
+import numpy as np
 random.seed(40)
 
+# --- Exhaustive mode ---
+# With _EXHAUSTIVE set, the integer clouds axis and the continuous day_time and
+# init_pos axes (quantized with the steps below, over the same ranges as the
+# random draws in uniform) form a finite grid. The grid is labelled once,
+# cached, and uniform() returns random rows of it.
+_EXHAUSTIVE = False
+_DAY_TIME_STEP = 250.0
+_INIT_POS_STEP = 0.05
+_feature_names = ['clouds', 'day_time', 'init_pos']
+_grid_axes = [np.arange(0, 6), grid_axis(50000.0, 95000.0, _DAY_TIME_STEP), grid_axis(0.0, 8.0, _INIT_POS_STEP)]
+_CACHE_DIR = cache_dir("experiments/ICML/AutoTaxi/sampler5_cache_grid", [bb.__file__],
+                       {'features': _feature_names, 'grid': [axis.tolist() for axis in _grid_axes]})
+# Decimal places each float feature is rounded to when deduping new samples;
+# the cache keeps the drawn values in full.
+_KEY_DIGITS = {'day_time': 4, 'init_pos': 4}
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'alert', key_digits=_KEY_DIGITS)
+_rng = np.random.default_rng(40)
+
 def truncate(number, digits) -> float:
     stepper = 10.0 ** digits
     return math.trunc(stepper * number) / stepper
 
 
 
-def uniform(num_of_samples):
+def _execute_batch(columns):
+    """Labels grid columns with the model. execute() is scalar, so this is one pass over the rows."""
+    rows = zip(*(column.tolist() for column in columns))
+    return np.fromiter((bb.execute(dict(zip(_feature_names, row))) for row in rows),
+                       dtype=np.int64, count=len(columns[0]))
+
+def _generate_shard(count, seed, stream):
+    """Draws one shard of a parallel run, with the same ranges and truncation as uniform."""
+    rng = worker_rng(seed, stream)
+    stepper = 10.0 ** 4
+    columns = [rng.integers(0, 6, size=count),
+               np.trunc(stepper * np.abs(rng.uniform(50000.0, 95000.0, size=count))) / stepper,
+               np.trunc(stepper * np.abs(rng.uniform(-8.0, 8.0, size=count))) / stepper]
+    return columns, _execute_batch(columns)
+
+def uniform(num_of_samples, workers=None, seed=40):
+    """
+    Returns num_of_samples labelled draws. With `workers`, the draws are split
+    across that many processes, each on its own RNG stream derived from
+    `seed`; the result is identical for a given seed and worker count.
+    """
+
+    if _EXHAUSTIVE:
+        label_grid(_store, _grid_axes, _execute_batch)
+        return _store.sample(num_of_samples, _rng)
+
+    if workers:
+        columns, labels = generate_parallel(_generate_shard, num_of_samples, seed, workers, top_up=False)
+        rows = zip(*(column.tolist() for column in columns + [labels]))
+        return {tuple(zip(_feature_names, row[:-1])): [("alert", row[-1])] for row in rows}
 
     samples = {}
 
@@ -50,4 +106,33 @@ def uniform(num_of_samples):
         samples[(feature1_name,feature1_value),(feature2_name,feature2_value),(feature3_name,feature3_value)] = [("alert",prediction_value)]
 
 
-    return samples
\ No newline at end of file
+    return samples
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None):
+    """
+    Streams the draws of uniform() as dicts of up to `chunk_size` samples,
+    continuing the same random sequence. With `prefetch` the next chunk is
+    drawn and labelled on a background thread while the caller handles the
+    current one; `memory_budget` (in bytes) shrinks the chunks to fit.
+    """
+    if _EXHAUSTIVE:
+        label_grid(_store, _grid_axes, _execute_batch)
+        return stream_store(_store, num_of_samples, _rng, None, chunk_size, prefetch, memory_budget)
+    chunk_size = resolve_chunk_size(chunk_size, memory_budget, len(_feature_names))
+    return iter_chunks(lambda start, count: uniform(count), num_of_samples, chunk_size, prefetch)
+
+def stratified(samples_per_cell, seed=40):
+    """
+    Returns `samples_per_cell` draws inside every cell of the bins in
+    feature_defs.py, over the same ranges and with the same truncation as
+    uniform, labelled with the model.
+    """
+    rng = np.random.default_rng(seed)
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    cells = [discrete_cells(np.arange(0, 6), boundaries['clouds']),
+             continuous_cells(50000.0, 95000.0, boundaries['day_time']),
+             continuous_cells(0.0, 8.0, boundaries['init_pos'])]
+    columns = draw_per_cell(cells, samples_per_cell, rng)
+    stepper = 10.0 ** 4
+    columns[1:] = [np.trunc(stepper * column) / stepper for column in columns[1:]]
+    return samples_from_columns(columns, _execute_batch(columns), _feature_names, 'alert')
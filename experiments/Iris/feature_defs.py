@@ -1,12 +1,16 @@
-# feature_defs.py for the 4-feature Iris dataset
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-	"""Checks that there are 4 features."""
-	return len(inputs) == 4
+import numpy as np
 
+# --- Lookup Tables ---
+_SEPAL_LENGTH_BOUNDARIES = np.array([5.5, 6.5, 7.5], dtype=float)
+_SEPAL_WIDTH_BOUNDARIES = np.array([2.8, 3.3, 3.8], dtype=float)
+_PETAL_LENGTH_BOUNDARIES = np.array([2.0, 4.0, 6.0], dtype=float)
+_PETAL_WIDTH_BOUNDARIES = np.array([0.8, 1.6, 2.4], dtype=float)
+
+# --- Scalar Definitions ---
 def sepal_length(inputs):
-	"""Discretizes Sepal Length into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes sepal_length into 4 bins."""
 	value = inputs[0][1]
 	if value < 5.5:
 		return 0
@@ -17,8 +21,7 @@ def sepal_length(inputs):
 	return 3
 
 def sepal_width(inputs):
-	"""Discretizes Sepal Width into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes sepal_width into 4 bins."""
 	value = inputs[1][1]
 	if value < 2.8:
 		return 0
@@ -29,8 +32,7 @@ def sepal_width(inputs):
 	return 3
 
 def petal_length(inputs):
-	"""Discretizes Petal Length into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes petal_length into 4 bins."""
 	value = inputs[2][1]
 	if value < 2.0:
 		return 0
@@ -41,8 +43,7 @@ def petal_length(inputs):
 	return 3
 
 def petal_width(inputs):
-	"""Discretizes Petal Width into 4 bins."""
-	assert(check_num_of_inputs(inputs))
+	"""Discretizes petal_width into 4 bins."""
 	value = inputs[3][1]
 	if value < 0.8:
 		return 0
@@ -53,16 +54,51 @@ def petal_width(inputs):
 	return 3
 
 def species(outputs):
-	"""Returns the predicted class for the species label."""
+	"""Returns the species value, one bin per value."""
 	value = outputs[0][1]
 	return value
 
 def retrieve_feature_defs():
-	"""Returns a dictionary mapping feature names to their definition functions."""
+	"""Returns a dictionary mapping all names to their definition functions."""
 	feature_defs = {}
 	feature_defs["sepal_length"] = sepal_length
 	feature_defs["sepal_width"] = sepal_width
 	feature_defs["petal_length"] = petal_length
 	feature_defs["petal_width"] = petal_width
 	feature_defs["species"] = species
-	return feature_defs
\ No newline at end of file
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["sepal_length"] = [5.5, 6.5, 7.5]
+	bin_boundaries["sepal_width"] = [2.8, 3.3, 3.8]
+	bin_boundaries["petal_length"] = [2.0, 4.0, 6.0]
+	bin_boundaries["petal_width"] = [0.8, 1.6, 2.4]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _sepal_length_batch(values):
+	return np.searchsorted(_SEPAL_LENGTH_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _sepal_width_batch(values):
+	return np.searchsorted(_SEPAL_WIDTH_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _petal_length_batch(values):
+	return np.searchsorted(_PETAL_LENGTH_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _petal_width_batch(values):
+	return np.searchsorted(_PETAL_WIDTH_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _species_batch(values):
+	return np.asarray(values)
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["sepal_length"] = _sepal_length_batch
+	batch_defs["sepal_width"] = _sepal_width_batch
+	batch_defs["petal_length"] = _petal_length_batch
+	batch_defs["petal_width"] = _petal_width_batch
+	batch_defs["species"] = _species_batch
+	return batch_defs
@@ -0,0 +1,97 @@
+# active.py -- oracle queries needed to reach a holdout accuracy: active vs uniform draws
+#
+# For each dataset, training sets of growing size are labelled with the
+# sampler's oracle, either drawn uniformly over the sampler's box (as
+# uniform() does) or by active sampling over the feature_defs cells, steered
+# by the newest synthesized program where the dataset has one. Both are
+# scored by the holdout accuracy of the per-cell majority label (see
+# holdout.py). The target accuracy is the holdout's own per-cell optimum
+# minus a tolerance.
+#
+# Usage: python -m experiments.benchmarks.active [--datasets california_census Iris ...]
+#            [--tolerance 0.01] [--repeats 5] [--rounds 8] [--json results.json]
+
+import argparse
+import importlib
+import json
+
+import numpy as np
+
+from experiments.benchmarks.holdout import cell_codes, labeller, majority_accuracy, uniform_draw
+from experiments.sampling.active import active_sample, latest_program, load_program
+
+_DATASETS = ['california_census', 'loan_acquisition', 'Iris', 'Iris3', 'Banknote3', 'Banknote4']
+_SIZES = [2 ** k for k in range(5, 15)]
+_HOLDOUT_SIZE = 200000
+
+def run(dataset, tolerance, repeats, rounds):
+    sampler = importlib.import_module(f"experiments.{dataset}.sampler")
+    feature_defs = importlib.import_module(f"experiments.{dataset}.feature_defs")
+    label = labeller(sampler)
+    all_boundaries = feature_defs.retrieve_bin_boundaries()
+    boundaries = [all_boundaries[name] for name in sampler._feature_names]
+    num_cells = int(np.prod([len(b) + 1 for b in boundaries]))
+    lows, highs, integer = sampler._sampling_box()
+    axes_cells = sampler._stratified_cells()
+
+    program_path = latest_program(sampler._PREVIOUS_RUNS_DIR) if hasattr(sampler, '_PREVIOUS_RUNS_DIR') else None
+    execute = load_program(program_path) if program_path else None
+    label_name = sampler._store.label_name
+
+    holdout = uniform_draw(lows, highs, integer, np.random.default_rng(12345), _HOLDOUT_SIZE)
+    label_values, test_labels = np.unique(np.asarray(label(holdout)), return_inverse=True)
+    test_cells = cell_codes(holdout, boundaries)
+    best = majority_accuracy(test_cells, test_labels, test_cells, test_labels, num_cells)
+
+    def accuracy(columns, labels):
+        train_labels = np.searchsorted(label_values, np.asarray(labels))
+        return majority_accuracy(cell_codes(columns, boundaries), train_labels, test_cells, test_labels, num_cells)
+
+    def active_accuracy(n, r):
+        columns, labels = active_sample(axes_cells, label, n, np.random.default_rng(r), execute,
+                                        feature_defs.retrieve_feature_defs(), label_name, rounds)
+        return accuracy(columns, labels)
+
+    curves = {"uniform": [], "active": []}
+    for n in _SIZES:
+        draws = [uniform_draw(lows, highs, integer, np.random.default_rng(r), n) for r in range(repeats)]
+        curves["uniform"].append(np.mean([accuracy(columns, label(columns)) for columns in draws]))
+        curves["active"].append(np.mean([active_accuracy(n, r) for r in range(repeats)]))
+
+    target = best - tolerance
+    needed = {name: next((n for n, acc in zip(_SIZES, curve) if acc >= target), None) for name, curve in curves.items()}
+    return {"dataset": dataset, "cells": num_cells, "program": program_path, "best_accuracy": best,
+            "target_accuracy": target, "sizes": _SIZES,
+            "accuracy": {name: [float(a) for a in curve] for name, curve in curves.items()},
+            "samples_needed": needed}
+
+def _print_result(result):
+    print(f"\n--- {result['dataset']}: {result['cells']} cells, target holdout accuracy {result['target_accuracy']:.4f} ---")
+    if result["program"]:
+        print(f"program: {result['program']}")
+    print(f"{'queries':>8} {'uniform':>9} {'active':>9}")
+    for n, u, a in zip(result["sizes"], result["accuracy"]["uniform"], result["accuracy"]["active"]):
+        print(f"{n:>8} {u:>9.4f} {a:>9.4f}")
+    print(f"queries needed: uniform {result['samples_needed']['uniform']}, active {result['samples_needed']['active']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Active vs uniform oracle queries to reach a holdout accuracy.")
+    parser.add_argument("--datasets", nargs="+", default=_DATASETS)
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=8)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for dataset in args.datasets:
+        try:
+            result = run(dataset, args.tolerance, args.repeats, args.rounds)
+        except ImportError as error:
+            print(f"\n--- Skipping {dataset}: {error} ---")
+            continue
+        _print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
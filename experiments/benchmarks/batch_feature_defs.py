@@ -0,0 +1,99 @@
+# batch_feature_defs.py -- retrieve_batch_feature_defs() against the scalar feature_defs
+#
+# For every dataset, --samples rows drawn by the sampler into a temporary
+# cache are discretized twice: row by row with the scalar functions of
+# retrieve_feature_defs(), called as the synthesizer calls them, and column
+# by column with retrieve_batch_feature_defs(). Every feature and label must
+# agree on every row; the script exits non-zero otherwise. Both timings are
+# reported.
+#
+# Usage: python -m experiments.benchmarks.batch_feature_defs [--datasets Adult3 Iris ...]
+#            [--samples 100000] [--stand-in]
+
+import argparse
+import importlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from experiments.benchmarks.suite import SAMPLERS, _redirect_caches, install_stand_in
+
+# Dataset (as its feature_defs package) -> the sampler whose cache is checked.
+_DATASETS = {
+    'Adult3': 'Adult3', 'Adult3_1': 'Adult3_1', 'Iris': 'Iris', 'Iris3': 'Iris3',
+    'Banknote3': 'Banknote3', 'Banknote4': 'Banknote4', 'california_census': 'california_census',
+    'loan_acquisition': 'loan_acquisition', 'theorem_prover': 'theorem_prover',
+    'ICML.AutoTaxi': 'ICML/AutoTaxi/sampler',
+}
+
+def cached_columns(sampler_name, samples, force_stand_in=False):
+    """
+    The (feature columns, labels, feature names, label name) of `samples`
+    rows (fewer if the sampler cannot generate them) drawn into a cache in a
+    temporary directory, so rows labelled by a stand-in oracle never reach
+    the sampler's real cache.
+    """
+    module_name, num_outputs = SAMPLERS[sampler_name]
+    sampler = importlib.import_module(module_name)
+    with tempfile.TemporaryDirectory(prefix="sampler_batch_defs_") as cache_root:
+        _redirect_caches(sampler, cache_root)
+        install_stand_in(sampler, num_outputs, force_stand_in)
+        sampler.uniform(samples, seed=0)
+        store = sampler._load_store() if hasattr(sampler, '_load_store') else sampler._store
+        store.refresh()
+        # columns() concatenates into new arrays, so nothing stays mapped from the directory.
+        features, labels = store.columns()
+        store.refresh()
+    return features, labels, store.feature_names, store.label_name
+
+def scalar_bins(feature_defs, features, labels, feature_names, label_name):
+    """Every feature and label function applied row by row, as the synthesizer does."""
+    rows = [list(zip(feature_names, row)) for row in zip(*(column.tolist() for column in features))]
+    results = {name: np.array([feature_defs[name](row) for row in rows]) for name in feature_names}
+    results[label_name] = np.array([feature_defs[label_name]([(label_name, value)]) for value in labels.tolist()])
+    return results
+
+def batch_bins(batch_defs, features, labels, feature_names, label_name):
+    results = {name: batch_defs[name](column) for name, column in zip(feature_names, features)}
+    results[label_name] = batch_defs[label_name](labels)
+    return results
+
+def check(dataset, samples, force_stand_in=False):
+    """Returns (rows, scalar seconds, batch seconds, names of the definitions that disagree)."""
+    features, labels, feature_names, label_name = cached_columns(_DATASETS[dataset], samples, force_stand_in)
+    feature_defs = importlib.import_module(f"experiments.{dataset}.feature_defs")
+
+    start = time.perf_counter()
+    expected = scalar_bins(feature_defs.retrieve_feature_defs(), features, labels, feature_names, label_name)
+    scalar_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = batch_bins(feature_defs.retrieve_batch_feature_defs(), features, labels, feature_names, label_name)
+    batch_seconds = time.perf_counter() - start
+
+    mismatched = [name for name in expected if not np.array_equal(expected[name], np.asarray(actual[name]))]
+    return len(labels), scalar_seconds, batch_seconds, mismatched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the batch feature_defs against the scalar ones on cached samples.")
+    parser.add_argument("--datasets", nargs="+", default=list(_DATASETS), choices=list(_DATASETS))
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--stand-in", action="store_true", help="use stand-in TF oracles even if the real ones load")
+    args = parser.parse_args()
+
+    results = []
+    for dataset in args.datasets:
+        try:
+            results.append((dataset,) + check(dataset, args.samples, args.stand_in))
+        except ImportError as error:
+            print(f"--- Skipping {dataset}: {error} ---")
+
+    print(f"{'dataset':>18} {'rows':>8} {'scalar s':>9} {'batch s':>9} {'speedup':>8}   result")
+    failed = False
+    for dataset, rows, scalar_seconds, batch_seconds, mismatched in results:
+        failed = failed or bool(mismatched)
+        verdict = f"MISMATCH in {', '.join(mismatched)}" if mismatched else "identical"
+        print(f"{dataset:>18} {rows:>8} {scalar_seconds:>9.3f} {batch_seconds:>9.4f} "
+              f"{scalar_seconds / max(batch_seconds, 1e-9):>7.0f}x   {verdict}")
+    sys.exit(1 if failed else 0)
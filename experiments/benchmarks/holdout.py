@@ -0,0 +1,38 @@
+# holdout.py -- shared pieces of the sample-efficiency benchmarks
+#
+# Every benchmark here scores a training set by the holdout accuracy of the
+# per-cell majority label over the feature_defs bins, which is what an
+# unrestricted decision diagram over those bins converges to.
+
+import numpy as np
+
+def labeller(sampler):
+    """The sampler's batch oracle, as a function of raw columns."""
+    if hasattr(sampler, '_MODEL_PATH'):
+        from experiments.sampling.oracle_pool import get_oracle
+        model = get_oracle(sampler._MODEL_PATH)
+        return lambda columns: sampler._predict_batch(model, columns)
+    if not sampler._is_cache_loaded:
+        with sampler._store.lock():
+            sampler._load_or_initialize_cache()
+    sampler._load_oracle()
+    return sampler._predict_batch
+
+def uniform_draw(lows, highs, integer, rng, n):
+    """n independent uniform draws over a sampler's box, as columns."""
+    integer = np.zeros(len(lows), dtype=bool) if integer is None else integer
+    return [rng.integers(lo, hi, size=n, endpoint=True) if is_int else rng.uniform(lo, hi, size=n)
+            for lo, hi, is_int in zip(lows, highs, integer)]
+
+def cell_codes(columns, boundaries):
+    """Cell number of every row, cells being the product of the per-feature bins."""
+    codes = [np.searchsorted(np.asarray(b, dtype=float), column, side='right') for column, b in zip(columns, boundaries)]
+    return np.ravel_multi_index(codes, [len(b) + 1 for b in boundaries])
+
+def majority_accuracy(train_cells, train_labels, test_cells, test_labels, num_cells):
+    """Holdout accuracy of the per-cell majority label of the training rows."""
+    counts = np.zeros((num_cells, test_labels.max() + 1))
+    np.add.at(counts, (train_cells, train_labels), 1)
+    majority = counts.argmax(axis=1)
+    majority[counts.sum(axis=1) == 0] = np.bincount(train_labels).argmax()
+    return float(np.mean(majority[test_cells] == test_labels))
@@ -0,0 +1,70 @@
+# programs.py -- synthesized programs as written against their program_codegen rewrites
+#
+# Every program_ms_*.py under the datasets' previous_runs is run twice over
+# the rows of its dataset's sample cache (filled to --samples first): as the
+# synthesizer wrote it, and as program_codegen rewrites it. Both must give the
+# same output on every row, or fail with the same exception; the script exits
+# non-zero otherwise. The time per call of both is reported.
+#
+# Usage: python -m experiments.benchmarks.programs [experiments/Iris3/previous_runs ...]
+#            [--samples 20000] [--stand-in]
+
+import argparse
+import sys
+import time
+
+from experiments.benchmarks.batch_feature_defs import _DATASETS, cached_columns
+from experiments.sampling.active import load_program
+from experiments.sampling.program_codegen import parse_program, program_paths
+
+def _outcomes(execute, rows):
+    outcomes = []
+    for row in rows:
+        try:
+            outcomes.append(execute(row))
+        except (KeyError, IndexError) as error:
+            outcomes.append(type(error).__name__)
+    return outcomes
+
+def dataset_of(path):
+    """The feature_defs package a program imports, e.g. 'ICML.AutoTaxi'."""
+    with open(path, 'r') as f:
+        feature_defs_dir = parse_program(f.read()).feature_defs_dir
+    return ".".join(part for part in feature_defs_dir.split("/")[1:] if part)
+
+def compare(path, rows):
+    """Returns (seconds per call as written, seconds per call rewritten, rows whose outcomes differ)."""
+    timings, results = [], []
+    for rewritten in (False, True):
+        execute = load_program(path, rewritten)
+        start = time.perf_counter()
+        results.append(_outcomes(execute, rows))
+        timings.append((time.perf_counter() - start) / len(rows))
+    return timings[0], timings[1], sum(a != b for a, b in zip(*results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks rewritten synthesized programs against the originals.")
+    parser.add_argument("paths", nargs="*", default=["experiments"], help="program files or directories to search")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--stand-in", action="store_true", help="use stand-in TF oracles even if the real ones load")
+    args = parser.parse_args()
+
+    rows_of = {}
+    failed = False
+    print(f"{'original us':>12} {'rewritten us':>13} {'speedup':>8}   program")
+    for path in program_paths(args.paths):
+        dataset = dataset_of(path)
+        if dataset not in rows_of:
+            try:
+                features, _, _, _ = cached_columns(_DATASETS[dataset], args.samples, args.stand_in)
+            except ImportError as error:
+                print(f"--- Skipping {dataset}: {error} ---")
+                features = None
+            rows_of[dataset] = None if features is None else [list(row) for row in zip(*(column.tolist() for column in features))]
+        if rows_of[dataset] is None:
+            continue
+        original, rewritten, mismatched = compare(path, rows_of[dataset])
+        failed = failed or bool(mismatched)
+        verdict = f"  MISMATCH on {mismatched} rows" if mismatched else ""
+        print(f"{original * 1e6:>12.2f} {rewritten * 1e6:>13.2f} {original / rewritten:>7.1f}x   {path}{verdict}")
+    sys.exit(1 if failed else 0)
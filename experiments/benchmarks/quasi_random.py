@@ -0,0 +1,83 @@
+# quasi_random.py -- samples needed to reach a holdout accuracy: Sobol vs uniform draws
+#
+# For each dataset, training sets of growing size are drawn from the sampler's
+# box either uniformly (as uniform() does) or from a scrambled Sobol sequence,
+# and labelled with the sampler's oracle. The classifier is the per-cell
+# majority label over the feature_defs bins, which is what an unrestricted
+# decision diagram over those bins converges to. It is scored on a large
+# uniform holdout. The target accuracy is the holdout's own per-cell optimum
+# minus a tolerance.
+#
+# Usage: python -m experiments.benchmarks.quasi_random [--datasets Iris Banknote3 ...]
+#            [--tolerance 0.01] [--repeats 5] [--json results.json]
+
+import argparse
+import importlib
+import json
+
+import numpy as np
+
+from experiments.benchmarks.holdout import cell_codes, labeller, majority_accuracy, uniform_draw
+from experiments.sampling.quasi_random import SobolDraw
+
+_DATASETS = ['Iris', 'Iris3', 'Banknote3', 'Banknote4', 'california_census', 'loan_acquisition']
+_SIZES = [2 ** k for k in range(5, 16)]
+_HOLDOUT_SIZE = 200000
+
+def run(dataset, tolerance, repeats):
+    sampler = importlib.import_module(f"experiments.{dataset}.sampler")
+    feature_defs = importlib.import_module(f"experiments.{dataset}.feature_defs")
+    label = labeller(sampler)
+    all_boundaries = feature_defs.retrieve_bin_boundaries()
+    boundaries = [all_boundaries[name] for name in sampler._feature_names]
+    num_cells = int(np.prod([len(b) + 1 for b in boundaries]))
+    lows, highs, integer = sampler._sampling_box()
+
+    holdout = uniform_draw(lows, highs, integer, np.random.default_rng(12345), _HOLDOUT_SIZE)
+    label_values, test_labels = np.unique(np.asarray(label(holdout)), return_inverse=True)
+    test_cells = cell_codes(holdout, boundaries)
+    best = majority_accuracy(test_cells, test_labels, test_cells, test_labels, num_cells)
+
+    def accuracy(columns):
+        train_labels = np.searchsorted(label_values, np.asarray(label(columns)))
+        return majority_accuracy(cell_codes(columns, boundaries), train_labels, test_cells, test_labels, num_cells)
+
+    curves = {"uniform": [], "sobol": []}
+    for n in _SIZES:
+        curves["uniform"].append(np.mean([accuracy(uniform_draw(lows, highs, integer, np.random.default_rng(r), n))
+                                          for r in range(repeats)]))
+        curves["sobol"].append(np.mean([accuracy(SobolDraw(lows, highs, integer, seed=r)(n)) for r in range(repeats)]))
+
+    target = best - tolerance
+    needed = {name: next((n for n, acc in zip(_SIZES, curve) if acc >= target), None) for name, curve in curves.items()}
+    return {"dataset": dataset, "cells": num_cells, "best_accuracy": best, "target_accuracy": target,
+            "sizes": _SIZES, "accuracy": {name: [float(a) for a in curve] for name, curve in curves.items()},
+            "samples_needed": needed}
+
+def _print_result(result):
+    print(f"\n--- {result['dataset']}: {result['cells']} cells, target holdout accuracy {result['target_accuracy']:.4f} ---")
+    print(f"{'samples':>8} {'uniform':>9} {'sobol':>9}")
+    for n, u, s in zip(result["sizes"], result["accuracy"]["uniform"], result["accuracy"]["sobol"]):
+        print(f"{n:>8} {u:>9.4f} {s:>9.4f}")
+    print(f"samples needed: uniform {result['samples_needed']['uniform']}, sobol {result['samples_needed']['sobol']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sobol vs uniform sample counts to reach a holdout accuracy.")
+    parser.add_argument("--datasets", nargs="+", default=_DATASETS)
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for dataset in args.datasets:
+        try:
+            result = run(dataset, args.tolerance, args.repeats)
+        except ImportError as error:
+            print(f"\n--- Skipping {dataset}: {error} ---")
+            continue
+        _print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
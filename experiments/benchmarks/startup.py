@@ -0,0 +1,76 @@
+# startup.py -- time to first samples for a run served entirely from the cache
+#
+# Each dataset's cache is first filled to the requested size. Then fresh
+# interpreters, one per repeat, import the sampler and call uniform() for
+# the same number of samples, so nothing has to be generated. Reported are
+# the import time, the uniform() time, and which heavy libraries the run
+# ended up importing; a cached run should need none of them.
+#
+# Usage: python -m experiments.benchmarks.startup [--datasets Adult3 Iris ...]
+#            [--samples 10000] [--repeats 5] [--json results.json]
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+_DATASETS = ['Adult3', 'Adult3_1', 'Iris', 'Iris3', 'Banknote3', 'Banknote4',
+             'california_census', 'loan_acquisition', 'theorem_prover']
+_HEAVY_MODULES = ['tensorflow', 'sklearn', 'pandas', 'scipy']
+
+_RUN = """
+import json, sys, time
+start = time.perf_counter()
+import experiments.{dataset}.sampler as sampler
+imported = time.perf_counter()
+sampler.uniform({samples}, seed=0)
+done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "uniform": done - imported,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def _run_fresh(dataset, samples):
+    """Runs one cached uniform() call in a new interpreter; returns its timings, or raises ImportError."""
+    code = _RUN.format(dataset=dataset, samples=samples, heavy=_HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        if "ModuleNotFoundError" in completed.stderr or "ImportError" in completed.stderr:
+            raise ImportError(completed.stderr.strip().splitlines()[-1])
+        raise RuntimeError(completed.stderr)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run(dataset, samples, repeats):
+    _run_fresh(dataset, samples)   # fills the cache, so the timed runs only read it
+    runs = [_run_fresh(dataset, samples) for _ in range(repeats)]
+    return {"dataset": dataset, "samples": samples,
+            "import_seconds": float(np.median([r["import"] for r in runs])),
+            "uniform_seconds": float(np.median([r["uniform"] for r in runs])),
+            "heavy_modules": runs[-1]["heavy"]}
+
+def _print_result(result):
+    heavy = ", ".join(result["heavy_modules"]) or "none"
+    print(f"{result['dataset']:>18} {result['import_seconds']:>9.3f} {result['uniform_seconds']:>9.3f}   {heavy}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time of sampler runs served from the cache.")
+    parser.add_argument("--datasets", nargs="+", default=_DATASETS)
+    parser.add_argument("--samples", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"{'dataset':>18} {'import s':>9} {'uniform s':>9}   heavy modules imported")
+    results = []
+    for dataset in args.datasets:
+        try:
+            result = run(dataset, args.samples, args.repeats)
+        except ImportError as error:
+            print(f"--- Skipping {dataset}: {error} ---")
+            continue
+        _print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
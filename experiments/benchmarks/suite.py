@@ -0,0 +1,242 @@
+# suite.py -- performance of every dataset sampler, for comparison across commits
+#
+# Each sampler is run in fresh interpreters against a cache in a temporary
+# directory, so neither the repository's caches nor an earlier run affect
+# the numbers. Two processes are run per dataset:
+#   cold  imports the sampler and calls uniform() on an empty cache, which
+#         includes training or loading the oracle and the initial cache build,
+#         then asks for --generate more rows to time synthetic generation;
+#   warm  imports the sampler again and serves uniform() from the filled
+#         cache: the first call is the cache-load time, then uniform(n) is
+#         timed for each n in --sizes (median of --repeats seeds).
+# The peak RSS of both processes is reported. Results are written as JSON
+# together with the commit they were measured on.
+#
+# Runs offline: where TensorFlow or a model directory is missing, the TF
+# oracles are replaced by StandInModel, a fixed random network with the same
+# inputs and number of outputs, and the result is marked "stand_in". Pass
+# --stand-in to use it everywhere, so runs on different machines compare.
+#
+# Usage: python -m experiments.benchmarks.suite [--datasets Iris loan_acquisition ...]
+#            [--sizes 100 1000 10000 100000] [--generate 20000] [--repeats 3]
+#            [--stand-in] [--json results.json]
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Dataset name -> (sampler module, outputs of its TF oracle or None).
+SAMPLERS = {
+    'Adult3': ('experiments.Adult3.sampler', None),
+    'Adult3_1': ('experiments.Adult3_1.sampler', None),
+    'Iris': ('experiments.Iris.sampler', None),
+    'Iris3': ('experiments.Iris3.sampler', None),
+    'Banknote3': ('experiments.Banknote3.sampler', None),
+    'Banknote4': ('experiments.Banknote4.sampler', None),
+    'california_census': ('experiments.california_census.sampler', 4),
+    'loan_acquisition': ('experiments.loan_acquisition.sampler', 2),
+    'theorem_prover': ('experiments.theorem_prover.sampler', 2),
+    'ICML/AutoTaxi/sampler': ('experiments.ICML.AutoTaxi.sampler', None),
+    'ICML/AutoTaxi/sampler5': ('experiments.ICML.AutoTaxi.sampler5', None),
+}
+# Samplers without a growing cache: sampler5 draws and labels every call,
+# the AutoTaxi CSV sampler only returns rows of its data file.
+_GENERATES_PER_CALL = {'ICML/AutoTaxi/sampler5'}
+_NO_GENERATION = {'ICML/AutoTaxi/sampler'}
+
+class StandInModel:
+    """
+    A fixed random two-layer network with the Keras predict(inputs) interface.
+    Rows get the same output whatever batch they are in, so dedup and memo
+    behave as with the real oracle.
+    """
+
+    def __init__(self, num_outputs, hidden=64, seed=0):
+        self.num_outputs = num_outputs
+        self.hidden = hidden
+        self.seed = seed
+        self._weights = None
+
+    def predict(self, inputs, verbose=0):
+        x = np.column_stack([np.asarray(values, dtype=float) for values in inputs.values()])
+        if self._weights is None:
+            rng = np.random.default_rng(self.seed)
+            self._weights = (rng.standard_normal((x.shape[1], self.hidden)), rng.standard_normal(self.hidden),
+                             rng.standard_normal((self.hidden, self.num_outputs)))
+        w1, b1, w2 = self._weights
+        # Compress the raw feature scales, so no single feature decides every row.
+        x = np.sign(x) * np.log1p(np.abs(x))
+        logits = np.maximum(x @ w1 + b1, 0.0) @ w2
+        scores = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+def install_stand_in(sampler, num_outputs, force):
+    """Makes the sampler's TF oracle a StandInModel if forced or the real one cannot load. Returns whether it did."""
+    model_path = getattr(sampler, '_MODEL_PATH', None)
+    if num_outputs is None or model_path is None:
+        return False
+    if not force and importlib.util.find_spec("tensorflow") is not None and os.path.isdir(model_path):
+        return False
+    from experiments.sampling import oracle_pool
+
+    def load(oracle):
+        if oracle._model is None:
+            oracle._model = StandInModel(num_outputs)
+        return oracle._model
+    oracle_pool.Oracle._load = load
+    return True
+
+def _redirect_caches(sampler, cache_root):
+    """Points the sampler's cache, legacy cache and snapshot paths into `cache_root`."""
+    from experiments.sampling.columnar_store import ColumnarStore
+    for name in ('_LEGACY_CACHE_DIR', '_LEGACY_CACHE_FILENAME', '_SNAPSHOT_DIR'):
+        if hasattr(sampler, name):
+            setattr(sampler, name, os.path.join(cache_root, os.path.basename(getattr(sampler, name))))
+    store = getattr(sampler, '_store', None)
+    if store is not None:
+        sampler._CACHE_DIR = os.path.join(cache_root, os.path.basename(store.root))
+        sampler._store = ColumnarStore(sampler._CACHE_DIR, store.feature_names, store.label_name, store.key_digits)
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS.
+    scale = 1.0 if sys.platform == 'darwin' else 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+def _cached_rows(sampler):
+    store = getattr(sampler, '_store', None)
+    if store is None or not store.exists():
+        return 0
+    store.refresh()
+    return len(store)
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# --- Child processes ---
+def _cold(dataset, cache_root, sizes, generate, repeats, force_stand_in):
+    module_name, num_outputs = SAMPLERS[dataset]
+    import_seconds, sampler = _timed(importlib.import_module, module_name)
+    _redirect_caches(sampler, cache_root)
+    stand_in = install_stand_in(sampler, num_outputs, force_stand_in)
+    first_seconds, _ = _timed(sampler.uniform, sizes[0], seed=0)
+
+    samples_per_second = None
+    if dataset in _GENERATES_PER_CALL:
+        seconds, _ = _timed(sampler.uniform, generate, seed=1)
+        samples_per_second = generate / seconds
+    elif dataset not in _NO_GENERATION:
+        before = _cached_rows(sampler)
+        seconds, _ = _timed(sampler.uniform, before + generate, seed=1)
+        grown = _cached_rows(sampler) - before
+        samples_per_second = grown / seconds if grown else None
+    # Fill the cache to the largest size, so the warm run only reads it.
+    if dataset not in _GENERATES_PER_CALL:
+        sampler.uniform(max(sizes), seed=2)
+    return {"import_seconds": import_seconds, "cold_start_seconds": import_seconds + first_seconds,
+            "synthetic_samples_per_second": samples_per_second, "stand_in": stand_in,
+            "peak_rss_mb": _peak_rss_mb()}
+
+def _warm(dataset, cache_root, sizes, generate, repeats, force_stand_in):
+    module_name, num_outputs = SAMPLERS[dataset]
+    import_seconds, sampler = _timed(importlib.import_module, module_name)
+    _redirect_caches(sampler, cache_root)
+    install_stand_in(sampler, num_outputs, force_stand_in)
+    load_seconds, _ = _timed(sampler.uniform, sizes[0], seed=0)
+    latency = {}
+    for n in sizes:
+        latency[str(n)] = float(np.median([_timed(sampler.uniform, n, seed=seed)[0] for seed in range(repeats)]))
+    return {"import_seconds": import_seconds, "cache_load_seconds": import_seconds + load_seconds,
+            "uniform_seconds": latency, "peak_rss_mb": _peak_rss_mb()}
+
+_PHASES = {"cold": _cold, "warm": _warm}
+
+def _run_child(phase, dataset, cache_root, args):
+    """Runs one phase in a new interpreter; returns its results, or raises ImportError."""
+    command = [sys.executable, "-m", "experiments.benchmarks.suite", "--child", phase, dataset, cache_root,
+               "--sizes", *map(str, args.sizes), "--generate", str(args.generate), "--repeats", str(args.repeats)]
+    if args.stand_in:
+        command.append("--stand-in")
+    # Oracles must load in the measured process, not in a shared server.
+    env = {name: value for name, value in os.environ.items() if name != "SAMPLER_ORACLE_SOCKET"}
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        if "ModuleNotFoundError" in completed.stderr or "ImportError" in completed.stderr:
+            raise ImportError(completed.stderr.strip().splitlines()[-1])
+        raise RuntimeError(completed.stderr)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run(dataset, args):
+    cache_root = tempfile.mkdtemp(prefix="sampler_benchmark_")
+    try:
+        cold = _run_child("cold", dataset, cache_root, args)
+        warm = _run_child("warm", dataset, cache_root, args)
+    finally:
+        shutil.rmtree(cache_root, ignore_errors=True)
+    return {"dataset": dataset, "stand_in": cold["stand_in"],
+            "cold_start_seconds": cold["cold_start_seconds"],
+            "cache_load_seconds": warm["cache_load_seconds"],
+            "import_seconds": warm["import_seconds"],
+            "synthetic_samples_per_second": cold["synthetic_samples_per_second"],
+            "peak_rss_mb": {"cold": cold["peak_rss_mb"], "warm": warm["peak_rss_mb"]},
+            "uniform_seconds": warm["uniform_seconds"]}
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _print_result(result):
+    rate = result["synthetic_samples_per_second"]
+    rate = f"{rate:>10.0f}" if rate else f"{'-':>10}"
+    largest = list(result["uniform_seconds"].items())[-1]
+    print(f"{result['dataset']:>24} {result['cold_start_seconds']:>8.3f} {result['cache_load_seconds']:>8.3f} {rate} "
+          f"{max(result['peak_rss_mb'].values()):>8.1f} {largest[1]:>10.4f}{'  (stand-in)' if result['stand_in'] else ''}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start, cache load, generation rate, memory and latency of the samplers.")
+    parser.add_argument("--datasets", nargs="+", default=list(SAMPLERS), choices=list(SAMPLERS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000, 100000])
+    parser.add_argument("--generate", type=int, default=20000, help="rows to generate when timing synthesis")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--stand-in", action="store_true", help="use stand-in TF oracles even if the real ones load")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", nargs=3, metavar=("PHASE", "DATASET", "CACHE_ROOT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase, dataset, cache_root = args.child
+        result = _PHASES[phase](dataset, cache_root, args.sizes, args.generate, args.repeats, args.stand_in)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    print(f"{'dataset':>24} {'cold s':>8} {'load s':>8} {'gen/s':>10} {'RSS MB':>8} {f'n={args.sizes[-1]} s':>10}")
+    results = []
+    for dataset in args.datasets:
+        try:
+            result = run(dataset, args)
+        except ImportError as error:
+            print(f"--- Skipping {dataset}: {error} ---")
+            continue
+        _print_result(result)
+        results.append(result)
+    if args.json:
+        report = {"commit": _commit(), "python": platform.python_version(), "platform": platform.platform(),
+                  "settings": {"sizes": args.sizes, "generate": args.generate, "repeats": args.repeats,
+                               "stand_in": args.stand_in},
+                  "results": results}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
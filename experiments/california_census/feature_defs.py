@@ -1,56 +1,66 @@
-# inputs: [longitude, latitude, population, median_income]
-# features: population, median_income, location
-# output: [median_house_price]
-# labels: median_house_price
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-    return len(inputs)==2
+import numpy as np
 
+# --- Lookup Tables ---
+_POPULATION_BOUNDARIES = np.array([3000.0, 10000.0, 20000.0], dtype=float)
+_POPULATION_BIN_CODES = np.array([1, 2, 3, 0])
+_MEDIAN_INCOME_BOUNDARIES = np.array([7.0], dtype=float)
+_MEDIAN_INCOME_BIN_CODES = np.array([1, 0])
+
+# --- Scalar Definitions ---
 def population(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[0][1]
-    if value<3000.0:
-        return 1
-    if value<10000.0:
-        return 2
-    if value<20000.0:
-        return 3
-    else:
-        return 0
+	"""Discretizes population into 4 bins."""
+	value = inputs[0][1]
+	if value < 3000.0:
+		return 1
+	if value < 10000.0:
+		return 2
+	if value < 20000.0:
+		return 3
+	return 0
 
 def median_income(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[1][1] 
-    if value<7.0:
-        return 1
-    else:
-        return 0
-
-# def location(inputs):
-#     assert(check_num_of_inputs(inputs))
-#     longitude = inputs[0][1]
-#     latitude = inputs[1][1]
-#     if -114.0>=longitude and longitude>-118.0:
-#         if 36.0<=latitude and latitude<39:
-#             return 1
-#     if -118.0>= longitude and longitude>=-124.3:
-#         if 39<=latitude and latitude<=42.5:
-#             return 2    
-#     return 0
+	"""Discretizes median_income into 2 bins."""
+	value = inputs[1][1]
+	if value < 7.0:
+		return 1
+	return 0
 
 def Class(outputs):
-    value = outputs[0][1]   
-    return value
-
-def test(outputs):
-    return 0
+	"""Returns the Class value, one bin per value."""
+	value = outputs[0][1]
+	return value
 
 def retrieve_feature_defs():
-    feature_defs = {}
-    feature_defs["population"] = population
-    feature_defs["median_income"] = median_income
-    # feature_defs["location"] = location
-    feature_defs["Class"] = Class
-    # feature_defs["test"] = test
-
-    return feature_defs
\ No newline at end of file
+	"""Returns a dictionary mapping all names to their definition functions."""
+	feature_defs = {}
+	feature_defs["population"] = population
+	feature_defs["median_income"] = median_income
+	feature_defs["Class"] = Class
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["population"] = [3000.0, 10000.0, 20000.0]
+	bin_boundaries["median_income"] = [7.0]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _population_batch(values):
+	return _POPULATION_BIN_CODES[np.searchsorted(_POPULATION_BOUNDARIES, np.asarray(values, dtype=float), side='right')]
+
+def _median_income_batch(values):
+	return _MEDIAN_INCOME_BIN_CODES[np.searchsorted(_MEDIAN_INCOME_BOUNDARIES, np.asarray(values, dtype=float), side='right')]
+
+def _Class_batch(values):
+	return np.asarray(values)
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["population"] = _population_batch
+	batch_defs["median_income"] = _median_income_batch
+	batch_defs["Class"] = _Class_batch
+	return batch_defs
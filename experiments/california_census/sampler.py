@@ -1,109 +1,198 @@
 # sampler.py for california_census with On-Disk Caching and Batch Prediction (Corrected)
 
 import os
-import pickle
-import random
 import math
 import numpy as np
-import pandas as pd
-import tensorflow as tf
+from experiments.sampling.batch import generate_unique_columns, samples_from_columns
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.streaming import stream_store
+from experiments.sampling.oracle_pool import get_oracle
+from experiments.sampling.memo import MemoOracle
+from experiments.sampling.active import active_sample, latest_program, load_program
+from experiments.sampling.quasi_random import resume_draw, save_position
+
+from experiments.california_census import feature_defs
 
 # --- Module-level Configuration ---
 _MODEL_PATH = "experiments/california_census/model"
+_PREVIOUS_RUNS_DIR = "experiments/california_census/previous_runs"
 _DATA_FILE_PATH = "experiments/california_census/california_housing_train_classifier.csv"
-_CACHE_FILENAME = "experiments/california_census/sampler_cache_tf.pkl"
-
-_cached_samples = {}
+_LEGACY_CACHE_FILENAME = "experiments/california_census/sampler_cache_tf.pkl"
+_LEGACY_CACHE_DIR = "experiments/california_census/sampler_cache_tf"
+_feature_names = ['population', 'median_income']
+# Keyed by the oracle/data contents and the generation domain, so runs with the
+# same inputs share one cache and any change starts a fresh one.
+# With _QUASI_RANDOM set, new samples come from one scrambled Sobol sequence over the
+# same ranges instead of independent uniform draws (see sampling/quasi_random.py).
+_QUASI_RANDOM = False
+_QUASI_RANDOM_SEED = 0
+_CACHE_DIR = cache_dir(_LEGACY_CACHE_DIR, [_MODEL_PATH, _DATA_FILE_PATH], {'features': _feature_names, 'population': (3, 35682), 'median_income': (0.5, 15.0), 'quasi_random': _QUASI_RANDOM})
+# Decimal places each float feature is rounded to when deduping new samples;
+# the cache keeps the drawn values in full.
+_KEY_DIGITS = {'median_income': 4}
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'Class', key_digits=_KEY_DIGITS)
+# Oracle answers are memoized on the rows rounded as above. With _ORACLE_MEMO_ON_DISK
+# set, they are also kept in a SQLite file next to the cache for later runs.
+_ORACLE_MEMO_ON_DISK = False
+_oracle_memo = None
+
+_key_index = None
+_rng = np.random.default_rng()
 _is_cache_loaded = False
 
 def _load_or_initialize_cache():
     """
-    Loads samples from the cache file if it exists. Otherwise, it creates
-    an empty cache and saves it.
+    Loads samples from the segmented cache if it exists. Otherwise, it starts
+    with an empty cache; segments are only written once samples are generated.
     """
-    global _cached_samples, _is_cache_loaded
-    if os.path.exists(_CACHE_FILENAME):
-        print(f"--- Found cache file '{_CACHE_FILENAME}'. Loading samples. ---")
-        with open(_CACHE_FILENAME, 'rb') as f:
-            _cached_samples = pickle.load(f)
+    global _is_cache_loaded
+    legacy_path = _store.adopt_legacy([_LEGACY_CACHE_DIR, _LEGACY_CACHE_FILENAME])
+    if legacy_path:
+        print(f"--- Imported legacy cache '{legacy_path}' into '{_CACHE_DIR}'. ---")
+
+    if _store.exists():
+        print(f"--- Found cache '{_CACHE_DIR}' ({len(_store)} samples in {_store.num_segments()} segments). ---")
     else:
-        print(f"--- No cache file found. Initializing empty cache. ---")
-        _cached_samples = {}
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_samples, f)
+        print(f"--- No cache found. Initializing empty cache. ---")
     _is_cache_loaded = True
 
 def truncate(number, digits) -> float:
     stepper = 10.0 ** digits
     return math.trunc(stepper * number) / stepper
 
-def uniform(num_of_samples):
+def _stratified_cells():
+    """The feature_defs.py bins of each feature, over the ranges uniform draws from."""
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    return [discrete_cells(np.arange(3, 35683), boundaries['population']),
+            continuous_cells(0.5, 15.0, boundaries['median_income'])]
+
+def _predict_batch(model, columns):
+    """Normalizes a batch of raw (population, median_income) columns and labels it with one model call."""
+    import pandas as pd
+    train_df = pd.read_csv(_DATA_FILE_PATH)
+    train_df_mean = train_df.mean()
+    train_df_std = train_df.std()
+    normalized = {name: np.trunc(100.0 * ((np.asarray(column) - train_df_mean[name]) / train_df_std[name])) / 100.0
+                  for name, column in zip(_feature_names, columns)}
+    return np.argmax(model.predict(normalized), axis=1)
+
+def _oracle():
+    """The oracle's batch predictor, memoized on the rounded input rows (see sampling/memo.py)."""
+    global _oracle_memo
+    if _oracle_memo is None:
+        # Shared TensorFlow oracle, loaded once per process
+        model = get_oracle(_MODEL_PATH)
+        disk_path = _CACHE_DIR + "_oracle_memo.sqlite" if _ORACLE_MEMO_ON_DISK else None
+        _oracle_memo = MemoOracle(lambda columns: _predict_batch(model, columns),
+                                  [_KEY_DIGITS.get(name) for name in _feature_names], disk_path=disk_path)
+    return _oracle_memo
+
+def oracle_stats():
+    """Hit and miss counts of the oracle memo in this process."""
+    return _oracle().stats()
+
+def _sampling_box():
+    """Returns (lows, highs, integer flags) of the box synthetic samples are drawn from."""
+    return [3, 0.5], [35682, 15.0], [True, False]
+
+def _draw_synthetic_batch(n, rng=None):
+    """Draws n candidate rows uniformly over the sampling box."""
+    rng = _rng if rng is None else rng
+    return [rng.integers(3, 35682, size=n, endpoint=True), rng.uniform(0.5, 15.0, size=n)]
+
+def _quasi_random_draw():
+    """A Sobol draw over the ranges uniform draws from, resuming the cached sequence."""
+    lows, highs, integer = _sampling_box()
+    return resume_draw(_store, lows, highs, integer, seed=_QUASI_RANDOM_SEED)
+
+def _extend_cache(num_of_samples):
+    """
+    Makes sure the cache holds at least num_of_samples samples, generating
+    and appending the missing ones with one batched model call.
+    """
+    global _key_index
+
+    # Concurrent runs share this cache: extend it under its lock, after picking
+    # up rows other processes appended, so only what is still missing is made.
+    with _store.lock():
+        _store.refresh()
+        num_cached = len(_store)
+        if num_of_samples > num_cached:
+            num_synthetic_needed = num_of_samples - num_cached
+            print(f"\n--- Cache has {num_cached} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+
+            if _key_index is None or len(_key_index) != num_cached:
+                _key_index = _store.key_index()
+
+            if _QUASI_RANDOM:
+                sobol = _quasi_random_draw()
+                new_columns, new_labels = generate_unique_columns(num_synthetic_needed, sobol, _oracle(), _key_index)
+                save_position(_store, sobol)
+            else:
+                # Drawn, deduped and labelled in batches, each row from its own features
+                print(f"--- Predicting {num_synthetic_needed} samples in batches... ---")
+                new_columns, new_labels = generate_unique_columns(num_synthetic_needed, _draw_synthetic_batch, _oracle(), _key_index)
+                print("--- Batch prediction complete. ---")
+            _key_index.update_rows(new_columns)
+            _store.append_columns(new_columns, new_labels)
+            kind = "Sobol samples" if _QUASI_RANDOM else "samples"
+            print(f"--- Cache updated. Appended {len(new_labels)} {kind} ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+            print(f"--- Oracle memo: {_oracle().stats_line()}. ---")
+
+def uniform(num_of_samples, seed=None):
     """
     Provides samples from the on-disk cache. If more samples are requested
     than exist, it generates new synthetic ones using batch prediction and updates the cache file.
+    Pass `seed` to make the choice of returned samples reproducible.
     """
-    global _cached_samples
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+
+    _extend_cache(num_of_samples)
 
+    # Only the selected rows are read from the memory-mapped columns.
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return _store.sample(num_of_samples, rng)
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the samples uniform() would return as dicts of up to `chunk_size`
+    samples. Missing samples are generated one chunk at a time, and with
+    `prefetch` the next chunk is made on a background thread while the caller
+    handles the current one. `memory_budget` (in bytes) shrinks the chunks
+    so the ones in flight fit in it.
+    """
     if not _is_cache_loaded:
-        _load_or_initialize_cache()
-
-    if num_of_samples > len(_cached_samples):
-        num_synthetic_needed = num_of_samples - len(_cached_samples)
-        print(f"\n--- Cache has {len(_cached_samples)} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
-
-        # Load the pre-trained TensorFlow model
-        model = tf.keras.models.load_model(_MODEL_PATH)
-        
-        # Get normalization stats from the original training data
-        train_df = pd.read_csv(_DATA_FILE_PATH)
-        train_df_mean = train_df.mean()
-        train_df_std = train_df.std()
-
-        feature3_name = 'population'
-        feature4_name = 'median_income'
-
-        # --- Batch Generation (More Efficient) ---
-        populations_raw = []
-        incomes_raw = []
-        populations_norm = []
-        incomes_norm = []
-
-        for _ in range(num_synthetic_needed):
-            pop_val = random.randint(3, 35682)
-            inc_val = random.uniform(0.5, 15.0)
-            
-            pop_norm = truncate((pop_val - train_df_mean[feature3_name]) / train_df_std[feature3_name], 2)
-            inc_norm = truncate((inc_val - train_df_mean[feature4_name]) / train_df_std[feature4_name], 2)
-            
-            populations_raw.append(pop_val)
-            incomes_raw.append(inc_val)
-            populations_norm.append(pop_norm)
-            incomes_norm.append(inc_norm)
-
-        print(f"--- Predicting {num_synthetic_needed} samples in a single batch... ---")
-        predictions = model.predict({
-            feature3_name: np.array(populations_norm),
-            feature4_name: np.array(incomes_norm)
-        })
-        print("--- Batch prediction complete. ---")
-
-        for i in range(num_synthetic_needed):
-            predicted_class = np.argmax(predictions[i])
-            sample_key = ((feature3_name, populations_raw[i]), (feature4_name, incomes_raw[i]))
-            
-            while sample_key in _cached_samples:
-                 pop_val = random.randint(3, 35682)
-                 inc_val = random.uniform(0.5, 15.0)
-                 sample_key = ((feature3_name, pop_val), (feature4_name, inc_val))
-
-            _cached_samples[sample_key] = [("Class", predicted_class)]
-
-        # **FIX**: Use the correct variable name '_cached_samples'
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_samples, f)
-        print(f"--- Cache updated. Saved {len(_cached_samples)} total samples to '{_CACHE_FILENAME}'. ---")
-
-    all_samples_list = list(_cached_samples.items())
-    random.shuffle(all_samples_list)
-    
-    return dict(all_samples_list[:num_of_samples])
\ No newline at end of file
+        with _store.lock():
+            _load_or_initialize_cache()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(_store, num_of_samples, rng, _extend_cache, chunk_size, prefetch, memory_budget)
+
+def stratified(samples_per_cell, seed=None):
+    """
+    Returns `samples_per_cell` new samples inside every cell of the bins in
+    feature_defs.py, so every cell is covered with few oracle queries. The
+    samples are labelled in one batch and are not added to the cache, which
+    holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    columns = draw_per_cell(_stratified_cells(), samples_per_cell, rng)
+    return samples_from_columns(columns, _oracle()(columns), _feature_names, 'Class')
+
+def active(num_of_samples, program_path=None, rounds=8, seed=None):
+    """
+    Returns num_of_samples new samples, labelled over `rounds` rounds that
+    send the oracle queries to the cells of the feature_defs.py bins whose
+    labels are mixed or disagree with the synthesized program at
+    `program_path` (by default the newest one under previous_runs). The
+    samples are not added to the cache, which holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    program_path = program_path or latest_program(_PREVIOUS_RUNS_DIR)
+    execute = load_program(program_path) if program_path else None
+    columns, labels = active_sample(_stratified_cells(), _oracle(), num_of_samples, rng,
+                                    execute, feature_defs.retrieve_feature_defs(), 'Class', rounds)
+    return samples_from_columns(columns, labels, _feature_names, 'Class')
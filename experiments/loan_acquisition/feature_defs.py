@@ -1,61 +1,94 @@
-# inputs: [longitude, latitude, population, median_income]
-# features: population, median_income, location
-# output: [median_house_price]
-# labels: median_house_price
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-    return len(inputs)==4
+import numpy as np
 
+# --- Lookup Tables ---
+_AGE_BOUNDARIES = np.array([30, 50, 60], dtype=float)
+_MONTHLY_INCOME_BOUNDARIES = np.array([6000.0], dtype=float)
+_DEPENDENTS_BOUNDARIES = np.array([3], dtype=float)
+_CREDIT_SCORE_BOUNDARIES = np.array([500, 700], dtype=float)
+
+# --- Scalar Definitions ---
 def age(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[0][1]
-    if value<30:
-        return 0
-    elif value < 50:
-        return 1
-    elif value <60:
-        return 2
-    else:
-        return 3
+	"""Discretizes age into 4 bins."""
+	value = inputs[0][1]
+	if value < 30:
+		return 0
+	if value < 50:
+		return 1
+	if value < 60:
+		return 2
+	return 3
 
 def monthly_income(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[1][1] 
-    if value<6000.0:
-        return 0
-    else:
-        return 1
+	"""Discretizes monthly_income into 2 bins."""
+	value = inputs[1][1]
+	if value < 6000.0:
+		return 0
+	return 1
 
 def dependents(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[2][1] 
-    if value<3:
-        return 0
-    else:
-        return 1
+	"""Discretizes dependents into 2 bins."""
+	value = inputs[2][1]
+	if value < 3:
+		return 0
+	return 1
 
 def credit_score(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[3][1] 
-    if value<500:
-        return 0
-    elif value<700:
-        return 1
-    else:
-        return 2
-
+	"""Discretizes credit_score into 3 bins."""
+	value = inputs[3][1]
+	if value < 500:
+		return 0
+	if value < 700:
+		return 1
+	return 2
 
 def approved(outputs):
-    value = outputs[0][1]   
-    return value
-
+	"""Returns the approved value, one bin per value."""
+	value = outputs[0][1]
+	return value
 
 def retrieve_feature_defs():
-    feature_defs = {}
-    feature_defs["age"] = age
-    feature_defs["monthly_income"] = monthly_income
-    feature_defs["dependents"] = dependents
-    feature_defs["credit_score"] = credit_score
-    feature_defs["approved"] = approved
-
-    return feature_defs
\ No newline at end of file
+	"""Returns a dictionary mapping all names to their definition functions."""
+	feature_defs = {}
+	feature_defs["age"] = age
+	feature_defs["monthly_income"] = monthly_income
+	feature_defs["dependents"] = dependents
+	feature_defs["credit_score"] = credit_score
+	feature_defs["approved"] = approved
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["age"] = [30, 50, 60]
+	bin_boundaries["monthly_income"] = [6000.0]
+	bin_boundaries["dependents"] = [3]
+	bin_boundaries["credit_score"] = [500, 700]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _age_batch(values):
+	return np.searchsorted(_AGE_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _monthly_income_batch(values):
+	return np.searchsorted(_MONTHLY_INCOME_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _dependents_batch(values):
+	return np.searchsorted(_DEPENDENTS_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _credit_score_batch(values):
+	return np.searchsorted(_CREDIT_SCORE_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _approved_batch(values):
+	return np.asarray(values)
+
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["age"] = _age_batch
+	batch_defs["monthly_income"] = _monthly_income_batch
+	batch_defs["dependents"] = _dependents_batch
+	batch_defs["credit_score"] = _credit_score_batch
+	batch_defs["approved"] = _approved_batch
+	return batch_defs
@@ -1,111 +1,206 @@
 # sampler.py for loan_acquisition with On-Disk Caching and Batch Prediction
 
 import os
-import pickle
-import random
 import math
 import numpy as np
-import pandas as pd
-import tensorflow as tf
+from experiments.sampling.batch import generate_unique_columns, samples_from_columns
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.streaming import stream_store
+from experiments.sampling.oracle_pool import get_oracle
+from experiments.sampling.memo import MemoOracle
+from experiments.sampling.active import active_sample, latest_program, load_program
+from experiments.sampling.quasi_random import resume_draw, save_position
+
+from experiments.loan_acquisition import feature_defs
 
 # --- Module-level Configuration ---
 _MODEL_PATH = "experiments/loan_acquisition/model"
-_CACHE_FILENAME = "experiments/loan_acquisition/sampler_cache_loan.pkl"
-
-_cached_samples = {}
+_PREVIOUS_RUNS_DIR = "experiments/loan_acquisition/previous_runs"
+_LEGACY_CACHE_FILENAME = "experiments/loan_acquisition/sampler_cache_loan.pkl"
+_LEGACY_CACHE_DIR = "experiments/loan_acquisition/sampler_cache_loan"
+_feature_names = ['age', 'monthly_income', 'dependents', 'credit_score']
+# Keyed by the oracle/data contents and the generation domain, so runs with the
+# same inputs share one cache and any change starts a fresh one.
+# With _QUASI_RANDOM set, new samples come from one scrambled Sobol sequence over the
+# same ranges instead of independent uniform draws (see sampling/quasi_random.py).
+_QUASI_RANDOM = False
+_QUASI_RANDOM_SEED = 0
+_CACHE_DIR = cache_dir(_LEGACY_CACHE_DIR, [_MODEL_PATH], {'features': _feature_names, 'age': (18, 80), 'monthly_income': (1000.0, 10000.0), 'dependents': (0, 6), 'credit_score': (300, 900), 'quasi_random': _QUASI_RANDOM})
+# Decimal places each float feature is rounded to when deduping new samples;
+# the cache keeps the drawn values in full.
+_KEY_DIGITS = {'monthly_income': 2}
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'approved', key_digits=_KEY_DIGITS)
+# Oracle answers are memoized on the rows rounded as above. With _ORACLE_MEMO_ON_DISK
+# set, they are also kept in a SQLite file next to the cache for later runs.
+_ORACLE_MEMO_ON_DISK = False
+_oracle_memo = None
+
+_key_index = None
+_rng = np.random.default_rng()
 _is_cache_loaded = False
 
 def _load_or_initialize_cache():
     """
-    Loads samples from the cache file if it exists. Otherwise, it creates
-    an empty cache and saves it.
+    Loads samples from the segmented cache if it exists. Otherwise, it starts
+    with an empty cache; segments are only written once samples are generated.
     """
-    global _cached_samples, _is_cache_loaded
-    if os.path.exists(_CACHE_FILENAME):
-        print(f"--- Found cache file '{_CACHE_FILENAME}'. Loading samples. ---")
-        with open(_CACHE_FILENAME, 'rb') as f:
-            _cached_samples = pickle.load(f)
+    global _is_cache_loaded
+    legacy_path = _store.adopt_legacy([_LEGACY_CACHE_DIR, _LEGACY_CACHE_FILENAME])
+    if legacy_path:
+        print(f"--- Imported legacy cache '{legacy_path}' into '{_CACHE_DIR}'. ---")
+
+    if _store.exists():
+        print(f"--- Found cache '{_CACHE_DIR}' ({len(_store)} samples in {_store.num_segments()} segments). ---")
     else:
-        print(f"--- No cache file found. Initializing empty cache. ---")
-        _cached_samples = {}
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_samples, f)
+        print(f"--- No cache found. Initializing empty cache. ---")
     _is_cache_loaded = True
 
 def truncate(number, digits) -> float:
     stepper = 10.0 ** digits
     return math.trunc(stepper * number) / stepper
 
-def uniform(num_of_samples):
+def _stratified_cells():
+    """The feature_defs.py bins of each feature, over the ranges uniform draws from."""
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    return [discrete_cells(np.arange(18, 81), boundaries['age']),
+            continuous_cells(1000.0, 10000.0, boundaries['monthly_income']),
+            discrete_cells(np.arange(0, 7), boundaries['dependents']),
+            discrete_cells(np.arange(300, 901), boundaries['credit_score'])]
+
+def _predict_batch(model, columns):
+    """Labels a batch of raw columns with one model call."""
+    predictions = model.predict({name: np.asarray(column) for name, column in zip(_feature_names, columns)})
+    return np.where(predictions[:, 1] > predictions[:, 0], 1, 0)
+
+def _oracle():
+    """The oracle's batch predictor, memoized on the rounded input rows (see sampling/memo.py)."""
+    global _oracle_memo
+    if _oracle_memo is None:
+        # Shared TensorFlow oracle, loaded once per process
+        model = get_oracle(_MODEL_PATH)
+        disk_path = _CACHE_DIR + "_oracle_memo.sqlite" if _ORACLE_MEMO_ON_DISK else None
+        _oracle_memo = MemoOracle(lambda columns: _predict_batch(model, columns),
+                                  [_KEY_DIGITS.get(name) for name in _feature_names], disk_path=disk_path)
+    return _oracle_memo
+
+def oracle_stats():
+    """Hit and miss counts of the oracle memo in this process."""
+    return _oracle().stats()
+
+def _sampling_box():
+    """Returns (lows, highs, integer flags) of the box synthetic samples are drawn from."""
+    return [18, 1000.0, 0, 300], [80, 10000.0, 6, 900], [True, False, True, True]
+
+def _draw_synthetic_batch(n, rng=None):
+    """Draws n candidate rows uniformly over the sampling box, incomes truncated to two decimals."""
+    rng = _rng if rng is None else rng
+    return [rng.integers(18, 80, size=n, endpoint=True),
+            np.trunc(100.0 * rng.uniform(1000.0, 10000.0, size=n)) / 100.0,
+            rng.integers(0, 6, size=n, endpoint=True),
+            rng.integers(300, 900, size=n, endpoint=True)]
+
+def _quasi_random_draw():
+    """A Sobol draw over the ranges uniform draws from, resuming the cached sequence."""
+    lows, highs, integer = _sampling_box()
+    return resume_draw(_store, lows, highs, integer, seed=_QUASI_RANDOM_SEED)
+
+def _extend_cache(num_of_samples):
+    """
+    Makes sure the cache holds at least num_of_samples samples, generating
+    and appending the missing ones with one batched model call.
+    """
+    global _key_index
+
+    # Concurrent runs share this cache: extend it under its lock, after picking
+    # up rows other processes appended, so only what is still missing is made.
+    with _store.lock():
+        _store.refresh()
+        num_cached = len(_store)
+        if num_of_samples > num_cached:
+            num_synthetic_needed = num_of_samples - num_cached
+            print(f"\n--- Cache has {num_cached} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
+
+            if _key_index is None or len(_key_index) != num_cached:
+                _key_index = _store.key_index()
+
+            if _QUASI_RANDOM:
+                sobol = _quasi_random_draw()
+                def draw_batch(n):
+                    columns = sobol(n)
+                    columns[1] = np.trunc(100.0 * columns[1]) / 100.0   # incomes keep two decimals
+                    return columns
+                new_columns, new_labels = generate_unique_columns(num_synthetic_needed, draw_batch, _oracle(), _key_index)
+                save_position(_store, sobol)
+            else:
+                # Drawn, deduped and labelled in batches, each row from its own features
+                print(f"--- Predicting {num_synthetic_needed} samples in batches... ---")
+                new_columns, new_labels = generate_unique_columns(num_synthetic_needed, _draw_synthetic_batch, _oracle(), _key_index)
+                print("--- Batch prediction complete. ---")
+            _key_index.update_rows(new_columns)
+            _store.append_columns(new_columns, new_labels)
+            kind = "Sobol samples" if _QUASI_RANDOM else "samples"
+            print(f"--- Cache updated. Appended {len(new_labels)} {kind} ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+            print(f"--- Oracle memo: {_oracle().stats_line()}. ---")
+
+def uniform(num_of_samples, seed=None):
     """
     Provides samples from the on-disk cache. If more samples are requested
     than exist, it generates new synthetic ones using batch prediction and updates the cache file.
+    Pass `seed` to make the choice of returned samples reproducible.
     """
-    global _cached_samples
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+
+    _extend_cache(num_of_samples)
 
+    # Only the selected rows are read from the memory-mapped columns.
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return _store.sample(num_of_samples, rng)
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the samples uniform() would return as dicts of up to `chunk_size`
+    samples. Missing samples are generated one chunk at a time, and with
+    `prefetch` the next chunk is made on a background thread while the caller
+    handles the current one. `memory_budget` (in bytes) shrinks the chunks
+    so the ones in flight fit in it.
+    """
     if not _is_cache_loaded:
-        _load_or_initialize_cache()
-
-    if num_of_samples > len(_cached_samples):
-        num_synthetic_needed = num_of_samples - len(_cached_samples)
-        print(f"\n--- Cache has {len(_cached_samples)} samples. Requested {num_of_samples}. Generating {num_synthetic_needed} new synthetic samples. ---\n")
-
-        # Load the pre-trained TensorFlow model
-        model = tf.keras.models.load_model(_MODEL_PATH)
-        
-        feature1_name = 'age'
-        feature2_name = 'monthly_income'
-        feature3_name = 'dependents'
-        feature4_name = 'credit_score'
-
-        # --- Batch Generation (More Efficient) ---
-        # 1. Create lists to hold all the raw data to be predicted
-        ages_raw, incomes_raw, dependents_raw, scores_raw = [], [], [], []
-
-        for _ in range(num_synthetic_needed):
-            ages_raw.append(random.randint(18, 80))
-            incomes_raw.append(truncate(abs(random.uniform(1000.0, 10000.0)), 2))
-            dependents_raw.append(random.randint(0, 6))
-            scores_raw.append(random.randint(300, 900))
-
-        # 2. Make a single batch prediction
-        print(f"--- Predicting {num_synthetic_needed} samples in a single batch... ---")
-        predictions = model.predict({
-            feature1_name: np.array(ages_raw),
-            feature2_name: np.array(incomes_raw),
-            feature3_name: np.array(dependents_raw),
-            feature4_name: np.array(scores_raw)
-        })
-        print("--- Batch prediction complete. ---")
-
-        # 3. Process the results and add to the cache
-        for i in range(num_synthetic_needed):
-            # Your logic to determine the class from the prediction output
-            prediction_value = 1 if predictions[i][1] > predictions[i][0] else 0
-            
-            sample_key = (
-                (feature1_name, ages_raw[i]),
-                (feature2_name, incomes_raw[i]),
-                (feature3_name, dependents_raw[i]),
-                (feature4_name, scores_raw[i])
-            )
-            
-            # Ensure the generated key is unique before adding
-            while sample_key in _cached_samples:
-                age_val = random.randint(18, 80)
-                inc_val = truncate(abs(random.uniform(1000.0, 10000.0)), 2)
-                dep_val = random.randint(0, 6)
-                scr_val = random.randint(300, 900)
-                sample_key = ((feature1_name, age_val), (feature2_name, inc_val), (feature3_name, dep_val), (feature4_name, scr_val))
-
-            _cached_samples[sample_key] = [("approved", prediction_value)]
-
-        # Save the updated cache back to the file
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_samples, f)
-        print(f"--- Cache updated. Saved {len(_cached_samples)} total samples to '{_CACHE_FILENAME}'. ---")
-
-    all_samples_list = list(_cached_samples.items())
-    random.shuffle(all_samples_list)
-    
-    return dict(all_samples_list[:num_of_samples])
\ No newline at end of file
+        with _store.lock():
+            _load_or_initialize_cache()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(_store, num_of_samples, rng, _extend_cache, chunk_size, prefetch, memory_budget)
+
+def stratified(samples_per_cell, seed=None):
+    """
+    Returns `samples_per_cell` new samples inside every cell of the bins in
+    feature_defs.py, so every cell is covered with few oracle queries. The
+    samples are labelled in one batch and are not added to the cache, which
+    holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    columns = draw_per_cell(_stratified_cells(), samples_per_cell, rng)
+    # Incomes are kept to two decimals, as in uniform draws.
+    columns[1] = np.trunc(100.0 * columns[1]) / 100.0
+    return samples_from_columns(columns, _oracle()(columns), _feature_names, 'approved')
+
+def active(num_of_samples, program_path=None, rounds=8, seed=None):
+    """
+    Returns num_of_samples new samples, labelled over `rounds` rounds that
+    send the oracle queries to the cells of the feature_defs.py bins whose
+    labels are mixed or disagree with the synthesized program at
+    `program_path` (by default the newest one under previous_runs). The
+    samples are not added to the cache, which holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    program_path = program_path or latest_program(_PREVIOUS_RUNS_DIR)
+    execute = load_program(program_path) if program_path else None
+    # Incomes are kept to two decimals, as in uniform draws.
+    def prepare(columns):
+        columns[1] = np.trunc(100.0 * columns[1]) / 100.0
+    columns, labels = active_sample(_stratified_cells(), _oracle(), num_of_samples, rng,
+                                    execute, feature_defs.retrieve_feature_defs(), 'approved', rounds, prepare=prepare)
+    return samples_from_columns(columns, labels, _feature_names, 'approved')
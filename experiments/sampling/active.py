@@ -0,0 +1,123 @@
+# active.py -- spend oracle queries near the decision boundaries of the current diagram
+#
+# Uniform draws put most oracle queries in feature_defs cells where every
+# sample gets the same label, and the synthesized program already agrees with
+# it there. Only the cells whose labels are mixed, or whose labels disagree
+# with the program's output for the cell, can change the next diagram. Active
+# sampling works in rounds: every cell first gets a few queries, then each
+# round's queries go to the cells in proportion to how mixed their labels are
+# plus how often the program gets them wrong, with a small floor that shrinks
+# as a cell collects samples, so no cell is starved.
+#
+#   execute = load_program(latest_program("experiments/california_census/previous_runs"))
+#   columns, labels = active_sample(cells, label_batch, 2000, rng, execute,
+#                                   feature_defs.retrieve_feature_defs(), 'Class')
+
+import glob
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+from experiments.sampling.program_codegen import rewrite
+from experiments.sampling.stratified import cell_representatives, draw_in_cells, num_cells
+
+_EXPLORATION = 0.05
+
+def latest_program(previous_runs_dir):
+    """The most recently written program_ms_*.py under `previous_runs_dir`, or None."""
+    paths = glob.glob(os.path.join(previous_runs_dir, "*", "program_ms_*.py"))
+    if not paths:
+        return None
+    return max(paths, key=lambda path: (os.path.getmtime(path), path))
+
+def load_program(path, rewritten=True):
+    """
+    Imports a synthesized program_ms_*.py file and returns its execute
+    function; with `rewritten`, as program_codegen rewrites it (same outputs,
+    much cheaper calls).
+    """
+    # Generated programs import their dataset's feature_defs as a top-level
+    # module; drop any other dataset's copy so this program gets its own.
+    sys.modules.pop("feature_defs", None)
+    spec = importlib.util.spec_from_file_location(f"_program_{abs(hash(os.path.abspath(path)))}", path)
+    module = importlib.util.module_from_spec(spec)
+    with open(path, 'r') as f:
+        source = f.read()
+    if rewritten:
+        try:
+            source = rewrite(source)
+        except ValueError:
+            pass  # Not the synthesizer's format; run it as written.
+    exec(compile(source, path, 'exec'), module.__dict__)
+    return module.execute
+
+def _program_labels(execute, axes_cells):
+    """The program's output for every cell, from one representative row per cell."""
+    representatives = cell_representatives(axes_cells)
+    return np.array([execute(list(row)) for row in zip(*representatives)], dtype=object)
+
+def cell_priorities(cells, labels, total_cells, program_labels=None, label_bin=None):
+    """
+    Weight of every cell for the next round: the fraction of its samples not
+    carrying its most common label, plus the fraction the program gets wrong,
+    plus an exploration term that decays with the number of samples.
+    `label_bin` maps an oracle label to the program's '<label>_<bin>' output.
+    """
+    label_values, label_codes = np.unique(np.asarray(labels), return_inverse=True)
+    counts = np.zeros((total_cells, len(label_values)))
+    np.add.at(counts, (cells, label_codes), 1)
+    seen = counts.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        impurity = np.where(seen > 0, 1.0 - counts.max(axis=1) / seen, 0.0)
+        disagreement = np.zeros(total_cells)
+        if program_labels is not None:
+            binned = np.array([label_bin(value) for value in label_values], dtype=object)
+            wrong = binned[None, :] != program_labels[:, None]
+            disagreement = np.where(seen > 0, (counts * wrong).sum(axis=1) / seen, 0.0)
+    return impurity + disagreement + _EXPLORATION / (seen + 1.0)
+
+def active_sample(axes_cells, label_batch, budget, rng, execute=None, feature_defs=None, label_name=None,
+                  rounds=8, initial_per_cell=1, prepare=None):
+    """
+    Draws and labels `budget` rows inside the product of `axes_cells` (as
+    stratified.draw_in_cells takes them), spending most queries where labels
+    are mixed or disagree with `execute`, a synthesized program's execute
+    function (labels alone are used if it is None). `feature_defs` and
+    `label_name` turn oracle labels into the program's '<label>_<bin>'
+    outputs. `prepare`, if given, adjusts drawn columns in place (e.g.
+    rounding) before they are labelled. Returns (columns, labels).
+    """
+    total_cells = num_cells(axes_cells)
+    initial = min(budget, initial_per_cell * total_cells)
+    counts = np.zeros(total_cells, dtype=np.int64)
+    counts[rng.permutation(total_cells)[:initial % total_cells]] = 1
+    counts += initial // total_cells
+
+    program_labels = label_bin = None
+    if execute is not None:
+        program_labels = _program_labels(execute, axes_cells)
+        label_rule = feature_defs[label_name]
+        label_bin = lambda value: f"{label_name}_{label_rule([(label_name, value)])}"
+
+    column_parts, label_parts, cell_parts = [], [], []
+    remaining = budget
+    for round_number in range(rounds + 1):
+        columns = draw_in_cells(axes_cells, counts, rng)
+        if prepare is not None:
+            prepare(columns)
+        column_parts.append(columns)
+        label_parts.append(np.asarray(label_batch(columns)))
+        cell_parts.append(np.repeat(np.arange(total_cells), counts))
+        remaining -= int(counts.sum())
+        if remaining <= 0 or round_number == rounds:
+            break
+
+        weights = cell_priorities(np.concatenate(cell_parts), np.concatenate(label_parts), total_cells,
+                                  program_labels, label_bin)
+        per_round = -(-remaining // (rounds - round_number))
+        counts = rng.multinomial(per_round, weights / weights.sum())
+
+    columns = [np.concatenate([part[i] for part in column_parts]) for i in range(len(axes_cells))]
+    return columns, np.concatenate(label_parts)
@@ -0,0 +1,72 @@
+# aggregate.py -- collapse samples that discretize identically into weighted rows
+#
+# A synthesized program only sees a sample through the bins its feature_defs.py
+# assigns, so raw samples with the same (feature bins, label bin) are
+# interchangeable for the ERM objective: each contributes the same 0/1 error
+# for any program. Keeping one representative per group with the group's size
+# as its weight gives the same objective with one row per distinct group.
+#
+#   samples = sampler.uniform(100000)
+#   representatives, weights = aggregate(samples, feature_defs.retrieve_feature_defs())
+#   weighted_error(program.execute, representatives, weights, feature_defs.retrieve_feature_defs())
+#   == weighted_error(program.execute, samples, None, feature_defs.retrieve_feature_defs())
+
+def _names(samples, feature_names, label_name):
+    key, value = next(iter(samples.items()))
+    if feature_names is None:
+        feature_names = [name for name, _ in key]
+    if label_name is None:
+        label_name = value[0][0]
+    return feature_names, label_name
+
+def discretize(key, value, feature_defs, feature_names, label_name):
+    """Returns the (feature bins, label bin) group of one legacy sample."""
+    return tuple(feature_defs[name](key) for name in feature_names), feature_defs[label_name](value)
+
+def aggregate(samples, feature_defs, feature_names=None, label_name=None):
+    """
+    Groups legacy samples by their (feature bins, label bin) under
+    `feature_defs` (the dict from retrieve_feature_defs()). Returns
+    (representatives, weights): a legacy-shaped dict holding the first sample
+    of every group, and a dict mapping each of its keys to the group's size.
+    Feature and label names default to those in the samples.
+    """
+    if not samples:
+        return {}, {}
+    feature_names, label_name = _names(samples, feature_names, label_name)
+    first_of_group = {}
+    weights = {}
+    for key, value in samples.items():
+        group = discretize(key, value, feature_defs, feature_names, label_name)
+        representative = first_of_group.setdefault(group, key)
+        weights[representative] = weights.get(representative, 0) + 1
+    representatives = {key: samples[key] for key in weights}
+    return representatives, weights
+
+def group_counts(samples, feature_defs, feature_names=None, label_name=None):
+    """Returns {(feature bins, label bin): number of samples} without keeping representatives."""
+    if not samples:
+        return {}
+    feature_names, label_name = _names(samples, feature_names, label_name)
+    counts = {}
+    for key, value in samples.items():
+        group = discretize(key, value, feature_defs, feature_names, label_name)
+        counts[group] = counts.get(group, 0) + 1
+    return counts
+
+def weighted_error(execute, samples, weights, feature_defs, feature_names=None, label_name=None):
+    """
+    Number of misclassified samples of a synthesized program, counting each
+    sample `weights[key]` times (once if `weights` is None). `execute` takes
+    the raw feature values and returns '<label>_<bin>', as the generated
+    program_ms_*.py files do.
+    """
+    if not samples:
+        return 0
+    feature_names, label_name = _names(samples, feature_names, label_name)
+    error = 0
+    for key, value in samples.items():
+        predicted = execute([v for _, v in key])
+        if predicted != f"{label_name}_{feature_defs[label_name](value)}":
+            error += 1 if weights is None else weights[key]
+    return error
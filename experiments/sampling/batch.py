@@ -0,0 +1,55 @@
+# batch.py -- chunked, vectorized synthetic-sample generation shared by the samplers
+
+import numpy as np
+
+from experiments.sampling.columnar_store import KeyIndex
+
+# Rows drawn, encoded and predicted per call into the model.
+DEFAULT_CHUNK_SIZE = 65536
+
+def samples_from_columns(columns, labels, feature_names, label_name):
+    """Builds the samplers' {key: [(label_name, label)]} dict from feature columns and labels."""
+    rows = zip(*(np.asarray(column).tolist() for column in columns))
+    return {tuple(zip(feature_names, values)): [(label_name, label)]
+            for values, label in zip(rows, np.asarray(labels).tolist())}
+
+def generate_unique_columns(num_needed, draw_batch, predict_batch, existing, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generates `num_needed` new labelled rows whose features are not in
+    `existing` (a KeyIndex).
+
+    `draw_batch(n)` must return one NumPy array of length n per feature, and
+    `predict_batch(columns)` must return the label array for such a list of
+    columns. Each chunk is drawn in one call, deduped against the cache and
+    itself on packed keys, and only the surviving rows are sent to the
+    predictor in one call. Returns (feature columns, labels).
+    """
+    fresh = KeyIndex(digits=existing.digits)
+    column_parts, label_parts = [], []
+    num_found = 0
+    while num_found < num_needed:
+        n = min(chunk_size, num_needed - num_found)
+        columns = [np.asarray(col) for col in draw_batch(n)]
+
+        # Keep the first occurrence of every row not already cached.
+        keep = ~existing.contains_rows(columns) & fresh.add_new(columns)
+        if not keep.any():
+            continue
+
+        columns = [col[keep] for col in columns]
+        column_parts.append(columns)
+        label_parts.append(np.asarray(predict_batch(columns)))
+        num_found += len(columns[0])
+
+    if not column_parts:
+        return [], np.empty(0)
+    return [np.concatenate(part) for part in zip(*column_parts)], np.concatenate(label_parts)
+
+def generate_unique(num_needed, draw_batch, predict_batch, feature_names, label_name,
+                    existing, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    generate_unique_columns, returning the new samples in the samplers' usual
+    {key: [(label_name, label)]} shape.
+    """
+    columns, labels = generate_unique_columns(num_needed, draw_batch, predict_batch, existing, chunk_size)
+    return samples_from_columns(columns, labels, feature_names, label_name)
@@ -0,0 +1,243 @@
+# bin_search.py -- score candidate bin thresholds on a dataset's cached samples
+#
+# Trying new thresholds in feature_defs used to mean a full synthesis run per
+# attempt. This tool loads the sample cache once and scores binnings from
+# label counts alone:
+#   1. Each numeric feature (a "thresholds" entry of bins.json) is sorted
+#      once, with the cumulative label histogram along it. The label counts
+#      of any bin are then a difference of two histogram rows, so every
+#      k-bin partition over a grid of candidate thresholds (rounded quantiles)
+#      is scored at once: its purity (the accuracy of the per-bin majority
+#      label) and its occupancy (the smallest bin's share of the rows).
+#   2. The best partitions of each feature are combined, the other features
+#      keep their current bins, and each combination is scored on the cells
+#      of the product of the bins: the cell-majority accuracy (what a diagram
+#      of unlimited size reaches over those bins), the accuracy of a tree of
+#      at most `size` decision nodes grown greedily over the cells (`size` as
+#      in dd.config; diagrams can share nodes, so this is a lower bound for a
+#      diagram of that size), and how many cells are empty.
+# The top binnings are printed next to the current one and can be written as
+# bins.json files: copy one over the dataset's bins.json and run binning.py.
+#
+# Usage: python -m experiments.sampling.bin_search experiments/Iris [--samples 100000]
+#            [--bins 4] [--candidates 48] [--top 5] [--emit-dir /tmp/iris_bins]
+
+import argparse
+import copy
+import importlib
+import itertools
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+from experiments.sampling.binning import load_spec
+
+_MAX_PARTITIONS = 200000
+
+def config_size(dataset_dir):
+    """The `size` setting of the dataset's dd.config."""
+    with open(os.path.join(dataset_dir, "dd.config"), 'r') as f:
+        match = re.search(r"^\s*size\s*=\s*(\d+)", f.read(), re.MULTILINE)
+    return int(match.group(1))
+
+def cached_columns(sampler_module, samples):
+    """The feature columns and labels of the sampler's cache, filled to `samples` rows first."""
+    sampler = importlib.import_module(sampler_module)
+    sampler.uniform(samples, seed=0)
+    store = sampler._load_store() if hasattr(sampler, '_load_store') else sampler._store
+    store.refresh()
+    features, labels = store.columns()
+    return dict(zip(store.feature_names, features)), labels
+
+def candidate_thresholds(values, count):
+    """About `count` thresholds at quantiles of `values`, rounded to two significant digits of their range."""
+    values = np.asarray(values, dtype=float)
+    quantiles = np.quantile(values, np.linspace(0.0, 1.0, count + 2)[1:-1])
+    spread = values.max() - values.min()
+    exponent = math.floor(math.log10(spread)) - 1 if spread > 0 else 0
+    thresholds = np.unique(np.round(np.round(quantiles / 10.0 ** exponent) * 10.0 ** exponent, max(0, -exponent)))
+    thresholds = thresholds[(thresholds > values.min()) & (thresholds <= values.max())]
+    # Whole-number steps give whole-number thresholds, written as 25 rather than 25.0.
+    return thresholds.astype(np.int64) if exponent >= 0 else thresholds
+
+class SortedFeature:
+    """A feature's values in sorted order, with the cumulative label histogram along them."""
+
+    def __init__(self, values, label_codes, num_labels):
+        order = np.argsort(values, kind='stable')
+        self.values = np.asarray(values, dtype=float)[order]
+        one_hot = np.zeros((len(order) + 1, num_labels), dtype=np.int64)
+        one_hot[np.arange(1, len(order) + 1), label_codes[order]] = 1
+        self.cumulative = np.cumsum(one_hot, axis=0)
+
+    def bin_counts(self, thresholds):
+        """Label counts of the bins cut at each row of `thresholds` (P x k-1) -> (P x k x labels)."""
+        # Row i of cumulative counts the rows below the i-th smallest value, i.e. value < threshold.
+        positions = np.searchsorted(self.values, thresholds, side='left')
+        edges = np.concatenate([np.zeros((len(positions), 1), dtype=np.int64), positions,
+                                np.full((len(positions), 1), len(self.values))], axis=1)
+        return self.cumulative[edges[:, 1:]] - self.cumulative[edges[:, :-1]]
+
+def score_partitions(feature, candidates, num_bins, limit=_MAX_PARTITIONS, rng=None):
+    """
+    Purity and occupancy of every way to cut `feature` into num_bins bins at
+    `candidates` (a random `limit` of them if there are more). Returns
+    (thresholds P x num_bins-1, purity P, occupancy P).
+    """
+    num_ways = math.comb(len(candidates), num_bins - 1)
+    if num_ways <= limit:
+        choices = np.array(list(itertools.combinations(range(len(candidates)), num_bins - 1)), dtype=np.int64)
+    else:
+        rng = rng or np.random.default_rng(0)
+        choices = np.sort(np.array([rng.choice(len(candidates), num_bins - 1, replace=False) for _ in range(limit)]), axis=1)
+    thresholds = np.asarray(candidates)[choices.reshape(-1, num_bins - 1)]
+    counts = feature.bin_counts(thresholds)
+    total = counts.sum(axis=(1, 2))
+    purity = counts.max(axis=2).sum(axis=1) / total
+    occupancy = counts.sum(axis=2).min(axis=1) / total
+    return thresholds, purity, occupancy
+
+def _correct(table):
+    return table.reshape(-1, table.shape[-1]).sum(axis=0).max()
+
+def greedy_tree_accuracy(table, size):
+    """
+    Accuracy of a tree of at most `size` decision nodes, each testing one
+    feature with a branch per bin, grown best-first over a cell count table
+    (one axis per feature, then the label axis).
+    """
+    leaves = [table]
+    for _ in range(size):
+        best = None
+        for i, leaf in enumerate(leaves):
+            base = _correct(leaf)
+            for axis in range(leaf.ndim - 1):
+                if leaf.shape[axis] == 1:
+                    continue
+                children = [leaf.take([b], axis=axis) for b in range(leaf.shape[axis])]
+                gain = sum(_correct(child) for child in children) - base
+                if gain > 0 and (best is None or gain > best[0]):
+                    best = (gain, i, children)
+        if best is None:
+            break
+        _, i, children = best
+        leaves[i:i + 1] = children
+    return sum(_correct(leaf) for leaf in leaves) / table.sum()
+
+def score_binning(bin_columns, label_codes, num_labels, bin_shape, size):
+    """Cell-majority accuracy, greedy size-bounded tree accuracy and empty-cell share of one joint binning."""
+    cells = np.ravel_multi_index(bin_columns, bin_shape)
+    table = np.bincount(cells * num_labels + label_codes, minlength=int(np.prod(bin_shape)) * num_labels)
+    table = table.reshape(tuple(bin_shape) + (num_labels,))
+    cell_totals = table.sum(axis=-1)
+    return {"cell_accuracy": float(table.max(axis=-1).sum() / len(label_codes)),
+            "tree_accuracy": float(greedy_tree_accuracy(table, size)),
+            "empty_cells": float(np.mean(cell_totals == 0))}
+
+def search(dataset_dir, columns, labels, num_bins=None, num_candidates=48, per_feature=4,
+           min_occupancy=0.01, size=None, top=5):
+    """
+    Scores binnings of the dataset's numeric features on cached columns.
+    Returns (the current binning's result, the `top` results, partitions
+    scored per second); a result holds the thresholds per feature and the
+    scores of score_binning.
+    """
+    spec = load_spec(dataset_dir)
+    feature_defs = importlib.import_module(dataset_dir.replace(os.sep, ".").strip(".") + ".feature_defs")
+    batch_defs = feature_defs.retrieve_batch_feature_defs()
+    size = config_size(dataset_dir) if size is None else size
+    label_values, label_codes = np.unique(np.asarray(labels), return_inverse=True)
+    num_labels = len(label_values)
+
+    # Per-feature partitions, each as (thresholds, purity, occupancy).
+    options, fixed, scored, start = {}, {}, 0, time.perf_counter()
+    for entry in spec["features"]:
+        name = entry["name"]
+        if "thresholds" not in entry:
+            codes = batch_defs[name](columns[name])
+            fixed[name] = np.unique(codes, return_inverse=True)[1]
+            continue
+        k = num_bins or len(entry["thresholds"]) + 1
+        sorted_feature = SortedFeature(columns[name], label_codes, num_labels)
+        thresholds, purity, occupancy = score_partitions(sorted_feature, candidate_thresholds(columns[name], num_candidates), k)
+        scored += len(purity)
+        ranked = [i for i in np.argsort(-purity, kind='stable') if occupancy[i] >= min_occupancy][:per_feature]
+        options[name] = [(thresholds[i].tolist(), float(purity[i]), float(occupancy[i])) for i in ranked]
+    rate = scored / max(time.perf_counter() - start, 1e-9)
+
+    def evaluate(choice):
+        bin_columns, shape = [], []
+        for entry in spec["features"]:
+            name = entry["name"]
+            if name in fixed:
+                bin_columns.append(fixed[name])
+                shape.append(int(fixed[name].max()) + 1 if len(fixed[name]) else 1)
+            else:
+                bin_columns.append(np.searchsorted(np.asarray(choice[name], dtype=float), columns[name], side='right'))
+                shape.append(len(choice[name]) + 1)
+        result = score_binning(bin_columns, label_codes, num_labels, shape, size)
+        result["thresholds"] = dict(choice)
+        return result
+
+    current = evaluate({entry["name"]: entry["thresholds"] for entry in spec["features"] if "thresholds" in entry})
+    names = list(options)
+    results = [evaluate({name: picked[0] for name, picked in zip(names, combination)})
+               for combination in itertools.product(*(options[name] for name in names))]
+    results.sort(key=lambda result: (-result["tree_accuracy"], -result["cell_accuracy"], result["empty_cells"]))
+    return current, results[:top], rate
+
+def binning_spec(dataset_dir, thresholds):
+    """The dataset's bins.json with the given thresholds; bin renumbering is kept where the bin count is unchanged."""
+    spec = copy.deepcopy(load_spec(dataset_dir))
+    for entry in spec["features"]:
+        if entry["name"] in thresholds:
+            if len(entry.get("codes", [])) != len(thresholds[entry["name"]]) + 1:
+                entry.pop("codes", None)
+            entry["thresholds"] = thresholds[entry["name"]]
+    return spec
+
+def format_spec(spec):
+    """`spec` as JSON laid out like the hand-written bins.json files: one line per feature."""
+    features = ",\n".join(f"  {json.dumps(entry)}" for entry in spec["features"])
+    return f'{{\n "features": [\n{features}\n ],\n "label": {json.dumps(spec["label"])}\n}}\n'
+
+def _print_result(rank, result):
+    cuts = "  ".join(f"{name}={values}" for name, values in result["thresholds"].items())
+    print(f"{rank:>8} {result['tree_accuracy']:>9.4f} {result['cell_accuracy']:>9.4f} {result['empty_cells']:>7.1%}   {cuts}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scores candidate bin thresholds on a dataset's cached samples.")
+    parser.add_argument("dataset_dir", help="e.g. experiments/Iris")
+    parser.add_argument("--sampler", help="sampler module whose cache is read (default: <dataset_dir>/sampler)")
+    parser.add_argument("--samples", type=int, default=100000, help="rows to fill the cache to before reading it")
+    parser.add_argument("--bins", type=int, help="bins per numeric feature (default: as in bins.json)")
+    parser.add_argument("--candidates", type=int, default=48, help="candidate thresholds per feature")
+    parser.add_argument("--per-feature", type=int, default=4, help="partitions per feature kept for combining")
+    parser.add_argument("--min-occupancy", type=float, default=0.01, help="smallest share of rows a bin may hold")
+    parser.add_argument("--size", type=int, help="decision nodes of the scored trees (default: dd.config size)")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--emit-dir", help="write the top binnings there as bins_<rank>.json")
+    args = parser.parse_args()
+
+    dataset_dir = os.path.normpath(args.dataset_dir)
+    sampler_module = args.sampler or dataset_dir.replace(os.sep, ".") + ".sampler"
+    columns, labels = cached_columns(sampler_module, args.samples)
+    current, best, rate = search(dataset_dir, columns, labels, args.bins, args.candidates, args.per_feature,
+                                 args.min_occupancy, args.size, args.top)
+
+    print(f"--- Scored {rate:,.0f} single-feature partitions per second over {len(labels)} cached rows. ---")
+    print(f"{'rank':>8} {'tree acc':>9} {'cell acc':>9} {'empty':>7}   thresholds")
+    _print_result("current", current)
+    for rank, result in enumerate(best, 1):
+        _print_result(rank, result)
+    if args.emit_dir:
+        os.makedirs(args.emit_dir, exist_ok=True)
+        for rank, result in enumerate(best, 1):
+            path = os.path.join(args.emit_dir, f"bins_{rank}.json")
+            with open(path, 'w') as f:
+                f.write(format_spec(binning_spec(dataset_dir, result["thresholds"])))
+            print(f"--- Wrote '{path}'. ---")
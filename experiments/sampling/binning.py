@@ -0,0 +1,237 @@
+# binning.py -- compile a dataset's bins.json into its feature_defs.py and config bin counts
+#
+# The bins of every feature used to be written three times: as `if value < t`
+# chains in feature_defs.py, as thresholds in retrieve_bin_boundaries(), and
+# as bin counts in dd.config (and config.mmc). bins.json next to them is now
+# the only place they are written:
+#
+#   {"features": [{"name": "age", "thresholds": [25, 40, 55]},
+#                 {"name": "population", "thresholds": [3000.0, 10000.0], "codes": [1, 2, 0]},
+#                 {"name": "workclass", "categories": {"Private": 0, "?": 1}, "default": -1},
+#                 {"name": "clouds", "values": [0, 1, 2, 3, 4, 5]}],
+#    "label": {"name": "income", "categories": {"<=50K": 0, ">50K": 1}}}
+#
+# "thresholds" bins a number by how many thresholds it reaches (renumbered by
+# "codes", if given), "categories" maps a value to a code ("default" for
+# anything else, -1 if not given), and "values" passes the value through,
+# one bin per listed value. A categorical feature with "dictionary":
+# "categories.json" is cached as the integer codes of that
+# CategoricalDictionary (see categories.py); its functions then take codes,
+# mapping each to the bin of its category.
+#
+# The compiler writes feature_defs.py with the scalar functions the
+# synthesizer calls, retrieve_bin_boundaries() and the batch discretizers of
+# retrieve_batch_feature_defs(), all over module-level tables, and sets the
+# bin counts in the config files to match.
+#
+# Usage: python -m experiments.sampling.binning experiments/Adult3 [experiments/Iris ...] [--check]
+
+import argparse
+import json
+import keyword
+import os
+import re
+import sys
+
+from experiments.sampling.categories import CategoricalDictionary
+
+SPEC_FILENAME = "bins.json"
+_CONFIG_FILENAMES = ["dd.config", "config.mmc"]
+
+def load_spec(dataset_dir):
+    with open(os.path.join(dataset_dir, SPEC_FILENAME), 'r') as f:
+        return json.load(f)
+
+def _kind(entry):
+    kinds = [kind for kind in ("thresholds", "categories", "values") if kind in entry]
+    if len(kinds) != 1:
+        raise ValueError(f"Bin spec of '{entry['name']}' needs exactly one of thresholds, categories or values.")
+    return kinds[0]
+
+def bin_count(entry):
+    """Number of bins the synthesizer sees for a feature or label."""
+    kind = _kind(entry)
+    if kind == "thresholds":
+        return len(set(entry.get("codes", range(len(entry["thresholds"]) + 1))))
+    if kind == "categories":
+        return len(set(entry["categories"].values()))
+    return len(entry["values"])
+
+def _function_name(name):
+    # Names that are Python keywords (Banknote's 'class') get an upper-case function.
+    return name.upper() if keyword.iskeyword(name) else name
+
+def _table_name(name, suffix):
+    return f"_{re.sub(r'[^0-9A-Za-z]', '_', name).upper()}_{suffix}"
+
+def _code_bins(entry, dictionaries):
+    """Bin of each code of the feature's dictionary, or None if it takes raw values."""
+    if "dictionary" not in entry:
+        return None
+    categories = dictionaries[entry["dictionary"]].categories[entry["name"]]
+    return [entry["categories"].get(category, entry.get("default", -1)) for category in categories]
+
+# --- Code generation ---
+def _scalar_body(entry, kind, value_expr, code_bins=None):
+    lines = [f"\tvalue = {value_expr}"]
+    if code_bins is not None:
+        lines.append(f"\treturn {_table_name(entry['name'], 'CODE_BINS')}.get(value, {entry.get('default', -1)!r})")
+        return lines
+    if kind == "thresholds":
+        codes = entry.get("codes", list(range(len(entry["thresholds"]) + 1)))
+        for threshold, code in zip(entry["thresholds"], codes):
+            lines += [f"\tif value < {threshold!r}:", f"\t\treturn {code!r}"]
+        lines.append(f"\treturn {codes[-1]!r}")
+    elif kind == "categories":
+        lines.append(f"\treturn {_table_name(entry['name'], 'CODES')}.get(value, {entry.get('default', -1)!r})")
+    else:
+        lines.append("\treturn value")
+    return lines
+
+def _tables(entry, kind, dictionaries, code_bins=None):
+    name = entry["name"]
+    if code_bins is not None:
+        categories = dictionaries[entry["dictionary"]].categories[name]
+        return [f"# {name} codes of {entry['dictionary']}: " + ", ".join(f"{code} {category}" for code, category in enumerate(categories)),
+                f"{_table_name(name, 'CODE_BINS')} = {dict(enumerate(code_bins))!r}",
+                f"{_table_name(name, 'BIN_TABLE')} = np.array({code_bins!r})"]
+    if kind == "thresholds":
+        lines = [f"{_table_name(name, 'BOUNDARIES')} = np.array({entry['thresholds']!r}, dtype=float)"]
+        if "codes" in entry:
+            lines.append(f"{_table_name(name, 'BIN_CODES')} = np.array({entry['codes']!r})")
+        return lines
+    if kind == "categories":
+        return [f"{_table_name(name, 'CODES')} = {entry['categories']!r}"]
+    return []
+
+def _batch_body(entry, kind, code_bins=None):
+    name = entry["name"]
+    if code_bins is not None:
+        table = _table_name(name, 'BIN_TABLE')
+        return ["\tcodes = np.asarray(values, dtype=np.int64)",
+                f"\tknown = (codes >= 0) & (codes < len({table}))",
+                f"\treturn np.where(known, {table}[np.where(known, codes, 0)], {entry.get('default', -1)!r})"]
+    if kind == "thresholds":
+        bins = f"np.searchsorted({_table_name(name, 'BOUNDARIES')}, np.asarray(values, dtype=float), side='right')"
+        return [f"\treturn {_table_name(name, 'BIN_CODES')}[{bins}]" if "codes" in entry else f"\treturn {bins}"]
+    if kind == "categories":
+        return ["\tvalues = np.asarray(values).tolist()",
+                f"\tcodes = map({_table_name(name, 'CODES')}.get, values, itertools.repeat({entry.get('default', -1)!r}))",
+                "\treturn np.fromiter(codes, dtype=np.int64, count=len(values))"]
+    return ["\treturn np.asarray(values)"]
+
+def _docstring(entry, kind, is_label):
+    name = entry["name"]
+    if "dictionary" in entry:
+        return f"Maps the {name} code (see {entry['dictionary']}) to an integer."
+    if kind == "thresholds":
+        return f"Discretizes {name} into {bin_count(entry)} bins."
+    if kind == "categories":
+        return f"Maps the {name} {'label' if is_label else 'category'} to an integer."
+    return f"Returns the {name} value, one bin per value."
+
+def render_feature_defs(spec, dictionaries=None):
+    """
+    Source of the feature_defs.py described by `spec`. `dictionaries` maps
+    the dictionary file names the spec refers to to their CategoricalDictionary.
+    """
+    entries = [(entry, False) for entry in spec["features"]] + [(spec["label"], True)]
+    code_bins = {entry["name"]: _code_bins(entry, dictionaries) for entry, _ in entries}
+    uses_categories = any(_kind(entry) == "categories" and code_bins[entry["name"]] is None for entry, _ in entries)
+
+    out = [f"# feature_defs.py -- generated from {SPEC_FILENAME} by experiments/sampling/binning.py; edit that file and rerun it.",
+           ""]
+    if uses_categories:
+        out += ["import itertools", ""]
+    out += ["import numpy as np", "", "# --- Lookup Tables ---"]
+    for entry, _ in entries:
+        out += _tables(entry, _kind(entry), dictionaries, code_bins[entry["name"]])
+
+    out += ["", "# --- Scalar Definitions ---"]
+    for i, (entry, is_label) in enumerate(entries):
+        kind = _kind(entry)
+        argument = "outputs" if is_label else "inputs"
+        out += [f"def {_function_name(entry['name'])}({argument}):", f'\t"""{_docstring(entry, kind, is_label)}"""']
+        out += _scalar_body(entry, kind, f"{argument}[{0 if is_label else i}][1]", code_bins[entry["name"]])
+        out.append("")
+
+    out += ["def retrieve_feature_defs():",
+            '\t"""Returns a dictionary mapping all names to their definition functions."""',
+            "\tfeature_defs = {}"]
+    out += [f'\tfeature_defs["{entry["name"]}"] = {_function_name(entry["name"])}' for entry, _ in entries]
+    out += ["\treturn feature_defs", ""]
+
+    out += ["def retrieve_bin_boundaries():",
+            '\t"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""',
+            "\tbin_boundaries = {}"]
+    for entry in spec["features"]:
+        thresholds = entry["thresholds"] if _kind(entry) == "thresholds" else None
+        out.append(f'\tbin_boundaries["{entry["name"]}"] = {thresholds!r}')
+    out += ["\treturn bin_boundaries", ""]
+
+    out += ["# --- Batch Definitions ---"]
+    for entry, _ in entries:
+        out += [f"def _{entry['name']}_batch(values):"] + _batch_body(entry, _kind(entry), code_bins[entry["name"]]) + [""]
+    out += ["def retrieve_batch_feature_defs():",
+            '\t"""Returns each function above as a function of a value array, giving the array of its results."""',
+            "\tbatch_defs = {}"]
+    out += [f'\tbatch_defs["{entry["name"]}"] = _{entry["name"]}_batch' for entry, _ in entries]
+    out += ["\treturn batch_defs", ""]
+    return "\n".join(out)
+
+def render_config(spec, text):
+    """`text` of a dd.config/config.mmc with the bin counts of its features and labels lines set from `spec`."""
+    counts = {entry["name"]: bin_count(entry) for entry in spec["features"] + [spec["label"]]}
+
+    def set_count(match):
+        name, rest = match.group(1), match.group(3) or ""
+        if name not in counts:
+            raise ValueError(f"Config lists '{name}', which {SPEC_FILENAME} does not define.")
+        return f"{name}:{counts[name]}{rest}"
+
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if key in ("features", "labels") and "=" in line:
+            head, items = line.split("=", 1)
+            lines[i] = head + "=" + re.sub(r"([^\s,:=]+):(\d+)((?::\d+)*)", set_count, items)
+    return "\n".join(lines)
+
+def compile_dataset(dataset_dir, check=False):
+    """
+    Regenerates feature_defs.py and the config bin counts of `dataset_dir`
+    from its bins.json. Returns the paths whose contents changed (with
+    `check`, the paths that would change; nothing is written).
+    """
+    spec = load_spec(dataset_dir)
+    dictionaries = {entry["dictionary"]: CategoricalDictionary.load(os.path.join(dataset_dir, entry["dictionary"]))
+                    for entry in spec["features"] + [spec["label"]] if "dictionary" in entry}
+    targets = {os.path.join(dataset_dir, "feature_defs.py"): lambda text: render_feature_defs(spec, dictionaries)}
+    for filename in _CONFIG_FILENAMES:
+        path = os.path.join(dataset_dir, filename)
+        if os.path.exists(path):
+            targets[path] = lambda text: render_config(spec, text)
+
+    changed = []
+    for path, render in targets.items():
+        current = open(path, 'r').read() if os.path.exists(path) else ""
+        new = render(current)
+        if new != current:
+            changed.append(path)
+            if not check:
+                with open(path, 'w') as f:
+                    f.write(new)
+    return changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Compiles {SPEC_FILENAME} into feature_defs.py and the config bin counts.")
+    parser.add_argument("dataset_dirs", nargs="+")
+    parser.add_argument("--check", action="store_true", help="only report files that are out of date; exit 1 if any")
+    args = parser.parse_args()
+
+    stale = []
+    for dataset_dir in args.dataset_dirs:
+        for path in compile_dataset(dataset_dir, args.check):
+            print(f"--- {'Out of date' if args.check else 'Wrote'}: '{path}'. ---")
+            stale.append(path)
+    sys.exit(1 if args.check and stale else 0)
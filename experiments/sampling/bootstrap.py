@@ -0,0 +1,47 @@
+# bootstrap.py -- vectorized initial cache build from real data columns
+
+import time
+
+import numpy as np
+
+def _print_stage(stage, rows, seconds):
+    print(f"--- [bootstrap] {stage}: {rows} rows in {seconds:.3f}s ---")
+
+class BootstrapProgress:
+    """
+    Times the stages of an initial cache build and reports each one to
+    hook(stage, rows, seconds). The default hook prints a line per stage.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook or _print_stage
+        self._start = self._last = time.time()
+
+    def stage(self, name, rows):
+        now = time.time()
+        self.hook(name, rows, now - self._last)
+        self._last = now
+
+    def done(self, rows):
+        self._last = self._start
+        self.stage("total", rows)
+
+def last_occurrence_mask(columns):
+    """
+    Marks the last occurrence of every distinct row of the given columns, so
+    the kept rows match what inserting them one by one into a dict would keep.
+    """
+    codes = np.column_stack([np.unique(np.asarray(column), return_inverse=True)[1].ravel()
+                             for column in columns])
+    _, first_in_reversed = np.unique(codes[::-1], axis=0, return_index=True)
+    keep = np.zeros(len(codes), dtype=bool)
+    keep[len(codes) - 1 - first_in_reversed] = True
+    return keep
+
+def write_real_samples(store, feature_columns, labels, progress):
+    """Dedupes the real data rows and writes them as the store's first segment."""
+    keep = last_occurrence_mask(feature_columns)
+    progress.stage("dedupe", int(keep.sum()))
+    store.append_columns([np.asarray(column)[keep] for column in feature_columns], np.asarray(labels)[keep])
+    progress.stage("write", int(keep.sum()))
+    return int(keep.sum())
@@ -0,0 +1,49 @@
+# cache_key.py -- content-addressed cache directory names
+#
+# A sampler cache is only valid for the oracle, data and generation domain it
+# was built from. The cache directory name therefore carries a digest of the
+# contents of the model files and data file plus the domain parameters, so a
+# changed model or range gets a fresh cache while runs with the same inputs
+# (e.g. the solver variants of one dataset) share one.
+
+import hashlib
+import json
+import os
+
+_DIGEST_LENGTH = 16
+_file_digests = {}   # (path, size, mtime_ns) -> sha1 of the contents
+
+def _file_digest(path):
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _file_digests[memo_key] = h.hexdigest()
+    return _file_digests[memo_key]
+
+def content_digest(paths, params=None):
+    """
+    Digest of the contents of `paths` (files or directories, walked in sorted
+    order) and of the JSON-serializable `params`. Paths only contribute their
+    names relative to themselves, so copies of a checkout share digests.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    file_path = os.path.join(dirpath, name)
+                    h.update(os.path.relpath(file_path, path).encode())
+                    h.update(_file_digest(file_path).encode())
+        else:
+            h.update(_file_digest(path).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:_DIGEST_LENGTH]
+
+def cache_dir(base, paths, params=None):
+    """Returns `base` suffixed with the content digest of its inputs."""
+    return f"{base}_{content_digest(paths, params)}"
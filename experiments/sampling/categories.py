@@ -0,0 +1,94 @@
+# categories.py -- integer codes for categorical features, shared by a sampler and its feature_defs.py
+#
+# Categorical features used to travel through the pipeline as strings: the
+# sampler drew and cached them, an encoder turned them into numbers for the
+# model, and feature_defs.py looked each one up in its own dict. A
+# CategoricalDictionary numbers the categories of each feature once, from
+# the real data, and is saved as JSON in the dataset's directory, next to
+# its cache. The sampler caches the codes and feeds them to the model as
+# they are; feature_defs.py is compiled against the same file (see
+# binning.py), so discretizing a code is a table lookup.
+#
+# `groups` merges raw categories before they are numbered (Adult3_1 treats
+# all government employers as one 'Government' category).
+#
+#   categories = load_or_build("experiments/Adult3/categories.json",
+#                              lambda: CategoricalDictionary.build({'workclass': df['workclass'].values}))
+#   codes = categories.encode('workclass', df['workclass'].values)
+
+import itertools
+import json
+import os
+
+import numpy as np
+
+UNKNOWN_CODE = -1
+
+class CategoricalDictionary:
+    """The ordered categories of each feature, and optional raw -> category groups."""
+
+    def __init__(self, categories, groups=None):
+        self.categories = {name: list(values) for name, values in categories.items()}
+        self.groups = {name: dict(mapping) for name, mapping in (groups or {}).items()}
+        self._codes = {}
+        for name, values in self.categories.items():
+            codes = {value: code for code, value in enumerate(values)}
+            # Grouped raw values get the code of their group.
+            codes.update({raw: codes[group] for raw, group in self.groups.get(name, {}).items() if group in codes})
+            self._codes[name] = codes
+
+    @classmethod
+    def build(cls, columns, groups=None):
+        """Numbers the distinct (grouped) values of each column in sorted order, as OrdinalEncoder does."""
+        groups = groups or {}
+        categories = {}
+        for name, values in columns.items():
+            mapping = groups.get(name, {})
+            categories[name] = sorted({mapping.get(value, value) for value in np.asarray(values, dtype=object).tolist()})
+        return cls(categories, groups)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def codes(self, name):
+        """Every code of a feature, in order."""
+        return np.arange(len(self.categories[name]), dtype=np.int64)
+
+    def encode(self, name, values):
+        """Codes of an array of raw values; values outside the dictionary get UNKNOWN_CODE."""
+        values = np.asarray(values, dtype=object).tolist()
+        codes = map(self._codes[name].get, values, itertools.repeat(UNKNOWN_CODE))
+        return np.fromiter(codes, dtype=np.int64, count=len(values))
+
+    def decode(self, name, codes):
+        """Categories of an array of codes (None for unknown codes)."""
+        table = np.array(self.categories[name] + [None], dtype=object)
+        codes = np.asarray(codes, dtype=np.int64)
+        return table[np.where((codes >= 0) & (codes < len(table) - 1), codes, len(table) - 1)]
+
+    def to_json(self):
+        return {name: {"categories": values, "groups": self.groups.get(name, {})}
+                for name, values in self.categories.items()}
+
+    def save(self, path):
+        temp_path = f"{path}.tmp.{os.getpid()}"
+        with open(temp_path, 'w') as f:
+            json.dump(self.to_json(), f, indent=1)
+            f.write("\n")
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls({name: entry["categories"] for name, entry in data.items()},
+                   {name: entry.get("groups", {}) for name, entry in data.items()})
+
+def load_or_build(path, build):
+    """Loads the dictionary at `path`, or builds it with build() and saves it there."""
+    if os.path.exists(path):
+        return CategoricalDictionary.load(path)
+    dictionary = build()
+    dictionary.save(path)
+    print(f"--- Saved categorical dictionary '{path}'. ---")
+    return dictionary
@@ -0,0 +1,380 @@
+# columnar_store.py -- append-only, memory-mapped columnar sample cache
+#
+# Layout of a store directory:
+#   header.json          feature names, label name and the list of segments
+#   seg_NNNNNN/<name>.npy one array per feature plus one for the label
+#   meta.pkl             objects written once (trained model, encoder)
+#
+# Segments are memory-mapped on load, so opening a store costs almost nothing
+# and only the rows asked for through `take` are turned into the samplers'
+# legacy {((name, value), ...): [(label_name, value)]} shape. The header is
+# rewritten atomically after a segment is complete, so it is the commit point.
+# Writers hold an exclusive lock on <store_dir>.lock, so several processes can
+# share one store; readers need no lock.
+#
+# Usage: python -m experiments.sampling.columnar_store compact <store_dir> [...]
+
+import contextlib
+import fcntl
+import json
+import os
+import pickle
+import shutil
+import struct
+import sys
+
+import numpy as np
+
+from experiments.sampling.segment_store import SegmentStore
+
+_HEADER_FILENAME = "header.json"
+_META_FILENAME = "meta.pkl"
+_LOCK_SUFFIX = ".lock"
+
+def _write_atomic(path, data, mode):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        if 'b' in mode:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+class KeyIndex:
+    """
+    Membership test for sample rows, given as legacy keys or as feature
+    columns. A row is packed into one fixed-width bytes value holding an
+    int64 code per feature, so the index keeps one small bytes object per row
+    instead of a tuple of Python values. Numbers are rounded to `digits[i]`
+    decimal places where that is not None, and otherwise kept bit-exact (as
+    floats, so 3 and 3.0 match as they do in a tuple). Other values, such as
+    categories, are coded in order of first appearance.
+    """
+
+    def __init__(self, rows=(), digits=None):
+        self.digits = None if digits is None else list(digits)
+        self._categories = {}   # feature position -> {value: code}
+        self._keys = set()
+        rows = list(rows)
+        if rows:
+            self.update_rows([list(column) for column in zip(*rows)])
+
+    def _scale(self, i):
+        digits = None if self.digits is None else self.digits[i]
+        return None if digits is None else 10.0 ** digits
+
+    def _code(self, i, value):
+        """The int64 code of one value of feature i; pack() gives the same for whole columns."""
+        if isinstance(value, (bool, int, float, np.number)):
+            value = float(value) + 0.0   # + 0.0 turns -0.0 into 0.0
+            scale = self._scale(i)
+            return struct.unpack('=q', struct.pack('=d', value))[0] if scale is None else round(value * scale)
+        table = self._categories.setdefault(i, {})
+        return table.setdefault(value, len(table))
+
+    def pack(self, columns):
+        """Returns the packed key of every row of the given feature columns, as a list."""
+        columns = [np.asarray(column) for column in columns]
+        codes = np.empty((len(columns[0]), len(columns)), dtype=np.int64)
+        for i, column in enumerate(columns):
+            scale = self._scale(i)
+            if column.dtype.kind in 'biuf':
+                values = column.astype(np.float64) + 0.0
+                codes[:, i] = values.view(np.int64) if scale is None else np.rint(values * scale)
+            else:
+                codes[:, i] = [self._code(i, value) for value in column.tolist()]
+        # Rows all have the same width, so the trailing NULs 'S' drops lose nothing.
+        return np.ascontiguousarray(codes).view(f'S{8 * len(columns)}').ravel().tolist()
+
+    def _pack_key(self, key):
+        codes = [self._code(i, value) for i, (_, value) in enumerate(key)]
+        return struct.pack(f'={len(codes)}q', *codes).rstrip(b'\0')
+
+    def __contains__(self, key):
+        return self._pack_key(key) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, keys):
+        self._keys.update(self._pack_key(key) for key in keys)
+
+    def update_rows(self, columns):
+        self._keys.update(self.pack(columns))
+
+    def contains_rows(self, columns):
+        """Boolean mask telling which rows of the given feature columns are indexed."""
+        return np.fromiter((key in self._keys for key in self.pack(columns)), dtype=bool, count=len(columns[0]))
+
+    def add_new(self, columns):
+        """
+        Indexes the rows of the given feature columns. Returns a mask of the
+        rows that were not indexed yet, first occurrences only.
+        """
+        new = np.zeros(len(columns[0]), dtype=bool)
+        for i, key in enumerate(self.pack(columns)):
+            if key not in self._keys:
+                self._keys.add(key)
+                new[i] = True
+        return new
+
+class ColumnarStore:
+    """A directory of memory-mapped feature/label columns, grown by appending segments."""
+
+    def __init__(self, root, feature_names, label_name, key_digits=None):
+        self.root = root
+        self.feature_names = list(feature_names)
+        self.label_name = label_name
+        # Decimal places each feature is rounded to when deduping ({name: digits}, missing: exact).
+        self.key_digits = dict(key_digits or {})
+        self._segments = None   # list of (rows, [feature arrays], label array)
+        self._lock_file = None
+        self._lock_depth = 0
+
+    # --- Header and segment bookkeeping ---
+    def _header_path(self):
+        return os.path.join(self.root, _HEADER_FILENAME)
+
+    def _read_header(self):
+        with open(self._header_path(), 'r') as f:
+            return json.load(f)
+
+    def _write_header(self, segment_names):
+        header = {
+            "features": self.feature_names,
+            "label": self.label_name,
+            "segments": segment_names,
+        }
+        _write_atomic(self._header_path(), header, 'w')
+
+    def _segment_names(self):
+        if not os.path.exists(self._header_path()):
+            return []
+        header = self._read_header()
+        if header["features"] != self.feature_names or header["label"] != self.label_name:
+            raise ValueError(f"Store '{self.root}' holds {header['features']} -> {header['label']}, "
+                             f"expected {self.feature_names} -> {self.label_name}")
+        return header["segments"]
+
+    def _column_path(self, segment_name, column):
+        return os.path.join(self.root, segment_name, f"{column}.npy")
+
+    def _open_segments(self):
+        if self._segments is None:
+            self._segments = []
+            for segment_name in self._segment_names():
+                features = [np.load(self._column_path(segment_name, name), mmap_mode='r')
+                            for name in self.feature_names]
+                labels = np.load(self._column_path(segment_name, self.label_name), mmap_mode='r')
+                self._segments.append((len(labels), features, labels))
+        return self._segments
+
+    def refresh(self):
+        """Forgets the opened segments, so segments appended by other processes are seen."""
+        self._segments = None
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Holds an exclusive inter-process lock on the store. Nested use within
+        one process is allowed; the lock is released by the outermost exit.
+        """
+        if self._lock_depth == 0:
+            parent = os.path.dirname(self.root)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._lock_file = open(self.root + _LOCK_SUFFIX, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield self
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._lock_file.close()
+                self._lock_file = None
+
+    def exists(self):
+        return os.path.exists(self._header_path()) or os.path.exists(os.path.join(self.root, _META_FILENAME))
+
+    def num_segments(self):
+        return len(self._segment_names())
+
+    def __len__(self):
+        return sum(rows for rows, _, _ in self._open_segments())
+
+    # --- Reading ---
+    def take(self, indices):
+        """Returns the rows at `indices` (global row numbers) in the legacy dict shape."""
+        indices = np.asarray(indices, dtype=np.int64)
+        segments = self._open_segments()
+        offsets = np.cumsum([0] + [rows for rows, _, _ in segments])
+        segment_of = np.searchsorted(offsets, indices, side='right') - 1
+
+        # Object columns, so segments of different dtypes can be gathered together.
+        columns = [np.empty(len(indices), dtype=object) for _ in range(len(self.feature_names) + 1)]
+        for s, (_, features, labels) in enumerate(segments):
+            positions = np.flatnonzero(segment_of == s)
+            if len(positions) == 0:
+                continue
+            local = indices[positions] - offsets[s]
+            for column, array in zip(columns, features + [labels]):
+                column[positions] = array[local].tolist()
+        columns = [column.tolist() for column in columns]
+
+        samples = {}
+        for row in zip(*columns):
+            samples[tuple(zip(self.feature_names, row[:-1]))] = [(self.label_name, row[-1])]
+        return samples
+
+    def sample(self, k, rng):
+        """
+        Returns min(k, len(self)) distinct rows in random order. Row numbers are
+        drawn without replacement by `rng.choice`, which uses Floyd's algorithm
+        when k is small next to the store, so only the chosen rows are touched.
+        """
+        num_rows = len(self)
+        return self.take(rng.choice(num_rows, size=min(k, num_rows), replace=False))
+
+    def load(self):
+        """Materializes the whole store in the legacy dict shape."""
+        return self.take(np.arange(len(self)))
+
+    def columns(self):
+        """Returns (feature columns, label column) of every row, as arrays concatenated across segments."""
+        segments = self._open_segments()
+        if not segments:
+            return [np.array([]) for _ in self.feature_names], np.array([])
+        features = [np.concatenate([segment[1][i] for segment in segments]) for i in range(len(self.feature_names))]
+        return features, np.concatenate([labels for _, _, labels in segments])
+
+    def key_index(self):
+        """Builds a KeyIndex over every cached row, for deduping new samples."""
+        index = KeyIndex(digits=[self.key_digits.get(name) for name in self.feature_names])
+        for _, features, _ in self._open_segments():
+            index.update_rows(features)
+        return index
+
+    # --- Writing ---
+    def append_columns(self, feature_columns, labels):
+        """Writes feature/label arrays as a new segment. Cost is proportional to the new rows."""
+        labels = np.asarray(labels)
+        if len(labels) == 0:
+            return None
+        with self.lock():
+            return self._append_locked(feature_columns, labels)
+
+    def _append_locked(self, feature_columns, labels):
+        os.makedirs(self.root, exist_ok=True)
+        segment_names = self._segment_names()
+        last = int(segment_names[-1].split('_')[1]) if segment_names else -1
+        segment_name = f"seg_{last + 1:06d}"
+
+        tmp_dir = os.path.join(self.root, segment_name + ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, column in zip(self.feature_names + [self.label_name], list(feature_columns) + [labels]):
+            column = np.asarray(column)
+            if column.dtype == object:
+                # Object arrays cannot be memory-mapped; categorical values are stored as strings.
+                column = column.astype(str)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), column)
+        os.replace(tmp_dir, os.path.join(self.root, segment_name))
+        self._write_header(segment_names + [segment_name])
+        self._segments = None
+        return segment_name
+
+    def append(self, samples):
+        """Writes a legacy-shaped sample dict as a new segment."""
+        if not samples:
+            return None
+        keys = list(samples.keys())
+        feature_columns = [[key[i][1] for key in keys] for i in range(len(self.feature_names))]
+        labels = [value[0][1] for value in samples.values()]
+        return self.append_columns(feature_columns, labels)
+
+    def load_meta(self):
+        path = os.path.join(self.root, _META_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save_meta(self, meta):
+        with self.lock():
+            os.makedirs(self.root, exist_ok=True)
+            _write_atomic(os.path.join(self.root, _META_FILENAME), meta, 'wb')
+
+    def compact(self):
+        """
+        Merges all segments into one. The merged segment is committed to the
+        header before the old segment directories are removed.
+        """
+        with self.lock():
+            self.refresh()
+            segment_names = self._segment_names()
+            if len(segment_names) <= 1:
+                return
+            segments = self._open_segments()
+            feature_columns = [np.concatenate([features[i] for _, features, _ in segments])
+                               for i in range(len(self.feature_names))]
+            labels = np.concatenate([labels for _, _, labels in segments])
+            merged_name = self.append_columns(feature_columns, labels)
+            self._write_header([merged_name])
+            for segment_name in segment_names:
+                shutil.rmtree(os.path.join(self.root, segment_name))
+
+    def import_legacy(self, legacy_path):
+        """
+        Converts an older cache into this store: either a single pickle file
+        or a directory of pickled segments (segment_store.SegmentStore). The
+        pickled segments are removed once their samples are written here.
+        """
+        if os.path.exists(os.path.join(legacy_path, _HEADER_FILENAME)):
+            legacy = ColumnarStore(legacy_path, self.feature_names, self.label_name)
+            self.save_meta(legacy.load_meta())
+            for _, features, labels in legacy._open_segments():
+                self.append_columns(features, labels)
+            return
+        if os.path.isdir(legacy_path):
+            legacy = SegmentStore(legacy_path)
+            self.save_meta(legacy.load_meta())
+            self.append(legacy.load())
+            for name in os.listdir(legacy_path):
+                if name.startswith("segment_") and name.endswith(".pkl"):
+                    os.remove(os.path.join(legacy_path, name))
+            return
+        with open(legacy_path, 'rb') as f:
+            legacy = pickle.load(f)
+        if isinstance(legacy, dict) and isinstance(legacy.get("samples"), dict):
+            self.save_meta({name: value for name, value in legacy.items() if name != "samples"})
+            self.append(legacy["samples"])
+        else:
+            self.append(legacy)
+
+    def adopt_legacy(self, legacy_paths):
+        """
+        If this store is empty, imports the first of `legacy_paths` that holds
+        a cache (see import_legacy) and returns it; otherwise returns None.
+        Caches from before stores were content-addressed live at fixed paths.
+        """
+        with self.lock():
+            if self.exists():
+                return None
+            for legacy_path in legacy_paths:
+                if os.path.isfile(legacy_path) or ColumnarStore(legacy_path, self.feature_names, self.label_name).exists() \
+                        or SegmentStore(legacy_path).num_segments() > 0:
+                    self.import_legacy(legacy_path)
+                    return legacy_path
+            return None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "compact":
+        print("Usage: python -m experiments.sampling.columnar_store compact <store_dir> [...]")
+        sys.exit(1)
+    for store_dir in sys.argv[2:]:
+        header = json.load(open(os.path.join(store_dir, _HEADER_FILENAME)))
+        store = ColumnarStore(store_dir, header["features"], header["label"])
+        before = store.num_segments()
+        store.compact()
+        print(f"--- Compacted '{store_dir}': {before} segment(s) -> {store.num_segments()}. ---")
@@ -0,0 +1,50 @@
+# exhaustive.py -- label every point of a finite input grid once, then serve samples from it
+#
+# For samplers whose domain is a finite grid (or is quantized onto one), it is
+# cheaper to enumerate the grid, label all of it in one batch and persist it
+# than to find its points one by one by rejection sampling. The grid is
+# recorded in the store's metadata, so later runs see the store is complete.
+
+import numpy as np
+
+def grid_axis(low, high, step):
+    """Returns low, low + step, ..., high, computed from integer step counts to avoid drift."""
+    count = int(round((high - low) / step)) + 1
+    return low + np.arange(count) * step
+
+def enumerate_grid(axes):
+    """Returns one column per axis, together covering the Cartesian product of the axes."""
+    mesh = np.meshgrid(*[np.asarray(axis) for axis in axes], indexing='ij')
+    return [values.ravel() for values in mesh]
+
+def grid_size(axes):
+    return int(np.prod([len(axis) for axis in axes]))
+
+def label_grid(store, axes, predict_batch):
+    """
+    Makes sure `store` (a ColumnarStore) holds every point of the grid spanned
+    by `axes`. Points that are not cached yet are labelled with a single
+    `predict_batch(columns)` call and appended as one segment, under the
+    store's lock. Returns the number of newly labelled points.
+    """
+    grid = [np.asarray(axis).tolist() for axis in axes]
+    with store.lock():
+        store.refresh()
+        meta = store.load_meta()
+        if meta.get("grid") == grid:
+            return 0
+        if "grid" in meta:
+            raise ValueError(f"Store '{store.root}' was labelled on a different grid; "
+                             f"use a separate cache directory for each grid.")
+
+        columns = enumerate_grid(axes)
+        missing = ~store.key_index().contains_rows(columns)
+        num_missing = int(missing.sum())
+        if num_missing:
+            print(f"--- Labelling {num_missing} of {len(missing)} grid points in a single batch... ---")
+            missing_columns = [column[missing] for column in columns]
+            store.append_columns(missing_columns, predict_batch(missing_columns))
+
+        meta["grid"] = grid
+        store.save_meta(meta)
+        return num_missing
@@ -0,0 +1,121 @@
+# memo.py -- memoized oracle predictions keyed by the quantized input row
+#
+# The same input rows reach an oracle again and again: rejection loops redraw
+# near a cached key, stratified and active runs revisit the same cells, and
+# every experiment on a dataset starts from the same seeds. MemoOracle wraps a
+# batch predictor and answers rows it has seen from memory, keyed by the row
+# packed as in KeyIndex (numbers rounded to the configured decimal places).
+# The in-memory table is an LRU bounded to `capacity` rows. An optional
+# SQLite file below it keeps answers across runs and processes; it must be
+# named after the oracle's contents (e.g. next to a content-addressed cache),
+# so a retrained model never sees another model's answers.
+#
+#   memo = MemoOracle(lambda columns: _predict_batch(model, columns), digits=[None, 4])
+#   labels = memo(columns)
+#   memo.stats()   # {'hits': ..., 'disk_hits': ..., 'misses': ..., ...}
+
+import os
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from experiments.sampling.columnar_store import KeyIndex
+
+DEFAULT_CAPACITY = 1000000
+# Rows per SQLite query; stays under SQLite's limit on bound parameters.
+_DISK_BATCH = 500
+
+class MemoOracle:
+    """
+    A batch predictor, predict_batch(columns) -> labels, with memoized
+    answers. `digits` gives the decimal places each feature is rounded to in
+    the memo key (None: exact). With `disk_path`, answers are also kept in a
+    SQLite file there; its keys must not depend on the process, so all
+    features must then be numeric.
+    """
+
+    def __init__(self, predict_batch, digits=None, capacity=DEFAULT_CAPACITY, disk_path=None):
+        self._predict_batch = predict_batch
+        self._packer = KeyIndex(digits=digits)
+        self.capacity = capacity
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._disk = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._disk is None:
+            parent = os.path.dirname(self.disk_path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._disk = sqlite3.connect(self.disk_path, timeout=60.0)
+            self._disk.execute("CREATE TABLE IF NOT EXISTS memo (key BLOB PRIMARY KEY, label)")
+        return self._disk
+
+    def _remember(self, key, label):
+        self._memory[key] = label
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def _disk_lookup(self, keys):
+        found = {}
+        disk = self._connect()
+        for start in range(0, len(keys), _DISK_BATCH):
+            chunk = keys[start:start + _DISK_BATCH]
+            query = f"SELECT key, label FROM memo WHERE key IN ({','.join('?' * len(chunk))})"
+            found.update(disk.execute(query, chunk).fetchall())
+        return found
+
+    def __call__(self, columns):
+        columns = [np.asarray(column) for column in columns]
+        if self.disk_path and any(column.dtype.kind not in 'biuf' for column in columns):
+            raise ValueError("MemoOracle's disk tier needs numeric features; categories are coded per process.")
+        keys = self._packer.pack(columns)
+        labels = [None] * len(keys)
+
+        # Answer from memory first, then from disk; the rest goes to the oracle.
+        pending = {}   # key -> rows waiting for it
+        for i, key in enumerate(keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                labels[i] = self._memory[key]
+                self.hits += 1
+            else:
+                pending.setdefault(key, []).append(i)
+        if pending and self.disk_path:
+            for key, label in self._disk_lookup(list(pending)).items():
+                for i in pending.pop(key):
+                    labels[i] = label
+                    self.disk_hits += 1
+                self._remember(key, label)
+
+        if pending:
+            first_rows = np.array([rows[0] for rows in pending.values()])
+            predicted = np.asarray(self._predict_batch([column[first_rows] for column in columns])).tolist()
+            for (key, rows), label in zip(pending.items(), predicted):
+                for i in rows:
+                    labels[i] = label
+                self._remember(key, label)
+            # Rows repeated within the batch were answered by the one prediction.
+            self.misses += len(pending)
+            self.hits += sum(len(rows) - 1 for rows in pending.values())
+            if self.disk_path:
+                with self._connect() as disk:
+                    disk.executemany("INSERT OR IGNORE INTO memo VALUES (?, ?)", zip(pending, predicted))
+        return np.asarray(labels)
+
+    def stats(self):
+        """Hit and miss counts so far, and the number of rows held in memory."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_rows": len(self._memory)}
+
+    def stats_line(self):
+        stats = self.stats()
+        return (f"{stats['hits']} hits, {stats['disk_hits']} disk hits, {stats['misses']} misses "
+                f"({100.0 * stats['hit_rate']:.1f}% hit rate)")
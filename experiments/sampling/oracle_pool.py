@@ -0,0 +1,147 @@
+# oracle_pool.py -- load each TensorFlow oracle once per process (or once per machine)
+#
+# get_oracle(model_path) returns a warm oracle with a batched predict(inputs),
+# where inputs is the dict of {feature_name: array} the Keras models take.
+# Oracles are keyed by model path and a fingerprint of the model files, so a
+# retrained model is picked up without restarting the process.
+#
+# Optional server mode: one process loads the models and serves predictions on
+# a Unix socket, so parallel experiment processes share a single copy. Start it
+# with
+#     python -m experiments.sampling.oracle_pool serve /tmp/sampler_oracle.sock
+# and point the samplers at it with SAMPLER_ORACLE_SOCKET=/tmp/sampler_oracle.sock.
+
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+SOCKET_ENV_VAR = "SAMPLER_ORACLE_SOCKET"
+_AUTHKEY = b"sampler-oracle-pool"
+
+_oracles = {}
+_remote_oracles = {}
+_lock = threading.Lock()
+
+def fingerprint(model_path):
+    """Hashes the relative paths, sizes and modification times of the model's files."""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, model_path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+class Oracle:
+    """A lazily loaded Keras model with a batched predict."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            import tensorflow as tf
+            start = time.time()
+            self._model = tf.keras.models.load_model(self.model_path)
+            print(f"--- Loaded oracle '{self.model_path}' in {time.time() - start:.2f}s. ---")
+        return self._model
+
+    def predict(self, inputs):
+        inputs = {name: np.asarray(values) for name, values in inputs.items()}
+        return np.asarray(self._load().predict(inputs, verbose=0))
+
+class RemoteOracle:
+    """Forwards predict calls to an oracle server over a Unix socket."""
+
+    def __init__(self, address, model_path):
+        self.address = address
+        self.model_path = model_path
+        self._conn = None
+
+    def predict(self, inputs):
+        if self._conn is None:
+            self._conn = Client(self.address, family='AF_UNIX', authkey=_AUTHKEY)
+        self._conn.send(("predict", self.model_path, {name: np.asarray(v) for name, v in inputs.items()}))
+        status, result = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Oracle server failed on '{self.model_path}': {result}")
+        return result
+
+def get_oracle(model_path):
+    """
+    Returns the shared oracle for model_path. If SAMPLER_ORACLE_SOCKET names a
+    live server socket, predictions are served by that process instead.
+    """
+    address = os.environ.get(SOCKET_ENV_VAR)
+    if address and os.path.exists(address):
+        with _lock:
+            if model_path not in _remote_oracles:
+                _remote_oracles[model_path] = RemoteOracle(address, model_path)
+            return _remote_oracles[model_path]
+
+    key = (os.path.abspath(model_path), fingerprint(model_path))
+    with _lock:
+        if key not in _oracles:
+            # Drop oracles loaded from an older version of the same model.
+            for stale in [k for k in _oracles if k[0] == key[0]]:
+                del _oracles[stale]
+            _oracles[key] = Oracle(model_path)
+        return _oracles[key]
+
+# --- Server mode ---
+def _handle_client(conn):
+    with conn:
+        while True:
+            try:
+                command, model_path, inputs = conn.recv()
+            except EOFError:
+                return
+            try:
+                if command != "predict":
+                    raise ValueError(f"Unknown command '{command}'")
+                conn.send(("ok", get_oracle(model_path).predict(inputs)))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+
+def serve(address):
+    """Serves predictions on a Unix socket until interrupted. Each client gets a thread."""
+    # The server itself must load models locally.
+    os.environ.pop(SOCKET_ENV_VAR, None)
+    if os.path.exists(address):
+        os.remove(address)
+    with Listener(address, family='AF_UNIX', authkey=_AUTHKEY) as listener:
+        print(f"--- Oracle server listening on '{address}'. ---")
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_handle_client, args=(conn,), daemon=True).start()
+
+def start_server(address, timeout=60.0):
+    """
+    Starts an oracle server subprocess on `address` (unless one is already
+    listening) and sets SAMPLER_ORACLE_SOCKET so this process and its children
+    use it. Returns the Popen handle, or None if a server was already running.
+    """
+    process = None
+    if not os.path.exists(address):
+        process = subprocess.Popen([sys.executable, "-m", "experiments.sampling.oracle_pool", "serve", address])
+        deadline = time.time() + timeout
+        while not os.path.exists(address):
+            if process.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"Oracle server did not come up on '{address}'.")
+            time.sleep(0.05)
+    os.environ[SOCKET_ENV_VAR] = address
+    return process
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "serve":
+        print("Usage: python -m experiments.sampling.oracle_pool serve <socket_path>")
+        sys.exit(1)
+    serve(sys.argv[2])
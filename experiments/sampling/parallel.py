@@ -0,0 +1,61 @@
+# parallel.py -- process-parallel synthetic sampling with reproducible RNG streams
+#
+# The requested count is split into one shard per worker. Each shard draws from
+# its own counter-based Philox stream, keyed by the seed and jumped by the
+# shard's stream number, so shards never overlap and do not depend on which
+# process runs them or when. Results are merged in stream order and deduped
+# keeping the first occurrence, so the output is bit-identical for a given
+# seed and worker count.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from experiments.sampling.columnar_store import KeyIndex
+
+def worker_rng(seed, stream):
+    """Returns the Generator for one stream: Philox keyed by seed, jumped `stream` times."""
+    return np.random.Generator(np.random.Philox(key=seed).jumped(stream))
+
+def shard_counts(total, workers):
+    return [total // workers + (1 if w < total % workers else 0) for w in range(workers)]
+
+def generate_parallel(shard_fn, num_needed, seed, workers, existing=None, top_up=True):
+    """
+    Generates up to `num_needed` unique labelled rows with a pool of `workers`
+    processes. `shard_fn(count, seed, stream)` must be a module-level function
+    returning (feature columns, labels) for `count` rows drawn from
+    worker_rng(seed, stream). Rows whose features are in `existing` (a
+    KeyIndex) are dropped. With `top_up`, further rounds on fresh streams
+    replace dropped duplicates until `num_needed` rows are found.
+    Returns (feature columns, labels).
+    """
+    merged_columns, merged_labels = None, None
+    seen = KeyIndex(digits=None if existing is None else existing.digits)
+    stream = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            num_found = 0 if merged_labels is None else len(merged_labels)
+            counts = [c for c in shard_counts(num_needed - num_found, workers) if c > 0]
+            streams = list(range(stream, stream + len(counts)))
+            stream += len(counts)
+            results = list(pool.map(shard_fn, counts, [seed] * len(counts), streams))
+
+            columns = [np.concatenate([np.asarray(r[0][i]) for r in results]) for i in range(len(results[0][0]))]
+            labels = np.concatenate([np.asarray(r[1]) for r in results])
+
+            # Keep the first occurrence of every row not already cached.
+            keep = seen.add_new(columns)
+            if existing is not None:
+                keep &= ~existing.contains_rows(columns)
+
+            columns = [column[keep] for column in columns]
+            labels = labels[keep]
+            if merged_labels is None:
+                merged_columns, merged_labels = columns, labels
+            else:
+                merged_columns = [np.concatenate(pair) for pair in zip(merged_columns, columns)]
+                merged_labels = np.concatenate([merged_labels, labels])
+
+            if not top_up or len(merged_labels) >= num_needed:
+                return merged_columns, merged_labels
@@ -0,0 +1,137 @@
+# program_codegen.py -- rewrite synthesized program_ms_*.py files into a form that is cheap to call
+#
+# The synthesizer writes every program as one execute(inputs) that, on each
+# call, fills the program_nodes and program_edges dicts, calls
+# retrieve_feature_defs(), builds the (name, value) argument list once per
+# feature and evaluates every feature the diagram tests (some twice) before
+# walking it. Scoring a program over a holdout set pays all of that per row.
+#
+# The rewritten program builds its tables and looks up its feature functions
+# once, at import; a call builds the argument list once and evaluates only
+# the features tested on the path it takes:
+#
+#   _FEATURES = feature_defs.retrieve_feature_defs()
+#   # Node -> (definition of the feature it tests, next node or output by bin).
+#   _NODES = {
+#   	"0": (_FEATURES["age"], {0: "1", 1: "income_0", 2: "income_1", 3: "2"}),
+#   	...}
+#
+# execute(inputs) returns the same output for every input. The synthesizer
+# itself is not part of this repository, so its files are rewritten
+# afterwards: load_program() (see active.py) rewrites in memory, and the
+# command line rewrites files in place. Rewritten files are left as they are.
+#
+# Usage: python -m experiments.sampling.program_codegen experiments/Iris/previous_runs [path.py ...] [--check]
+
+import argparse
+import ast
+import glob
+import json
+import os
+import sys
+
+HEADER = "# Rewritten by experiments/sampling/program_codegen.py: tables are built at import, features evaluated on the path taken."
+
+class SynthesizedProgram:
+    """The diagram of a synthesized program: its nodes, edges, root and feature argument list."""
+
+    def __init__(self, feature_defs_dir, nodes, edges, root, arguments):
+        self.feature_defs_dir = feature_defs_dir
+        self.nodes = nodes
+        self.edges = edges
+        self.root = root
+        self.arguments = arguments
+
+def _literal(node):
+    return ast.literal_eval(node)
+
+def parse_program(source):
+    """
+    Reads the diagram out of a program in the synthesizer's format; raises
+    ValueError for anything else (including programs already rewritten).
+    """
+    tree = ast.parse(source)
+    feature_defs_dir, nodes, edges, root, arguments = None, {}, {}, None, None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and ast.unparse(node.func) == "sys.path.insert" and len(node.args) == 2:
+            feature_defs_dir = _literal(node.args[1])
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+            continue
+        target = node.targets[0]
+        if isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name):
+            if target.value.id == "program_nodes":
+                nodes[_literal(target.slice)] = _literal(node.value)
+            elif target.value.id == "program_edges":
+                edges[_literal(target.slice)] = _literal(node.value)
+            elif target.value.id == "value_map" and arguments is None:
+                # features["x"]([("a",inputs[0]),("b",inputs[1]),...]): the same list for every feature.
+                arguments = [(_literal(element.elts[0]), _literal(element.elts[1].slice)) for element in node.value.args[0].elts]
+        elif isinstance(target, ast.Name) and target.id == "current_node" and root is None:
+            root = _literal(node.value)
+    if feature_defs_dir is None or root is None or arguments is None or not nodes:
+        raise ValueError("Not a program in the synthesizer's format.")
+    return SynthesizedProgram(feature_defs_dir, nodes, edges, root, arguments)
+
+def render_program(program):
+    """Source of the rewritten program."""
+    out = [HEADER,
+           "",
+           "import sys",
+           f"sys.path.insert(0,{json.dumps(program.feature_defs_dir)})",
+           "import feature_defs",
+           "",
+           "_FEATURES = feature_defs.retrieve_feature_defs()",
+           "",
+           "# Node -> (definition of the feature it tests, next node or output by bin).",
+           "_NODES = {"]
+    for name, feature in program.nodes.items():
+        edges = sorted((value, target) for (source, value), target in program.edges.items() if source == name)
+        edges = "{" + ", ".join(f"{value!r}: {json.dumps(target)}" for value, target in edges) + "}"
+        out.append(f"\t{json.dumps(name)}: (_FEATURES[{json.dumps(feature)}], {edges}),")
+    out += ["}",
+            "",
+            "def execute(inputs):",
+            "\targuments = [" + ", ".join(f"({json.dumps(name)}, inputs[{index}])" for name, index in program.arguments) + "]",
+            f"\tcurrent_node = {json.dumps(program.root)}",
+            "\twhile current_node in _NODES:",
+            "\t\tdefinition, edges = _NODES[current_node]",
+            "\t\tcurrent_node = edges[definition(arguments)]",
+            "\treturn current_node",
+            ""]
+    return "\n".join(out)
+
+def is_rewritten(source):
+    return source.startswith(HEADER)
+
+def rewrite(source):
+    """The rewritten source of a synthesized program; rewritten programs are returned unchanged."""
+    return source if is_rewritten(source) else render_program(parse_program(source))
+
+def program_paths(paths):
+    """Program files named by `paths`, each a program_ms_*.py file or a directory searched recursively."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(glob.glob(os.path.join(path, "**", "program_ms_*.py"), recursive=True))
+        else:
+            found.append(path)
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrites synthesized programs so their tables are built once, at import.")
+    parser.add_argument("paths", nargs="+", help="program_ms_*.py files, or directories such as experiments/Iris/previous_runs")
+    parser.add_argument("--check", action="store_true", help="only report programs not yet rewritten; exit 1 if any")
+    args = parser.parse_args()
+
+    pending = []
+    for path in program_paths(args.paths):
+        with open(path, 'r') as f:
+            source = f.read()
+        if is_rewritten(source):
+            continue
+        pending.append(path)
+        if not args.check:
+            with open(path, 'w') as f:
+                f.write(rewrite(source))
+        print(f"--- {'Not rewritten' if args.check else 'Rewrote'}: '{path}'. ---")
+    sys.exit(1 if args.check and pending else 0)
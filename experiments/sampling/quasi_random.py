@@ -0,0 +1,56 @@
+# quasi_random.py -- scrambled Sobol draws over a sampler's input box
+#
+# Independent uniform draws leave clumps and gaps in the input box, so the
+# fraction of samples per feature_defs cell converges slowly. A scrambled Sobol
+# sequence fills the box evenly while staying uniformly distributed. A cache
+# filled this way holds a prefix of one fixed sequence; the number of points
+# drawn so far is kept in the store's metadata, so later runs continue the
+# sequence instead of repeating it.
+
+import warnings
+
+import numpy as np
+
+_META_KEY = "sobol_drawn"
+
+class SobolDraw:
+    """
+    A draw_batch(n) callable returning the next n points of a scrambled Sobol
+    sequence, scaled to [low, high] per dimension. Dimensions flagged in
+    `integer` take the integers low..high inclusive, as random.randint does.
+    """
+
+    def __init__(self, lows, highs, integer=None, seed=0, skip=0):
+        from scipy.stats import qmc
+        self.lows = np.asarray(lows, dtype=float)
+        self.highs = np.asarray(highs, dtype=float)
+        self.integer = np.zeros(len(self.lows), dtype=bool) if integer is None else np.asarray(integer, dtype=bool)
+        self._engine = qmc.Sobol(d=len(self.lows), scramble=True, seed=seed)
+        if skip:
+            self._engine.fast_forward(skip)
+        self.drawn = skip
+
+    def __call__(self, n):
+        with warnings.catch_warnings():
+            # Balance is best for powers of two, but any prefix is still low-discrepancy.
+            warnings.simplefilter("ignore", UserWarning)
+            points = self._engine.random(n)
+        self.drawn += n
+        columns = []
+        for d in range(len(self.lows)):
+            if self.integer[d]:
+                span = self.highs[d] - self.lows[d] + 1
+                columns.append((self.lows[d] + np.floor(points[:, d] * span)).astype(np.int64))
+            else:
+                columns.append(self.lows[d] + points[:, d] * (self.highs[d] - self.lows[d]))
+        return columns
+
+def resume_draw(store, lows, highs, integer=None, seed=0):
+    """Returns a SobolDraw continuing after the points already drawn into `store`."""
+    return SobolDraw(lows, highs, integer, seed, skip=store.load_meta().get(_META_KEY, 0))
+
+def save_position(store, draw):
+    """Records in the store's metadata how far `draw` has got through the sequence."""
+    meta = store.load_meta()
+    meta[_META_KEY] = draw.drawn
+    store.save_meta(meta)
@@ -0,0 +1,115 @@
+# segment_store.py -- append-only sample cache made of pickled segment files
+#
+# A store is a directory holding `segment_NNNNNN.pkl` files, each a dict of
+# samples in the usual {key: [(label_name, value)]} shape, plus an optional
+# `meta.pkl` for objects that are written once (trained model, encoder).
+# Growing the cache writes only the new samples as a fresh segment; loading
+# merges the segments in order. `compact` merges everything into one segment.
+#
+# Usage: python -m experiments.sampling.segment_store compact <store_dir> [...]
+
+import os
+import pickle
+import sys
+
+_SEGMENT_PREFIX = "segment_"
+_SEGMENT_SUFFIX = ".pkl"
+_META_FILENAME = "meta.pkl"
+
+def _write_atomic(path, obj):
+    """Pickles obj next to path and renames it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+class SegmentStore:
+    """An append-only, directory-backed sample cache."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _segment_indices(self):
+        if not os.path.isdir(self.root):
+            return []
+        indices = []
+        for name in os.listdir(self.root):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                indices.append(int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]))
+        return sorted(indices)
+
+    def _segment_path(self, index):
+        return os.path.join(self.root, f"{_SEGMENT_PREFIX}{index:06d}{_SEGMENT_SUFFIX}")
+
+    def exists(self):
+        """True if the store holds any segment or metadata."""
+        return bool(self._segment_indices()) or os.path.exists(os.path.join(self.root, _META_FILENAME))
+
+    def num_segments(self):
+        return len(self._segment_indices())
+
+    def load(self):
+        """Returns all samples, merged from the segments in write order."""
+        samples = {}
+        for index in self._segment_indices():
+            with open(self._segment_path(index), 'rb') as f:
+                samples.update(pickle.load(f))
+        return samples
+
+    def append(self, samples):
+        """Writes samples as a new segment. Cost is proportional to len(samples)."""
+        if not samples:
+            return None
+        os.makedirs(self.root, exist_ok=True)
+        indices = self._segment_indices()
+        path = self._segment_path(indices[-1] + 1 if indices else 0)
+        _write_atomic(path, dict(samples))
+        return path
+
+    def load_meta(self):
+        path = os.path.join(self.root, _META_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def save_meta(self, meta):
+        os.makedirs(self.root, exist_ok=True)
+        _write_atomic(os.path.join(self.root, _META_FILENAME), meta)
+
+    def compact(self):
+        """
+        Merges all segments into one. The merged segment is written before the
+        old ones are removed, so an interrupted compaction loses nothing.
+        """
+        indices = self._segment_indices()
+        if len(indices) <= 1:
+            return
+        merged = self.load()
+        _write_atomic(self._segment_path(indices[-1] + 1), merged)
+        for index in indices:
+            os.remove(self._segment_path(index))
+
+    def import_legacy(self, pickle_path):
+        """
+        Converts a single-pickle cache into this store. Sampler caches that
+        bundle {"samples": ..., "model": ..., ...} have their other entries
+        moved to the metadata file.
+        """
+        with open(pickle_path, 'rb') as f:
+            legacy = pickle.load(f)
+        if isinstance(legacy, dict) and isinstance(legacy.get("samples"), dict):
+            self.save_meta({name: value for name, value in legacy.items() if name != "samples"})
+            self.append(legacy["samples"])
+        else:
+            self.append(legacy)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "compact":
+        print("Usage: python -m experiments.sampling.segment_store compact <store_dir> [...]")
+        sys.exit(1)
+    for store_dir in sys.argv[2:]:
+        store = SegmentStore(store_dir)
+        before = store.num_segments()
+        store.compact()
+        print(f"--- Compacted '{store_dir}': {before} segment(s) -> {store.num_segments()}. ---")
@@ -0,0 +1,46 @@
+# snapshot.py -- typed binary snapshots of CSV sample sources
+#
+# A CSV that a sampler serves samples from is converted once into a
+# ColumnarStore (one .npy per column). The snapshot is reused for as long as
+# the CSV's size and modification time are unchanged, and rebuilt otherwise
+# under the snapshot's lock, so concurrent runs convert it only once.
+
+import os
+import shutil
+
+from experiments.sampling.columnar_store import ColumnarStore
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def load_csv_snapshot(csv_path, snapshot_dir, feature_names, label_name, dtypes=None):
+    """
+    Returns a ColumnarStore holding the CSV's feature and label columns,
+    rebuilding it if the CSV changed since the snapshot was taken. `dtypes`
+    maps column names to the types they are cast to. Rows with repeated
+    feature values keep the last label, as building a dict from them would.
+    """
+    source = file_fingerprint(csv_path)
+    store = ColumnarStore(snapshot_dir, feature_names, label_name)
+    if store.exists() and store.load_meta().get("source") == source:
+        return store
+
+    import pandas as pd
+    with store.lock():
+        # Another process may have rebuilt it while we waited for the lock.
+        if store.exists() and store.load_meta().get("source") == source:
+            return store
+        print(f"--- Converting '{csv_path}' into binary snapshot '{snapshot_dir}'. ---")
+        df = pd.read_csv(csv_path, skipinitialspace=True)
+        df.columns = [name.strip() for name in df.columns]
+        if dtypes:
+            df = df.astype(dtypes)
+        df = df.drop_duplicates(subset=feature_names, keep='last')
+
+        if os.path.exists(snapshot_dir):
+            shutil.rmtree(snapshot_dir)
+        store.refresh()
+        store.append_columns([df[name].values for name in feature_names], df[label_name].values)
+        store.save_meta({"source": source})
+    return store
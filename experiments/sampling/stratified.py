@@ -0,0 +1,73 @@
+# stratified.py -- per-cell sampling over the bins defined in feature_defs.py
+#
+# The synthesizer only sees samples through their bin indices, so every cell of
+# the product of the feature bins matters, however small it is in the raw
+# domain. Drawing a fixed number of samples inside every cell covers all of
+# them with (number of cells x samples per cell) oracle queries, where uniform
+# draws over the raw ranges need far more before the small cells are hit.
+
+import numpy as np
+
+def continuous_cells(low, high, boundaries):
+    """
+    Splits [low, high] at the bin boundaries that fall inside it. Returns the
+    (lo, hi) interval of every bin that overlaps the range.
+    """
+    cuts = [b for b in sorted(boundaries or []) if low < b < high]
+    edges = [low] + cuts + [high]
+    return list(zip(edges[:-1], edges[1:]))
+
+def discrete_cells(values, boundaries=None):
+    """
+    Groups a finite set of values into bins: by the thresholds in `boundaries`
+    if given (values must be numeric), else one bin per value. Returns one
+    array of values per non-empty bin.
+    """
+    values = np.asarray(values)
+    if boundaries is None:
+        return [values[i:i + 1] for i in range(len(values))]
+    bins = np.searchsorted(np.asarray(boundaries), values, side='right')
+    return [values[bins == b] for b in np.unique(bins)]
+
+def num_cells(axes_cells):
+    return int(np.prod([len(cells) for cells in axes_cells]))
+
+def draw_in_cells(axes_cells, counts, rng):
+    """
+    Draws counts[c] rows inside cell c of the product of the given per-feature
+    cells, cells being numbered in row-major order over the features. A cell
+    is either an (lo, hi) interval, drawn from uniformly, or an array of
+    values, drawn from with replacement. Returns one column per feature, rows
+    grouped by cell.
+    """
+    shape = [len(cells) for cells in axes_cells]
+    cell_of_row = np.unravel_index(np.repeat(np.arange(len(counts)), counts), shape)
+    columns = []
+    for cells, cell_index in zip(axes_cells, cell_of_row):
+        column = None
+        for c, cell in enumerate(cells):
+            rows = np.flatnonzero(cell_index == c)
+            if isinstance(cell, tuple):
+                draws = rng.uniform(cell[0], cell[1], size=len(rows))
+            else:
+                draws = rng.choice(cell, size=len(rows))
+            if column is None:
+                # Strings go into an object column, so longer values of later cells are not cut.
+                column = np.empty(len(cell_index), dtype=object if draws.dtype.kind in 'USO' else draws.dtype)
+            column[rows] = draws
+        columns.append(column)
+    return columns
+
+def draw_per_cell(axes_cells, per_cell, rng):
+    """Draws `per_cell` rows inside every cell of the product of the given per-feature cells."""
+    return draw_in_cells(axes_cells, np.full(num_cells(axes_cells), per_cell), rng)
+
+def cell_representatives(axes_cells):
+    """One row per cell (interval midpoints, first values), as columns in cell order."""
+    shape = [len(cells) for cells in axes_cells]
+    indices = np.unravel_index(np.arange(num_cells(axes_cells)), shape)
+    columns = []
+    for cells, cell_index in zip(axes_cells, indices):
+        points = [(cell[0] + cell[1]) / 2.0 if isinstance(cell, tuple) else np.asarray(cell).tolist()[0] for cell in cells]
+        columns.append([points[c] for c in cell_index])
+    return columns
@@ -0,0 +1,115 @@
+# streaming.py -- chunked, optionally prefetched delivery of samples
+#
+# uniform() hands back every requested sample at once, so whoever consumes
+# them waits for all generation and labelling first. The helpers here yield
+# the same samples as a sequence of legacy-shaped dicts instead. With
+# prefetching, the next chunk is produced on a background thread while the
+# consumer works on the current one. The queue between them holds one chunk,
+# so at most three chunks are in memory at a time.
+
+import queue
+import threading
+
+import numpy as np
+
+from experiments.sampling.batch import DEFAULT_CHUNK_SIZE
+
+# Rough in-memory size of one legacy sample: the key tuple, the label list and
+# its tuple, plus one (name, value) pair and boxed value per feature.
+_SAMPLE_OVERHEAD_BYTES = 300
+_FEATURE_BYTES = 170
+_CHUNKS_IN_FLIGHT = 3
+_DONE = object()
+
+def estimated_sample_bytes(num_features):
+    return _SAMPLE_OVERHEAD_BYTES + _FEATURE_BYTES * num_features
+
+def resolve_chunk_size(chunk_size, memory_budget, num_features):
+    """Returns the chunk size to use, shrunk so the chunks in flight fit `memory_budget` bytes."""
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if memory_budget is not None:
+        per_chunk = memory_budget // (_CHUNKS_IN_FLIGHT * estimated_sample_bytes(num_features))
+        chunk_size = max(1, min(chunk_size, per_chunk))
+    return chunk_size
+
+def iter_chunks(produce, num_of_samples, chunk_size, prefetch=True):
+    """
+    Yields produce(start, count) for consecutive ranges covering
+    num_of_samples, stopping early at an empty chunk. With `prefetch`, the
+    chunks are produced on a background thread, one chunk ahead of the
+    consumer; errors raised there are re-raised in the consumer.
+    """
+    ranges = [(start, min(chunk_size, num_of_samples - start)) for start in range(0, num_of_samples, chunk_size)]
+    if not prefetch:
+        for start, count in ranges:
+            chunk = produce(start, count)
+            if not chunk:
+                return
+            yield chunk
+        return
+
+    chunks = queue.Queue(maxsize=1)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for start, count in ranges:
+                chunk = produce(start, count)
+                if not chunk or not put(chunk):
+                    break
+            put(_DONE)
+        except BaseException as error:
+            put(error)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Also reached when the consumer stops early; wait so no write is cut short.
+        stop.set()
+        thread.join()
+
+def stream_store(store, num_of_samples, rng, extend=None, chunk_size=None, prefetch=True, memory_budget=None):
+    """
+    Yields, in chunks, samples from `store` (a ColumnarStore) as uniform()
+    would return them: min(num_of_samples, cache size) distinct rows drawn
+    with `rng`. If the cache is too small, all cached rows come first and
+    the rest are made by extend(total), which must grow the store to at
+    least `total` rows, one chunk at a time. Iteration ends early if
+    extend cannot reach the requested total.
+    """
+    num_cached = len(store)
+    if num_cached >= num_of_samples:
+        order = rng.choice(num_cached, size=num_of_samples, replace=False)
+    else:
+        order = rng.permutation(num_cached)
+
+    def produce(start, count):
+        end = start + count
+        indices = [order[start:end]]
+        if end > num_cached:
+            if extend is not None:
+                extend(end)
+            store.refresh()
+            first_new = max(start, num_cached)
+            indices.append(np.arange(first_new, min(end, len(store))))
+        return store.take(np.concatenate(indices))
+
+    chunk_size = resolve_chunk_size(chunk_size, memory_budget, len(store.feature_names))
+    return iter_chunks(produce, num_of_samples, chunk_size, prefetch)
@@ -1,43 +1,66 @@
-# inputs: [longitude, latitude, population, median_income]
-# features: population, median_income, location
-# output: [median_house_price]
-# labels: median_house_price
+# feature_defs.py -- generated from bins.json by experiments/sampling/binning.py; edit that file and rerun it.
 
-def check_num_of_inputs(inputs):
-    return len(inputs)==2
+import numpy as np
 
+# --- Lookup Tables ---
+_F1_BOUNDARIES = np.array([0.25, 0.5, 0.75], dtype=float)
+_F10_BOUNDARIES = np.array([2.0, 3.0], dtype=float)
+
+# --- Scalar Definitions ---
 def F1(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[0][1]
-    if value< 0.25:
-        return 0
-    elif value < 0.50:
-        return 1
-    elif value < 0.75:
-        return 2
-    else:
-        return 3
+	"""Discretizes F1 into 4 bins."""
+	value = inputs[0][1]
+	if value < 0.25:
+		return 0
+	if value < 0.5:
+		return 1
+	if value < 0.75:
+		return 2
+	return 3
 
 def F10(inputs):
-    assert(check_num_of_inputs(inputs))
-    value = inputs[1][1] 
-    if value<2.0:
-        return 0
-    elif value <3.0:
-        return 1
-    else:
-        return 2
-
+	"""Discretizes F10 into 3 bins."""
+	value = inputs[1][1]
+	if value < 2.0:
+		return 0
+	if value < 3.0:
+		return 1
+	return 2
 
 def H1(outputs):
-    value = outputs[0][1]   
-    return value
-
+	"""Returns the H1 value, one bin per value."""
+	value = outputs[0][1]
+	return value
 
 def retrieve_feature_defs():
-    feature_defs = {}
-    feature_defs["F1"] = F1
-    feature_defs["F10"] = F10
-    feature_defs["H1"] = H1
+	"""Returns a dictionary mapping all names to their definition functions."""
+	feature_defs = {}
+	feature_defs["F1"] = F1
+	feature_defs["F10"] = F10
+	feature_defs["H1"] = H1
+	return feature_defs
+
+def retrieve_bin_boundaries():
+	"""Returns the thresholds at which each feature above changes bin (None: one bin per value)."""
+	bin_boundaries = {}
+	bin_boundaries["F1"] = [0.25, 0.5, 0.75]
+	bin_boundaries["F10"] = [2.0, 3.0]
+	return bin_boundaries
+
+# --- Batch Definitions ---
+def _F1_batch(values):
+	return np.searchsorted(_F1_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _F10_batch(values):
+	return np.searchsorted(_F10_BOUNDARIES, np.asarray(values, dtype=float), side='right')
+
+def _H1_batch(values):
+	return np.asarray(values)
 
-    return feature_defs
\ No newline at end of file
+def retrieve_batch_feature_defs():
+	"""Returns each function above as a function of a value array, giving the array of its results."""
+	batch_defs = {}
+	batch_defs["F1"] = _F1_batch
+	batch_defs["F10"] = _F10_batch
+	batch_defs["H1"] = _H1_batch
+	return batch_defs
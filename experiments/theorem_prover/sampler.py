@@ -1,105 +1,214 @@
 # sampler.py for theorem_prover with On-Disk Caching (Corrected)
 
 import os
-import pickle
 import random
 import math
 import numpy as np
-import pandas as pd
-import tensorflow as tf
+from experiments.sampling.batch import samples_from_columns
+from experiments.sampling.stratified import continuous_cells, discrete_cells, draw_per_cell
+from experiments.sampling.cache_key import cache_dir
+from experiments.sampling.columnar_store import ColumnarStore
+from experiments.sampling.streaming import stream_store
+from experiments.sampling.oracle_pool import get_oracle
+from experiments.sampling.memo import MemoOracle
+from experiments.sampling.active import active_sample, latest_program, load_program
+from experiments.sampling.exhaustive import label_grid
+
+from experiments.theorem_prover import feature_defs
 
 # --- Module-level Configuration ---
 _MODEL_PATH = "experiments/theorem_prover/model"
-_CACHE_FILENAME = "experiments/theorem_prover/sampler_cache_theorem_prover.pkl"
+_PREVIOUS_RUNS_DIR = "experiments/theorem_prover/previous_runs"
+_LEGACY_CACHE_FILENAME = "experiments/theorem_prover/sampler_cache_theorem_prover.pkl"
+_LEGACY_CACHE_DIR = "experiments/theorem_prover/sampler_cache_theorem_prover"
+_feature_names = ['F1', 'F10']
+# Keyed by the oracle/data contents and the generation domain, so runs with the
+# same inputs share one cache and any change starts a fresh one.
+_CACHE_DIR = cache_dir(_LEGACY_CACHE_DIR, [_MODEL_PATH], {'features': _feature_names, 'F1': (10, 100, 100.0), 'F10': (10, 50, 10.0)})
+_store = ColumnarStore(_CACHE_DIR, _feature_names, 'H1')
+# Oracle answers are memoized on the rows grid values, which are exact. With _ORACLE_MEMO_ON_DISK
+# set, they are also kept in a SQLite file next to the cache for later runs.
+_ORACLE_MEMO_ON_DISK = False
+_oracle_memo = None
+# F1 is drawn from randint(10, 100) / 100 and F10 from randint(10, 50) / 10, so the
+# whole domain is a 91 x 41 grid. With _EXHAUSTIVE set, the grid is labelled once
+# in a single batch instead of being discovered by rejection sampling.
+_EXHAUSTIVE = True
+_grid_axes = [np.arange(10, 101) / 100.0, np.arange(10, 51) / 10.0]
 
-_cached_samples = {}
+_key_index = None
+_rng = np.random.default_rng()
 _is_cache_loaded = False
 
 def _load_or_initialize_cache():
     """
-    Loads samples from the cache file if it exists. Otherwise, it creates
-    an empty cache and saves it.
+    Loads samples from the segmented cache if it exists. Otherwise, it starts
+    with an empty cache; segments are only written once samples are generated.
     """
-    global _cached_samples, _is_cache_loaded
-    if os.path.exists(_CACHE_FILENAME):
-        print(f"--- Found cache file '{_CACHE_FILENAME}'. Loading samples. ---")
-        with open(_CACHE_FILENAME, 'rb') as f:
-            _cached_samples = pickle.load(f)
+    global _is_cache_loaded
+    legacy_path = _store.adopt_legacy([_LEGACY_CACHE_DIR, _LEGACY_CACHE_FILENAME])
+    if legacy_path:
+        print(f"--- Imported legacy cache '{legacy_path}' into '{_CACHE_DIR}'. ---")
+
+    if _store.exists():
+        print(f"--- Found cache '{_CACHE_DIR}' ({len(_store)} samples in {_store.num_segments()} segments). ---")
     else:
-        print(f"--- No cache file found. Initializing empty cache. ---")
-        _cached_samples = {}
-        with open(_CACHE_FILENAME, 'wb') as f:
-            pickle.dump(_cached_samples, f)
+        print(f"--- No cache found. Initializing empty cache. ---")
     _is_cache_loaded = True
 
-def uniform(num_of_samples):
+def _predict_batch(model, columns):
+    """Labels a batch of (F1, F10) columns with a single model call."""
+    predictions = model.predict({name: np.asarray(column) for name, column in zip(_feature_names, columns)})
+    return np.where(predictions[:, 0] > predictions[:, 1], 0, 1)
+
+def _oracle():
+    """The oracle's batch predictor, memoized on the rounded input rows (see sampling/memo.py)."""
+    global _oracle_memo
+    if _oracle_memo is None:
+        # Shared TensorFlow oracle, loaded once per process
+        model = get_oracle(_MODEL_PATH)
+        disk_path = _CACHE_DIR + "_oracle_memo.sqlite" if _ORACLE_MEMO_ON_DISK else None
+        _oracle_memo = MemoOracle(lambda columns: _predict_batch(model, columns),
+                                  [None, None], disk_path=disk_path)
+    return _oracle_memo
+
+def oracle_stats():
+    """Hit and miss counts of the oracle memo in this process."""
+    return _oracle().stats()
+
+def _stratified_cells():
+    """The feature_defs.py bins of each feature, over the grid uniform draws from."""
+    boundaries = feature_defs.retrieve_bin_boundaries()
+    return [discrete_cells(axis, boundaries[name]) for name, axis in zip(_feature_names, _grid_axes)]
+
+def _extend_cache(num_of_samples):
     """
-    Provides samples from the on-disk cache. If more samples are requested
-    than exist, it generates new synthetic ones until all possible combos are found.
+    Makes sure the cache holds at least num_of_samples samples, or every
+    feature combination if there are fewer, generating the missing ones.
     """
-    global _cached_samples
+    global _key_index
 
-    if not _is_cache_loaded:
-        _load_or_initialize_cache()
-        
     # **FIX**: Calculate the maximum possible number of unique samples
     max_f1_options = 100 - 10 + 1  # 91
     max_f10_options = 50 - 10 + 1 # 41
     max_possible_samples = max_f1_options * max_f10_options # 3731
 
-    if num_of_samples > len(_cached_samples):
-        # Check if we have already found all possible unique samples
-        if len(_cached_samples) >= max_possible_samples:
-            print(f"\n--- WARNING: All {max_possible_samples} unique feature combinations have been generated. Cannot generate more. ---")
-            print(f"--- Returning all available samples. ---")
-        else:
-            num_synthetic_needed = num_of_samples - len(_cached_samples)
-            print(f"\n--- Cache has {len(_cached_samples)} samples. Requested {num_of_samples}. Generating up to {num_synthetic_needed} new synthetic samples. ---\n")
+    # Concurrent runs share this cache: extend it under its lock, after picking
+    # up rows other processes appended, so only what is still missing is made.
+    with _store.lock():
+        _store.refresh()
+        num_cached = len(_store)
+        if _EXHAUSTIVE:
+            if num_cached < max_possible_samples:
+                num_new = label_grid(_store, _grid_axes, _oracle())
+                print(f"--- Cache updated. Appended {num_new} samples ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+                print(f"--- Oracle memo: {_oracle().stats_line()}. ---")
+        elif num_of_samples > num_cached:
+            # Check if we have already found all possible unique samples
+            if num_cached >= max_possible_samples:
+                print(f"\n--- WARNING: All {max_possible_samples} unique feature combinations have been generated. Cannot generate more. ---")
+                print(f"--- Returning all available samples. ---")
+            else:
+                num_synthetic_needed = num_of_samples - num_cached
+                print(f"\n--- Cache has {num_cached} samples. Requested {num_of_samples}. Generating up to {num_synthetic_needed} new synthetic samples. ---\n")
 
-            model = tf.keras.models.load_model(_MODEL_PATH)
+                if _key_index is None or len(_key_index) != num_cached:
+                    _key_index = _store.key_index()
             
-            feature1_name = 'F1'
-            feature2_name = 'F10'
+                feature1_name = 'F1'
+                feature2_name = 'F10'
             
-            f1_raw, f10_raw = [], []
-
-            for _ in range(num_synthetic_needed):
-                # If we've hit the max, stop trying to generate more.
-                if len(_cached_samples) + len(f1_raw) >= max_possible_samples:
-                    print(f"\n--- NOTE: Reached max of {max_possible_samples} unique samples during generation. Stopping. ---")
-                    break
+                f1_raw, f10_raw = [], []
+                drawn = set()
 
-                f1_val = random.randint(10, 100) / 100.0
-                f10_val = random.randint(10, 50) / 10.0
-                sample_key = ((feature1_name, f1_val), (feature2_name, f10_val))
+                for _ in range(num_synthetic_needed):
+                    # If we've hit the max, stop trying to generate more.
+                    if num_cached + len(f1_raw) >= max_possible_samples:
+                        print(f"\n--- NOTE: Reached max of {max_possible_samples} unique samples during generation. Stopping. ---")
+                        break
 
-                while sample_key in _cached_samples or sample_key in [( (f1_raw[i], f1_raw[i]),(f10_raw[i], f10_raw[i]) ) for i in range(len(f1_raw))]:
                     f1_val = random.randint(10, 100) / 100.0
                     f10_val = random.randint(10, 50) / 10.0
                     sample_key = ((feature1_name, f1_val), (feature2_name, f10_val))
+
+                    while sample_key in _key_index or sample_key in drawn:
+                        f1_val = random.randint(10, 100) / 100.0
+                        f10_val = random.randint(10, 50) / 10.0
+                        sample_key = ((feature1_name, f1_val), (feature2_name, f10_val))
                 
-                f1_raw.append(f1_val)
-                f10_raw.append(f10_val)
-
-            # Only run prediction if new samples were actually generated
-            if f1_raw:
-                print(f"--- Predicting {len(f1_raw)} new samples in a single batch... ---")
-                predictions = model.predict({
-                    feature1_name: np.array(f1_raw),
-                    feature2_name: np.array(f10_raw)
-                })
-                print("--- Batch prediction complete. ---")
-
-                for i in range(len(f1_raw)):
-                    prediction_value = 0 if predictions[i][0] > predictions[i][1] else 1
-                    sample_key = ((feature1_name, f1_raw[i]), (feature2_name, f10_raw[i]))
-                    _cached_samples[sample_key] = [("H1", prediction_value)]
-
-                with open(_CACHE_FILENAME, 'wb') as f:
-                    pickle.dump(_cached_samples, f)
-                print(f"--- Cache updated. Saved {len(_cached_samples)} total samples to '{_CACHE_FILENAME}'. ---")
-
-    all_samples_list = list(_cached_samples.items())
-    random.shuffle(all_samples_list)
-    
-    return dict(all_samples_list[:num_of_samples])
\ No newline at end of file
+                    drawn.add(sample_key)
+                    f1_raw.append(f1_val)
+                    f10_raw.append(f10_val)
+
+                # Only run prediction if new samples were actually generated
+                if f1_raw:
+                    print(f"--- Predicting {len(f1_raw)} new samples in a single batch... ---")
+                    predictions = _oracle()([np.array(f1_raw), np.array(f10_raw)])
+                    print("--- Batch prediction complete. ---")
+
+                    new_samples = {}
+                    for i in range(len(f1_raw)):
+                        prediction_value = predictions[i]
+                        sample_key = ((feature1_name, f1_raw[i]), (feature2_name, f10_raw[i]))
+                        new_samples[sample_key] = [("H1", prediction_value)]
+
+                    _key_index.update(new_samples)
+                    _store.append(new_samples)
+                    print(f"--- Cache updated. Appended {len(new_samples)} samples ({len(_store)} total) to '{_CACHE_DIR}'. ---")
+                    print(f"--- Oracle memo: {_oracle().stats_line()}. ---")
+
+def uniform(num_of_samples, seed=None):
+    """
+    Provides samples from the on-disk cache. If more samples are requested
+    than exist, it generates new synthetic ones until all possible combos are found.
+    Pass `seed` to make the choice of returned samples reproducible.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+        
+    _extend_cache(num_of_samples)
+
+    # Only the selected rows are read from the memory-mapped columns.
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return _store.sample(num_of_samples, rng)
+
+def uniform_iter(num_of_samples, chunk_size=None, prefetch=True, memory_budget=None, seed=None):
+    """
+    Streams the samples uniform() would return as dicts of up to `chunk_size`
+    samples. Missing samples are generated one chunk at a time, and with
+    `prefetch` the next chunk is made on a background thread while the caller
+    handles the current one. `memory_budget` (in bytes) shrinks the chunks
+    so the ones in flight fit in it.
+    """
+    if not _is_cache_loaded:
+        with _store.lock():
+            _load_or_initialize_cache()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    return stream_store(_store, num_of_samples, rng, _extend_cache, chunk_size, prefetch, memory_budget)
+
+def stratified(samples_per_cell, seed=None):
+    """
+    Returns `samples_per_cell` new samples inside every cell of the bins in
+    feature_defs.py, so every cell is covered with few oracle queries. The
+    samples are labelled in one batch and are not added to the cache, which
+    holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    columns = draw_per_cell(_stratified_cells(), samples_per_cell, rng)
+    return samples_from_columns(columns, _oracle()(columns), _feature_names, 'H1')
+
+def active(num_of_samples, program_path=None, rounds=8, seed=None):
+    """
+    Returns num_of_samples new samples, labelled over `rounds` rounds that
+    send the oracle queries to the cells of the feature_defs.py bins whose
+    labels are mixed or disagree with the synthesized program at
+    `program_path` (by default the newest one under previous_runs). The
+    samples are not added to the cache, which holds uniform draws only.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    program_path = program_path or latest_program(_PREVIOUS_RUNS_DIR)
+    execute = load_program(program_path) if program_path else None
+    columns, labels = active_sample(_stratified_cells(), _oracle(), num_of_samples, rng,
+                                    execute, feature_defs.retrieve_feature_defs(), 'H1', rounds)
+    return samples_from_columns(columns, labels, _feature_names, 'H1')
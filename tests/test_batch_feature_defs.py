@@ -0,0 +1,14 @@
+# Run from the repository root: python -m pytest tests
+
+import pytest
+
+from experiments.benchmarks import batch_feature_defs
+
+@pytest.mark.parametrize("dataset", list(batch_feature_defs._DATASETS))
+def test_batch_feature_defs_match_scalar(dataset):
+    try:
+        rows, _, _, mismatched = batch_feature_defs.check(dataset, 2000, force_stand_in=True)
+    except ImportError as error:
+        pytest.skip(str(error))
+    assert rows > 0
+    assert mismatched == []
@@ -0,0 +1,28 @@
+# Run from the repository root: python -m pytest tests
+
+import importlib
+
+import numpy as np
+import pytest
+
+from experiments.benchmarks.suite import SAMPLERS, _redirect_caches, install_stand_in
+
+@pytest.mark.parametrize("dataset", ['california_census', 'loan_acquisition'])
+def test_redrawn_rows_carry_their_own_labels(dataset, tmp_path, monkeypatch):
+    module_name, num_outputs = SAMPLERS[dataset]
+    sampler = importlib.import_module(module_name)
+    _redirect_caches(sampler, str(tmp_path))
+    install_stand_in(sampler, num_outputs, force=True)
+    # Draws from under a thousand distinct rows, so most of them collide and are redrawn.
+    full_draw = sampler._draw_synthetic_batch
+    monkeypatch.setattr(sampler, '_draw_synthetic_batch',
+                        lambda n, rng=None: [column % 50 if column.dtype.kind in 'iu' else np.round(column)
+                                             for column in full_draw(n, rng)])
+    sampler.uniform(300, seed=0)
+
+    features, labels = sampler._store.columns()
+    assert len(labels) == 300
+    assert len(set(zip(*(column.tolist() for column in features)))) == 300
+    from experiments.sampling.oracle_pool import get_oracle
+    expected = sampler._predict_batch(get_oracle(sampler._MODEL_PATH), features)
+    np.testing.assert_array_equal(labels, expected)